@@ -0,0 +1,363 @@
+"""
+Metrika në stilin Prometheus për API-n (main_full.py), të lexuara nga GET /metrics.
+
+Çdo worker i uvicorn mban numëruesit dhe histogramet në memorie (pa I/O në
+rrugën e kërkesës) dhe çdo FLUSH_SECONDS i shkruan si snapshot te
+{API_METRICS_DIR}/{pid}.json. /metrics bashkon snapshot-et e të gjithë
+worker-ave (të vetin e merr live), kështu që rezultati nuk varet nga cili
+worker i përgjigjet scrape-it. Snapshot-i i një worker-i të vdekur paloset te
+{API_METRICS_DIR}/retired.json (nën flock), që numëruesit të mos bien kur
+uvicorn rinis një worker. Ata rinisen nga zero vetëm kur rinis i gjithë
+shërbimi (PrivateTmp i signals-api.service pastron direktorinë), gjë që
+Prometheus e trajton si reset normal të counter-it te rate()/increase().
+
+/metrics u përgjigjet vetëm klientëve lokalë (Prometheus në VPS, nginx me
+`allow 127.0.0.1`), ose me `Authorization: Bearer $API_METRICS_TOKEN` kur
+token-i është vendosur.
+
+Mblidhen:
+  - http_request_duration_seconds{method,route,status}  (middleware ASGI)
+  - db_query_duration_seconds{kind=select|write}        (event-et e SQLAlchemy)
+  - sqlite_commit_duration_seconds, sqlite_locked_errors_total (pritjet për lock-un e signals.db)
+  - push_fanout_duration_seconds, push_messages_total{result}
+  - devices{enabled} (gauge, llogaritet në çdo scrape)
+"""
+import bisect
+import hmac
+import ipaddress
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+try:
+    import fcntl  # vetëm Linux/macOS; në Windows mjafton një worker
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+METRICS_DIR = os.getenv("API_METRICS_DIR", os.path.join(tempfile.gettempdir(), "signals_api_metrics"))
+METRICS_TOKEN = os.getenv("API_METRICS_TOKEN", "")
+FLUSH_SECONDS = 5
+RETIRED_FILE = "retired.json"
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+PUSH_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# emri -> (tipi, përshkrimi, bucket-et për histogramet)
+METRICS = {
+    "http_request_duration_seconds": ("histogram", "Koha e kërkesave HTTP sipas route-it", HTTP_BUCKETS),
+    "db_query_duration_seconds": ("histogram", "Koha e statement-eve SQL", DB_BUCKETS),
+    "sqlite_commit_duration_seconds": ("histogram", "Koha e commit-it në SQLite (përfshin pritjen për lock)", DB_BUCKETS),
+    "sqlite_locked_errors_total": ("counter", "Gabime 'database is locked'", None),
+    "push_fanout_duration_seconds": ("histogram", "Koha e dërgimit të një push-i (te topic-u ose te të gjithë device-t)", PUSH_BUCKETS),
+    "push_messages_total": ("counter", "Mesazhe FCM sipas rezultatit", None),
+    "devices": ("gauge", "Device të regjistruar", None),
+    "api_workers": ("gauge", "Worker-a me snapshot metrikash", None),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+# ======================================================
+#                     REGJISTRI (NJË WORKER)
+# ======================================================
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        # (emri, labels) -> [numërimet për bucket (+Inf i fundit), shuma]
+        self.histograms: Dict[Tuple[str, Labels], list] = {}
+        self.flushed_at = 0.0
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1.0):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, labels: Labels = ()):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = [[0] * (len(buckets) + 1), 0.0]
+            h[0][bisect.bisect_left(buckets, value)] += 1
+            h[1] += value
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "counters": [[name, list(labels), v] for (name, labels), v in self.counters.items()],
+                "histograms": [[name, list(labels), list(c), s] for (name, labels), (c, s) in self.histograms.items()],
+            }
+
+    def flush(self):
+        self.flushed_at = time.time()
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def maybe_flush(self):
+        if time.time() - self.flushed_at >= FLUSH_SECONDS:
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"[METRICS] Snapshot nuk u shkrua: {e}")
+
+
+REGISTRY = Registry()
+
+
+def _labels(**kwargs) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kwargs.items()))
+
+
+# ======================================================
+#                     INSTRUMENTIMI
+# ======================================================
+
+class MetricsMiddleware:
+    """Middleware ASGI: koha e çdo kërkese sipas route-it (jo path-it konkret)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REGISTRY.observe(
+                "http_request_duration_seconds",
+                time.perf_counter() - t0,
+                _labels(method=scope["method"], route=route, status=status[0]),
+            )
+            REGISTRY.maybe_flush()
+
+
+_commit_start = threading.local()
+
+
+def instrument_engine(engine):
+    """Koha e statement-eve, e commit-eve dhe gabimet 'database is locked'."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["metrics_t0"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        t0 = conn.info.pop("metrics_t0", None)
+        if t0 is None:
+            return
+        verb = statement.lstrip()[:6].lower()
+        kind = "select" if verb.startswith(("select", "pragma")) else "write"
+        REGISTRY.observe("db_query_duration_seconds", time.perf_counter() - t0, _labels(kind=kind))
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        if "database is locked" in str(context.original_exception):
+            REGISTRY.inc("sqlite_locked_errors_total")
+
+    # commit i DBAPI: "commit" i engine-it para, "after_commit" i Session-it pas
+    @event.listens_for(engine, "commit")
+    def _commit(conn):
+        _commit_start.t0 = time.perf_counter()
+
+    @event.listens_for(Session, "after_commit")
+    def _after_commit(session):
+        t0 = getattr(_commit_start, "t0", None)
+        if t0 is not None:
+            _commit_start.t0 = None
+            REGISTRY.observe("sqlite_commit_duration_seconds", time.perf_counter() - t0)
+
+
+def observe_push(seconds: float, ok: int, failed: int):
+    REGISTRY.observe("push_fanout_duration_seconds", seconds)
+    if ok:
+        REGISTRY.inc("push_messages_total", _labels(result="ok"), ok)
+    if failed:
+        REGISTRY.inc("push_messages_total", _labels(result="error"), failed)
+
+
+# ======================================================
+#                     SCRAPE
+# ======================================================
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(snaps: Iterable[dict]):
+    """Mbledh numëruesit dhe histogramet e disa snapshot-eve sipas (emri, labels)."""
+    counters: Dict[Tuple[str, Labels], float] = {}
+    histograms: Dict[Tuple[str, Labels], list] = {}
+    for snap in snaps:
+        for name, labels, value in snap["counters"]:
+            key = (name, tuple(tuple(p) for p in labels))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, counts, total in snap["histograms"]:
+            key = (name, tuple(tuple(p) for p in labels))
+            h = histograms.get(key)
+            if h is None or len(h[0]) != len(counts):
+                histograms[key] = [list(counts), total]
+            else:
+                h[0] = [a + b for a, b in zip(h[0], counts)]
+                h[1] += total
+    return counters, histograms
+
+
+def _read(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+@contextmanager
+def _dir_lock():
+    """flock mbi METRICS_DIR/retired.lock: një worker palos snapshot-et e vdekura."""
+    with open(os.path.join(METRICS_DIR, "retired.lock"), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield  # mbyllja e file-it e liron lock-un
+
+
+def _retire(paths: List[str]):
+    """Palos snapshot-et e worker-ave të vdekur te retired.json dhe i fshin."""
+    retired = os.path.join(METRICS_DIR, RETIRED_FILE)
+    with _dir_lock():
+        paths = [p for p in paths if os.path.exists(p)]  # një worker tjetër mund t'i ketë palosur
+        if not paths:
+            return
+        snaps = [_read(retired)] if os.path.exists(retired) else []
+        snaps += [_read(p) for p in paths]
+        counters, histograms = _merge(snaps)
+        tmp = f"{retired}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "retired": True,
+                "counters": [[name, list(labels), v] for (name, labels), v in counters.items()],
+                "histograms": [[name, list(labels), c, s] for (name, labels), (c, s) in histograms.items()],
+            }, f)
+        os.replace(tmp, retired)
+        for p in paths:
+            os.remove(p)
+    print(f"[METRICS] {len(paths)} snapshot worker-ash të vdekur u palosën te {RETIRED_FILE}")
+
+
+def _snapshots() -> List[dict]:
+    own = os.getpid()
+    snaps = [REGISTRY.snapshot()]
+    if not os.path.isdir(METRICS_DIR):
+        return snaps
+    dead = []
+    for fname in os.listdir(METRICS_DIR):
+        if not fname.endswith(".json") or fname == RETIRED_FILE:
+            continue
+        path = os.path.join(METRICS_DIR, fname)
+        try:
+            pid = int(fname[:-5])
+            if pid == own:
+                continue
+            if not _alive(pid):
+                dead.append(path)
+                continue
+            snaps.append(_read(path))
+        except (ValueError, OSError):
+            continue  # file i huaj ose i fshirë ndërkohë
+    try:
+        if dead:
+            _retire(dead)
+        path = os.path.join(METRICS_DIR, RETIRED_FILE)
+        if os.path.exists(path):
+            snaps.append(_read(path))
+    except (ValueError, OSError) as e:
+        print(f"[METRICS] Snapshot-et e worker-ave të vdekur nuk u lexuan: {e}")
+    return snaps
+
+
+def allowed(client_host: Optional[str], authorization: Optional[str]) -> bool:
+    """
+    /metrics vetëm për klientë loopback (uvicorn dëgjon edhe në 0.0.0.0:8000,
+    kështu që `allow 127.0.0.1` i nginx-it nuk mjafton) ose me token-in.
+    """
+    if METRICS_TOKEN and authorization:
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(token.strip(), METRICS_TOKEN):
+            return True
+    try:
+        return ipaddress.ip_address(client_host or "").is_loopback
+    except ValueError:
+        return False
+
+
+def _fmt_labels(labels: Iterable, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [tuple(p) for p in labels] + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def render(gauges: Optional[Dict[str, List[Tuple[Labels, float]]]] = None) -> str:
+    """Tekst në formatin e ekspozimit të Prometheus, i bashkuar nga të gjithë worker-at."""
+    REGISTRY.maybe_flush()
+    snaps = _snapshots()
+    counters, histograms = _merge(snaps)
+
+    gauges = dict(gauges or {})
+    workers = sum(1 for snap in snaps if not snap.get("retired"))
+    gauges["api_workers"] = [((), workers)]
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(value)}")
+        elif kind == "gauge":
+            for labels, value in gauges.get(name, []):
+                lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(value)}")
+        else:
+            for (n, labels), (counts, total) in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for edge, count in zip(list(buckets) + ["+Inf"], counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_fmt_labels(labels, ('le', str(edge)))} {cumulative}")
+                lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(total)}")
+                lines.append(f"{name}_count{_fmt_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
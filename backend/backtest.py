@@ -0,0 +1,902 @@
+"""
+Backtest i vektorizuar për strategjitë crypto (crypto_swing, crypto_scalp).
+
+Historia lexohet nga ohlcv_store (pa rrjet). Për çdo simbol llogaritet një
+herë tabela e faktorëve për ÇDO qiri (`build_table`): të njëjtat faktorë si
+`analyze_symbol` / `analyze_symbol_scalp`, por si vargje numpy mbi gjithë
+historinë në vend të një dritareje për skanim. Pastaj shtresa e vendimit
+(`evaluate`) aplikon pragjet (MIN_SCORE_FOR_SIGNAL, MIN_ADX_STRENGTH,
+MIN_VOLUME_RATIO, MIN_MINUTES_BETWEEN_SIGNALS), veton S/R dhe memorien e
+sinjaleve, dhe `simulate_trades` gjen daljen TP/SL me FIXED_SL_PERCENT /
+FIXED_TP_PERCENT. Simbolet ndahen në procese (ProcessPoolExecutor).
+
+Dritaret e botave riprodhohen saktë:
+  - crypto_swing: 4H = 300 qirinjtë e fundit; D1 = 260 ditët e nxjerra nga
+    BASE_LIMIT_4H qirinj 4H (dita e fundit e pjesshme, si resample_aligned)
+  - crypto_scalp: 5m = 300 qirinjtë e fundit; 1H = 250 orët nga BASE_LIMIT_5M
+  - EMA-të e trendit D1/1H llogariten mbi dritaren, jo mbi gjithë historinë
+
+Përafrime (të dokumentuara):
+  - vlerësimi bëhet në mbyllje të qirit, një herë për çdo skanim (10 min):
+    swing çdo qiri 4H, scalp çdo qiri të dytë 5m
+  - ATR/ADX/EMA 5m-4H (ewm) llogariten mbi gjithë historinë; mbi 300 qirinj
+    ndryshimi nga dritarja e botit është i papërfillshëm
+  - swing: MA50 numërohet si faktor; Stochastic dhe candle pattern nuk
+    përfshihen sepse nuk janë të definuara te crypto_swing_bot
+  - entry = close i qirit të sinjalit; nëse SL dhe TP preken në të njëjtin
+    qiri merret SL; pa dalje brenda horizontit -> mbyllet me close ("OPEN")
+
+KUJDES: crypto_swing_bot sot NUK nxjerr asnjë sinjal. Blloku MA50 i
+`analyze_symbol` hedh exception para vlerësimit: `calculate_ma` lexon
+df['close'] (kolonat janë 'Close') -> KeyError, dhe edhe pa të `buy_score`
+përdoret para se të caktohet. Backtest-i vlerëson strategjinë që boti do të
+ekzekutonte pa këtë gabim, jo botin live. `--check` krahason vetëm faktorët
+një nga një (funksionet e botit thirren veçmas), kështu që 0 mospërputhje nuk
+do të thotë "backtest == boti live".
+
+Verifikimi:
+  - paritet (`--check`) ka vetëm crypto_swing; tabela e crypto_scalp nuk
+    është krahasuar me botin (crypto_scalp_bot nuk importohet:
+    IndentationError), prandaj CLI-ja e shënon rezultatin si të paverifikuar
+
+Përdorim:
+    python backtest.py crypto_swing --days 730 [--symbols BTCUSDT ETHUSDT] [--workers 8]
+    python backtest.py crypto_scalp --days 90 --backfill
+    python backtest.py crypto_swing --check 300      # paritet me crypto_swing_bot
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+import ohlcv_store
+from candle_store import INTERVAL_MS
+
+# ======================================================
+#                     CONFIG
+# ======================================================
+
+# Parametrat e vendimit (si te CONFIG i secilit bot)
+STRATEGIES: Dict[str, dict] = {
+    "crypto_swing": {
+        "interval": "4h",
+        "htf_interval": "1d",
+        "window": 300,          # LIMIT_4H
+        "htf_window": 260,      # LIMIT_D1
+        "base_limit": 1566,     # BASE_LIMIT_4H = (LIMIT_D1 + 1) * 6
+        "scan_seconds": 600,    # SLEEP_SECONDS
+        "horizon_bars": 180,    # 30 ditë për TP/SL
+        "params": {
+            "min_score": 6,             # MIN_SCORE_FOR_SIGNAL
+            "min_adx": 20,              # MIN_ADX_STRENGTH
+            "min_volume_ratio": 1.2,    # MIN_VOLUME_RATIO
+            "min_minutes": 120,         # MIN_MINUTES_BETWEEN_SIGNALS
+            "sl_pct": 1.5,              # FIXED_SL_PERCENT
+            "tp_pct": 4.5,              # FIXED_TP_PERCENT
+        },
+    },
+    "crypto_scalp": {
+        "interval": "5m",
+        "htf_interval": "1h",
+        "window": 300,          # LIMIT_5M
+        "htf_window": 250,      # LIMIT_1H
+        "base_limit": 3012,     # BASE_LIMIT_5M = (LIMIT_1H + 1) * 12
+        "scan_seconds": 600,    # SCAN_INTERVAL
+        "horizon_bars": 2016,   # 7 ditë për TP/SL
+        "params": {
+            "min_score": 6,
+            "min_adx": 20,
+            "min_volume_ratio": 1.8,
+            "min_minutes": 60,
+            "sl_pct": 1.5,
+            "tp_pct": 4.5,
+        },
+    },
+}
+
+# Pjesa e kapitalit e rrezikuar për trade (1R) te kurba e equity-t
+RISK_PER_TRADE = 0.01
+
+# Sinjale për bllok në simulimin TP/SL (matrica sinjale x horizont)
+SIM_CHUNK = 256
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "backtests")
+
+
+# ======================================================
+#                 PRIMITIVA (vargje)
+# ======================================================
+
+def _ewm(x: np.ndarray, span: int) -> np.ndarray:
+    return pd.Series(x).ewm(span=span, adjust=False).mean().to_numpy()
+
+
+def _rolling_mean(x: np.ndarray, n: int) -> np.ndarray:
+    return pd.Series(x).rolling(window=n).mean().to_numpy()
+
+
+def _shift(x: np.ndarray, k: int, fill=np.nan) -> np.ndarray:
+    """x[t - k] në pozicionin t."""
+    out = np.full(x.shape, fill, dtype=np.result_type(x, type(fill)))
+    out[k:] = x[:-k]
+    return out
+
+
+def _rsi(close: np.ndarray, period: int = 14, eps: Optional[float] = None) -> np.ndarray:
+    """RSI me mesatare rolling; eps=None -> loss 0 jep NaN (si `rsi` i scalp)."""
+    delta = np.r_[np.nan, np.diff(close)]
+    gain = _rolling_mean(np.where(delta > 0, delta, 0.0), period)
+    loss = _rolling_mean(np.where(delta < 0, -delta, 0.0), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = gain / np.where(loss == 0, np.nan, loss) if eps is None else gain / (loss + eps)
+    return 100 - 100 / (1 + rs)
+
+
+def _atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    prev = _shift(close, 1)
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+    return _ewm(tr, period)
+
+
+def _adx(high, low, close, period: int = 14, di_eps: float = 0.0) -> np.ndarray:
+    """ADX si `calculate_adx`; scalp shton 1e-5 te ATR në DI (di_eps)."""
+    hd = np.r_[0.0, np.diff(high)]
+    ld = np.r_[0.0, -np.diff(low)]
+    plus_dm = np.where((hd > ld) & (hd > 0), hd, 0.0)
+    minus_dm = np.where((ld > hd) & (ld > 0), ld, 0.0)
+    atr = _atr(high, low, close, period) + di_eps
+    with np.errstate(divide="ignore", invalid="ignore"):
+        plus_di = 100 * _ewm(plus_dm, period) / atr
+        minus_di = 100 * _ewm(minus_dm, period) / atr
+    dx = 100 * np.abs(plus_di - minus_di) / (plus_di + minus_di + 0.00001)
+    return _ewm(dx, period)
+
+
+def _window_any(flag: np.ndarray, first: int, last: int) -> np.ndarray:
+    """out[t] = any(flag[t - first .. t - last]) (indekset < 0 injorohen)."""
+    c = np.r_[0, np.cumsum(flag, dtype=np.int64)]
+    t = np.arange(flag.size)
+    hi = np.clip(t - last + 1, 0, flag.size)
+    lo = np.clip(t - first, 0, flag.size)
+    return c[hi] - c[np.minimum(lo, hi)] > 0
+
+
+def _pivots(x: np.ndarray, radius: int, kind: str, above_mean: bool) -> np.ndarray:
+    """
+    Flag-et e pivot-eve me qendër j (x[j] = max/min i x[j-r..j+r]); me
+    `above_mean` kërkohet edhe x[j] > mesatarja (si `find_swings`).
+    """
+    out = np.zeros(x.size, dtype=bool)
+    if x.size < 2 * radius + 1:
+        return out
+    win = sliding_window_view(x, 2 * radius + 1)
+    mid = x[radius:x.size - radius]
+    if kind == "high":
+        ok = mid == win.max(axis=1)
+        if above_mean:
+            ok &= mid > win.mean(axis=1)
+    else:
+        ok = mid == win.min(axis=1)
+        if above_mean:
+            ok &= mid < win.mean(axis=1)
+    out[radius:x.size - radius] = ok
+    return out
+
+
+def _htf_emas(
+    open_time: np.ndarray, close: np.ndarray, htf_ms: int, spans: Tuple[int, ...],
+    htf_window: int, base_limit: int,
+) -> Tuple[Dict[int, np.ndarray], np.ndarray, np.ndarray]:
+    """
+    EMA-të e timeframe-it më të lartë ashtu si i sheh boti në qirin t:
+    bar-et HTF nga `base_limit` qirinjtë e fundit (i pari i pjesshëm hiqet,
+    si resample_aligned), `htf_window` të fundit, dhe bar-i i fundit i
+    pjesshëm me close = close[t].
+
+    EMA mbi dritare rrjedh nga EMA mbi gjithë historinë X:
+        e_W[m] = e_F[m] + (1 - a)^(m - s) * (X[s] - e_F[s])
+    kështu që nuk ka nevojë për një ewm për çdo qiri.
+    Kthen ({span: ema[t]}, close_htf[t], numri i bar-eve HTF në dritare).
+    """
+    n = close.size
+    day = open_time // htf_ms
+    k = np.r_[0, np.cumsum(day[1:] != day[:-1])]
+    last_idx = np.r_[np.flatnonzero(k[1:] != k[:-1]), n - 1]
+    x = close[last_idx]                       # close i çdo bar-i HTF të plotë
+
+    b0 = np.maximum(0, np.arange(n) - base_limit + 1)
+    k0 = k[b0] + (open_time[b0] % htf_ms != 0)
+    s = np.maximum(k0, k - htf_window + 1)
+    count = k - s + 1
+    prev = k - 1
+    has_prev = prev >= s
+
+    emas = {}
+    for span in spans:
+        a = 2.0 / (span + 1)
+        e_full = _ewm(x, span)
+        sc = np.minimum(s, x.size - 1)
+        pc = np.maximum(prev, 0)
+        with np.errstate(over="ignore", invalid="ignore"):
+            e_prev = e_full[pc] + (1 - a) ** np.maximum(prev - s, 0) * (x[sc] - e_full[sc])
+        emas[span] = np.where(has_prev, a * close + (1 - a) * e_prev, close)
+    return emas, close, count
+
+
+# ======================================================
+#             SUPPORT / RESISTANCE (vetëm kandidatët)
+# ======================================================
+
+def _cluster(levels: np.ndarray, num_levels: int) -> List[float]:
+    """Si `cluster_levels` te botat: grupon nivelet brenda 0.5%."""
+    if levels.size == 0:
+        return []
+    levels = np.sort(levels).tolist()
+    clustered = []
+    current = [levels[0]]
+    for level in levels[1:]:
+        if abs(level - current[-1]) / current[-1] < 0.005:
+            current.append(level)
+        else:
+            clustered.append(sum(current) / len(current))
+            current = [level]
+    clustered.append(sum(current) / len(current))
+    return clustered[-num_levels:]
+
+
+def _near(price: float, levels: List[float], tolerance: float) -> bool:
+    return any(abs(price - level) / level <= tolerance for level in levels)
+
+
+# ======================================================
+#                  TABELA E FAKTORËVE
+# ======================================================
+
+class FactorTable:
+    """
+    Faktorët e një simboli për çdo qiri. Pikët që nuk varen nga parametrat
+    janë te `buy_base` / `sell_base`; ADX dhe volume mbahen si vlera, kështu
+    që `evaluate` mund të rilexohet me pragje të ndryshme pa rillogaritje.
+    """
+
+    def __init__(self, strategy: str, symbol: str, open_time: np.ndarray, ohlcv: np.ndarray, start: int):
+        self.strategy = strategy
+        self.symbol = symbol
+        self.cfg = STRATEGIES[strategy]
+        self.step = INTERVAL_MS[self.cfg["interval"]]
+        self.open_time = open_time
+        self.open, self.high, self.low, self.close, self.volume = ohlcv
+        self.start = start                      # qiri i parë i vlerësuar (pas warmup)
+        self.columns: Dict[str, np.ndarray] = {}
+        # S/R llogaritet vetëm për kandidatët; ruhet mes vlerësimeve
+        self.sr_cache: Dict[int, Tuple[bool, bool]] = {}
+        self.sr_lookback = 100
+        self.sr_levels = 5
+        self.sr_tolerance = 0.015
+        self._res_idx = self._sup_idx = None
+
+    def __len__(self) -> int:
+        return self.open_time.size
+
+    def near_sr(self, idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(afër resistance, afër support) për qirinjtë `idx`, si find_support_resistance_levels."""
+        if self._res_idx is None:
+            self._res_idx = np.flatnonzero(_pivots(self.high, 5, "high", False))
+            self._sup_idx = np.flatnonzero(_pivots(self.low, 5, "low", False))
+        lb = self.sr_lookback
+        near_res = np.zeros(idx.size, dtype=bool)
+        near_sup = np.zeros(idx.size, dtype=bool)
+        for n, t in enumerate(idx.tolist()):
+            got = self.sr_cache.get(t)
+            if got is None:
+                lo_j, hi_j = t - lb + 6, t - 5
+                if lo_j - 5 < 0:
+                    got = (False, False)
+                else:
+                    res = self._res_idx[np.searchsorted(self._res_idx, lo_j):np.searchsorted(self._res_idx, hi_j, "right")]
+                    sup = self._sup_idx[np.searchsorted(self._sup_idx, lo_j):np.searchsorted(self._sup_idx, hi_j, "right")]
+                    price = self.close[t]
+                    got = (
+                        _near(price, _cluster(self.high[res], self.sr_levels), self.sr_tolerance),
+                        _near(price, _cluster(self.low[sup], self.sr_levels), self.sr_tolerance),
+                    )
+                self.sr_cache[t] = got
+            near_res[n], near_sup[n] = got
+        return near_res, near_sup
+
+
+def _order_block(o, h, l, c, v, direction: str, lookback: int = 60) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    `find_recent_order_block` për çdo qiri t: kandidatët j në [t-59, t-4]
+    si matricë (n, 56). Kthen (ob_low, ob_high, ok) të OB-së më të fortë.
+    """
+    n = c.size
+    span = lookback + 5                              # sub = 65 qirinjtë e fundit
+    offs = np.arange(5, span - 4)                    # i brenda sub-it
+    t = np.arange(n)
+    j = t[:, None] - (span - 1) + offs[None, :]      # indeksi global i kandidatit
+    valid = (t[:, None] >= span - 1)
+    jc = np.clip(j, 0, n - 1)
+
+    body = np.abs(c - o)
+    body_ratio = body / (h - l + 0.00001)
+    cum_v = np.r_[0.0, np.cumsum(v)]
+    # mesatarja e volumit para qirit: 20 të fundit, ose nga fillimi i sub-it kur i <= 20
+    w0 = np.clip(t - (span - 1), 0, n)[:, None]
+    a20 = (cum_v[jc] - cum_v[np.clip(jc - 20, 0, n)]) / 20
+    a_short = (cum_v[jc] - cum_v[w0]) / np.maximum(offs, 1)[None, :]
+    avg_v = np.where(offs[None, :] > 20, a20, a_short)
+    vr = v[jc] / (avg_v + 0.00001)
+
+    c1 = c[np.clip(jc - 1, 0, n - 1)]
+    c2 = c[np.clip(jc - 2, 0, n - 1)]
+    if direction == "bull":
+        nxt = np.minimum(np.minimum(l[np.clip(jc + 1, 0, n - 1)], l[np.clip(jc + 2, 0, n - 1)]), l[np.clip(jc + 3, 0, n - 1)])
+        ok = (c[jc] > o[jc]) & (c1 < c2) & (nxt <= l[jc] * 1.002)
+    else:
+        nxt = np.maximum(np.maximum(h[np.clip(jc + 1, 0, n - 1)], h[np.clip(jc + 2, 0, n - 1)]), h[np.clip(jc + 3, 0, n - 1)])
+        ok = (c[jc] < o[jc]) & (c1 > c2) & (nxt >= h[jc] * 0.998)
+    ok &= (body_ratio[jc] >= 0.6) & (vr >= 1.1) & valid
+
+    strength = np.where(ok, np.minimum(100, vr * 30 + body_ratio[jc] * 40 + 30), 0.0)
+    best = strength.argmax(axis=1)                   # i pari me forcë maksimale
+    found = ok[t, best]
+    jb = jc[t, best]
+    return l[jb], h[jb], found
+
+
+def _swing_table(table: FactorTable):
+    o, h, l, c, v = table.open, table.high, table.low, table.close, table.volume
+    cfg = table.cfg
+    n = c.size
+    t = np.arange(n)
+
+    # 1) D1 trend: EMA50/EMA200 mbi 260 ditët e dritares
+    emas, d1_close, d1_count = _htf_emas(
+        table.open_time, c, INTERVAL_MS[cfg["htf_interval"]], (50, 200), cfg["htf_window"], cfg["base_limit"]
+    )
+    e50, e200 = emas[50], emas[200]
+    trend = np.where((e50 > e200) & (d1_close > e50), 1, np.where((e50 < e200) & (d1_close < e50), -1, 0))
+    trend[d1_count < 220] = 0
+
+    # 2) Struktura 4H: dy pivot-et e fundit (lookback=2) brenda dritares
+    window = cfg["window"]
+    structure = np.zeros(n, dtype=np.int64)
+    hp = np.flatnonzero(_pivots(h, 2, "high", True))
+    lp = np.flatnonzero(_pivots(l, 2, "low", True))
+    kh = np.searchsorted(hp, t - 2, "right") - 1
+    kl = np.searchsorted(lp, t - 2, "right") - 1
+    first = t - window + 3                           # pivot-i më i hershëm i dritares
+    ok = (kh >= 1) & (kl >= 1)
+    ok &= (hp[np.maximum(kh - 1, 0)] >= first) & (lp[np.maximum(kl - 1, 0)] >= first)
+    h1, h2 = h[hp[np.maximum(kh - 1, 0)]], h[hp[np.maximum(kh, 0)]]
+    l1, l2 = l[lp[np.maximum(kl - 1, 0)]], l[lp[np.maximum(kl, 0)]]
+    structure[ok & (h2 > h1) & (l2 >= l1)] = 1
+    structure[ok & (h2 <= h1) & (l2 < l1)] = -1
+
+    # 3-4) ADX dhe volume (pragjet aplikohen te evaluate)
+    adx = _adx(h, l, c, 14)
+    avg_v = (np.r_[0.0, np.cumsum(v)][t] - np.r_[0.0, np.cumsum(v)][np.maximum(t - 20, 0)]) / 20
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vol_ratio = np.where(avg_v > 0, v / avg_v, 0.0)
+
+    # 5) Order block afër çmimit
+    bl, bh, bfound = _order_block(o, h, l, c, v, "bull")
+    sl_, sh, sfound = _order_block(o, h, l, c, v, "bear")
+    ob_bull = bfound & (bl <= c) & (c <= bh * 1.01)
+    ob_bear = sfound & (sl_ * 0.99 <= c) & (c <= sh)
+
+    # 6) FVG në 40 qirinjtë e fundit
+    fvg_bull = _window_any(np.r_[False, l[1:] > h[:-1]], 40, 1)
+    fvg_bear = _window_any(np.r_[False, h[1:] < l[:-1]], 40, 1)
+
+    # 7) RSI divergence (lookback=40 -> j në [t-28, t-5], krahasuar me j-10)
+    rsi_d = _rsi(c, 14, eps=0.00001)
+    c10, r10 = _shift(c, 10), _shift(rsi_d, 10)
+    div_bull = _window_any((c < c10) & (rsi_d > r10), 28, 5)
+    div_bear = _window_any((c > c10) & (rsi_d < r10), 28, 5)
+
+    # 8) EMA 8/21/50
+    ema_align = _ema_alignment(c)
+
+    # 9) RSI absolut
+    rsi_v = _rsi(c, 14, eps=1e-9)
+
+    # 12) MA50
+    ma50 = _rolling_mean(c, 50)
+
+    buy = (
+        (trend == 1).astype(float) + (structure == 1) + ob_bull + fvg_bull + div_bull
+        + (ema_align == 1) + (rsi_v < 32) + (c > ma50)
+    )
+    sell = (
+        (trend == -1).astype(float) + (structure == -1) + ob_bear + fvg_bear + div_bear
+        + (ema_align == -1) + (rsi_v > 68) + (c < ma50)
+    )
+
+    atr = _atr(h, l, c, 14)
+    valid = (t >= table.start) & (t >= 59) & ~((atr == 0) | (atr < c * 0.001))
+
+    table.columns.update(
+        trend=trend, structure=structure, adx=adx, vol_ratio=vol_ratio,
+        buy_base=buy, sell_base=sell, valid=valid, atr=atr,
+        ob_bull=ob_bull, ob_bear=ob_bear, fvg_bull=fvg_bull, fvg_bear=fvg_bear,
+        div_bull=div_bull, div_bear=div_bear, ema_align=ema_align, rsi=rsi_v, ma50=ma50,
+    )
+
+
+def _ema_alignment(c: np.ndarray) -> np.ndarray:
+    e8, e21, e50 = _ewm(c, 8), _ewm(c, 21), _ewm(c, 50)
+    return np.where((e8 > e21) & (e21 > e50), 1, np.where((e8 < e21) & (e21 < e50), -1, 0))
+
+
+def _scalp_table(table: FactorTable):
+    h, l, c, v = table.high, table.low, table.close, table.volume
+    cfg = table.cfg
+    n = c.size
+    t = np.arange(n)
+
+    # Trend 1H: close > EMA50 > EMA200 mbi 250 orët e dritares
+    emas, h1_close, h1_count = _htf_emas(
+        table.open_time, c, INTERVAL_MS[cfg["htf_interval"]], (50, 200), cfg["htf_window"], cfg["base_limit"]
+    )
+    e50, e200 = emas[50], emas[200]
+    trend = np.where((h1_close > e50) & (e50 > e200), 1, np.where((h1_close < e50) & (e50 < e200), -1, 0))
+    trend[h1_count < 220] = 0
+
+    ema20, ema50 = _ewm(c, 20), _ewm(c, 50)
+    rsi14 = _rsi(c, 14)
+    adx = _adx(h, l, c, 14, di_eps=0.00001)
+    avg_v = (np.r_[0.0, np.cumsum(v)][t + 1] - np.r_[0.0, np.cumsum(v)][np.maximum(t - 19, 0)]) / 20
+    vol_ratio = v / (avg_v + 0.00001)
+
+    pc, pl, ph = _shift(c, 1), _shift(l, 1), _shift(h, 1)
+    p20, p50 = _shift(ema20, 1), _shift(ema50, 1)
+    pullback_long = (((pl < p20) & (p20 <= pc)) | ((pl < p50) & (p50 <= pc))) & (c > ema20)
+    pullback_short = (((ph > p20) & (p20 >= pc)) | ((ph > p50) & (p50 >= pc))) & (c < ema20)
+
+    prsi = _shift(rsi14, 1)
+    rsi_long = (prsi < 30) & (30 < rsi14)
+    rsi_short = (prsi > 70) & (70 > rsi14)
+
+    # RSI divergence (lookback=30 -> j në [t-18, t-2])
+    c10, r10 = _shift(c, 10), _shift(rsi14, 10)
+    div_bull = _window_any((c < c10) & (rsi14 > r10), 18, 2)
+    div_bear = _window_any((c > c10) & (rsi14 < r10), 18, 2)
+
+    ema_align = _ema_alignment(c)
+
+    buy = (
+        (trend == 1).astype(float) + pullback_long + rsi_long + div_bull + (ema_align == 1)
+    )
+    sell = (
+        (trend == -1).astype(float) + pullback_short + rsi_short + div_bear + (ema_align == -1)
+    )
+
+    atr = _atr(h, l, c, 14)
+    valid = (t >= table.start) & (t >= 49) & (trend != 0) & ~((atr == 0) | (atr < c * 0.0005))
+
+    table.sr_lookback, table.sr_levels, table.sr_tolerance = 150, 3, 0.008
+    table.columns.update(
+        trend=trend, adx=adx, vol_ratio=vol_ratio, buy_base=buy, sell_base=sell,
+        valid=valid, atr=atr, pullback_long=pullback_long, pullback_short=pullback_short,
+        rsi_long=rsi_long, rsi_short=rsi_short, div_bull=div_bull, div_bear=div_bear,
+        ema_align=ema_align, rsi=rsi14,
+    )
+
+
+_BUILDERS = {"crypto_swing": _swing_table, "crypto_scalp": _scalp_table}
+
+
+def load_history(strategy: str, symbol: str, start: Optional[pd.Timestamp] = None,
+                 end: Optional[pd.Timestamp] = None) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Historia nga ohlcv_store me warmup-in e botit para `start`:
+    (open_time, ohlcv (5, n), indeksi i qirit të parë që vlerësohet).
+    """
+    cfg = STRATEGIES[strategy]
+    interval = cfg["interval"]
+    open_time, ohlcv = ohlcv_store.load(symbol, interval)
+    if end is not None and open_time.size:
+        cut = np.searchsorted(open_time, int(ohlcv_store._to_utc(end).value // 1_000_000), "right")
+        open_time, ohlcv = open_time[:cut], ohlcv[:, :cut]
+    first = cfg["base_limit"] - 1                    # dritaret e plota si te boti
+    if start is not None and open_time.size:
+        start_ms = int(ohlcv_store._to_utc(start).value // 1_000_000)
+        s = int(np.searchsorted(open_time, start_ms))
+        lo = max(0, s - first)
+        open_time, ohlcv = open_time[lo:], ohlcv[:, lo:]
+        first = max(first, s - lo)
+    return open_time, ohlcv, first
+
+
+def build_table(strategy: str, symbol: str, start: Optional[pd.Timestamp] = None,
+                end: Optional[pd.Timestamp] = None) -> Optional[FactorTable]:
+    """Tabela e faktorëve për një simbol, ose None kur historia s'mjafton."""
+    open_time, ohlcv, first = load_history(strategy, symbol, start, end)
+    if open_time.size <= first:
+        return None
+    table = FactorTable(strategy, symbol, open_time, ohlcv, first)
+    _BUILDERS[strategy](table)
+    return table
+
+
+# ======================================================
+#                  SHTRESA E VENDIMIT
+# ======================================================
+
+def _scan_mask(open_time: np.ndarray, step: int, scan_ms: int) -> np.ndarray:
+    """Qirinjtë që mbyllen në një skanim (p.sh. çdo i dyti 5m me skanim 10 min)."""
+    if step >= scan_ms:
+        return np.ones(open_time.size, dtype=bool)
+    return (open_time + step) % scan_ms < step
+
+
+def apply_signal_memory(times: np.ndarray, sides: np.ndarray, min_minutes: float,
+                        per_side: bool) -> np.ndarray:
+    """
+    Rregullat e memories së botit mbi kandidatët sipas kohës:
+      - per_side=True (swing): jo i njëjti drejtim rresht, pastaj cooldown
+        për (simbol, drejtim)
+      - per_side=False (scalp): cooldown për simbol, pastaj jo i njëjti drejtim
+    Kthen maskën e sinjaleve që do të dërgoheshin.
+    """
+    keep = np.zeros(times.size, dtype=bool)
+    gap = min_minutes * 60_000
+    last_side = 0
+    last_time: Dict[int, int] = {}
+    for i, (ts, side) in enumerate(zip(times.tolist(), sides.tolist())):
+        key = side if per_side else 0
+        last_t = last_time.get(key)
+        if per_side:
+            if side == last_side:
+                continue
+            if last_t is not None and ts - last_t < gap:
+                continue
+        else:
+            if last_t is not None and ts - last_t < gap:
+                continue
+            if side == last_side:
+                continue
+        keep[i] = True
+        last_side = side
+        last_time[key] = ts
+    return keep
+
+
+def evaluate(table: FactorTable, params: Optional[dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vendimi i botit për çdo qiri me parametrat `params` (default si te boti).
+    Kthen (indekset e qirinjve me sinjal, drejtimi +1 BUY / -1 SELL).
+    """
+    p = dict(table.cfg["params"])
+    p.update(params or {})
+    col = table.columns
+    trend, adx, vr = col["trend"], col["adx"], col["vol_ratio"]
+    strong = adx >= p["min_adx"]
+    high_vol = vr >= p["min_volume_ratio"]
+
+    if table.strategy == "crypto_swing":
+        buy = col["buy_base"] + (strong & (trend == 1)) + (high_vol & ((trend == 1) | (col["structure"] == 1)))
+        sell = col["sell_base"] + (strong & (trend == -1)) + (high_vol & ((trend == -1) | (col["structure"] == -1)))
+        sr_bonus = 0.0
+    else:
+        buy = col["buy_base"] + 0.5 * (strong & (trend == 1)) + high_vol
+        sell = col["sell_base"] + 0.5 * (strong & (trend == -1)) + high_vol
+        sr_bonus = 0.5
+
+    scan = _scan_mask(table.open_time, table.step, table.cfg["scan_seconds"] * 1000)
+    min_score = p["min_score"]
+    cand = np.flatnonzero(
+        col["valid"] & scan & ((buy + sr_bonus >= min_score) | (sell + sr_bonus >= min_score))
+    )
+    near_res, near_sup = table.near_sr(cand)
+    b, s = buy[cand], sell[cand]
+    if sr_bonus:
+        b = b + sr_bonus * ~near_res
+        s = s + sr_bonus * ~near_sup
+
+    go_buy = (b >= min_score) & (b >= s)
+    go_sell = ~go_buy & (s >= min_score) & (s > b)
+    # afër S/R -> boti bën return (pa kaluar te drejtimi tjetër)
+    fire = (go_buy & ~near_res) | (go_sell & ~near_sup)
+    idx = cand[fire]
+    sides = np.where(go_buy[fire], 1, -1)
+
+    times = table.open_time[idx] + table.step
+    keep = apply_signal_memory(times, sides, p["min_minutes"], per_side=table.strategy == "crypto_swing")
+    return idx[keep], sides[keep]
+
+
+# ======================================================
+#                  TP / SL DHE EQUITY
+# ======================================================
+
+TRADE_COLUMNS = ["symbol", "entry_time", "exit_time", "side", "entry", "exit", "outcome", "ret_pct", "r"]
+
+
+def _empty_trades() -> pd.DataFrame:
+    return pd.DataFrame(columns=TRADE_COLUMNS)
+
+
+def simulate_trades(table: FactorTable, idx: np.ndarray, sides: np.ndarray,
+                    sl_pct: float, tp_pct: float, horizon: Optional[int] = None) -> pd.DataFrame:
+    """
+    Dalja e çdo sinjali: qiri i parë pas hyrjes që prek SL ose TP (SL kur
+    preken të dyja në të njëjtin qiri). Pa dalje brenda `horizon` qirinjve
+    ose deri në fund të historisë -> "OPEN" me close-in e fundit.
+    """
+    horizon = horizon or table.cfg["horizon_bars"]
+    n = len(table)
+    h, l, c = table.high, table.low, table.close
+    parts = []
+    steps = np.arange(1, horizon + 1)
+    for lo in range(0, idx.size, SIM_CHUNK):
+        e_idx, side = idx[lo:lo + SIM_CHUNK], sides[lo:lo + SIM_CHUNK]
+        entry = c[e_idx]
+        sl = np.where(side == 1, entry * (1 - sl_pct / 100), entry * (1 + sl_pct / 100))
+        tp = np.where(side == 1, entry * (1 + tp_pct / 100), entry * (1 - tp_pct / 100))
+
+        fwd = e_idx[:, None] + steps[None, :]
+        inside = fwd < n
+        fwd = np.minimum(fwd, n - 1)
+        hi, lw = h[fwd], l[fwd]
+        long_ = (side == 1)[:, None]
+        sl_hit = np.where(long_, lw <= sl[:, None], hi >= sl[:, None]) & inside
+        tp_hit = np.where(long_, hi >= tp[:, None], lw <= tp[:, None]) & inside
+
+        first_sl = np.where(sl_hit.any(axis=1), sl_hit.argmax(axis=1), horizon)
+        first_tp = np.where(tp_hit.any(axis=1), tp_hit.argmax(axis=1), horizon)
+        is_sl = (first_sl < horizon) & (first_sl <= first_tp)
+        is_tp = (first_tp < horizon) & ~is_sl
+        last = np.minimum(e_idx + horizon, n - 1)
+        exit_idx = np.where(is_sl, e_idx + 1 + first_sl, np.where(is_tp, e_idx + 1 + first_tp, last))
+        exit_price = np.where(is_sl, sl, np.where(is_tp, tp, c[last]))
+
+        ret = side * (exit_price / entry - 1) * 100
+        parts.append(pd.DataFrame({
+            "symbol": table.symbol,
+            "entry_time": table.open_time[e_idx] + table.step,
+            "exit_time": table.open_time[exit_idx] + table.step,
+            "side": np.where(side == 1, "BUY", "SELL"),
+            "entry": entry,
+            "exit": exit_price,
+            "outcome": np.where(is_sl, "SL", np.where(is_tp, "TP", "OPEN")),
+            "ret_pct": ret,
+            "r": ret / sl_pct,
+        }))
+    if not parts:
+        return _empty_trades()
+    trades = pd.concat(parts, ignore_index=True)
+    for name in ("entry_time", "exit_time"):
+        trades[name] = pd.to_datetime(trades[name], unit="ms", utc=True)
+    return trades
+
+
+def equity_curve(trades: pd.DataFrame, risk: float = RISK_PER_TRADE) -> pd.Series:
+    """Equity (fillon nga 1.0) sipas kohës së daljes; çdo trade rrezikon `risk` të equity-t."""
+    if trades.empty:
+        return pd.Series(dtype=float)
+    t = trades.sort_values("exit_time", kind="stable")
+    eq = np.cumprod(1 + risk * t["r"].to_numpy())
+    return pd.Series(eq, index=pd.DatetimeIndex(t["exit_time"]), name="equity")
+
+
+def summarize(trades: pd.DataFrame, risk: float = RISK_PER_TRADE) -> dict:
+    """Statistikat kryesore të një grupi trade-sh."""
+    if trades.empty:
+        return {"trades": 0, "win_rate": 0.0, "avg_r": 0.0, "total_r": 0.0,
+                "profit_factor": 0.0, "final_equity": 1.0, "max_drawdown": 0.0}
+    r = trades["r"].to_numpy()
+    eq = equity_curve(trades, risk).to_numpy()
+    peak = np.maximum.accumulate(np.r_[1.0, eq])
+    drawdown = 1 - np.r_[1.0, eq] / peak
+    gains, losses = r[r > 0].sum(), -r[r < 0].sum()
+    return {
+        "trades": int(r.size),
+        "win_rate": float((trades["outcome"] == "TP").mean()),
+        "avg_r": float(r.mean()),
+        "total_r": float(r.sum()),
+        "profit_factor": float(gains / losses) if losses > 0 else float("inf"),
+        "final_equity": float(eq[-1]),
+        "max_drawdown": float(drawdown.max()),
+    }
+
+
+# ======================================================
+#                     RUNNER
+# ======================================================
+
+def backtest_symbol(strategy: str, symbol: str, params: Optional[dict] = None,
+                    start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    table = build_table(strategy, symbol, start, end)
+    if table is None:
+        return _empty_trades()
+    p = dict(table.cfg["params"])
+    p.update(params or {})
+    idx, sides = evaluate(table, p)
+    return simulate_trades(table, idx, sides, p["sl_pct"], p["tp_pct"])
+
+
+def _run_one(args) -> pd.DataFrame:
+    return backtest_symbol(*args)
+
+
+def stored_symbols(strategy: str) -> List[str]:
+    """Simbolet që kanë histori në ohlcv_store për intervalin e strategjisë."""
+    folder = os.path.join(ohlcv_store.DATA_DIR, STRATEGIES[strategy]["interval"])
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name[:-4] for name in os.listdir(folder) if name.endswith(".bin"))
+
+
+def run(strategy: str, symbols: List[str], params: Optional[dict] = None,
+        start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None,
+        workers: Optional[int] = None) -> pd.DataFrame:
+    """Backtest për të gjithë simbolet (një proces për simbol); kthen të gjitha trade-t."""
+    jobs = [(strategy, s, params, start, end) for s in symbols]
+    if workers == 1 or len(jobs) <= 1:
+        results = [_run_one(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run_one, jobs, chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))))
+    results = [r for r in results if not r.empty]
+    if not results:
+        return _empty_trades()
+    return pd.concat(results, ignore_index=True).sort_values("entry_time", kind="stable", ignore_index=True)
+
+
+def backfill(strategy: str, symbols: List[str], days: int):
+    """Shkarkon nga Binance historinë që mungon (days + warmup) në ohlcv_store."""
+    import market_gateway
+
+    cfg = STRATEGIES[strategy]
+    interval = cfg["interval"]
+    need = days * 86_400_000 // INTERVAL_MS[interval] + cfg["base_limit"]
+    limiter = market_gateway.RateLimiter(market_gateway.BINANCE_WEIGHT_PER_MINUTE)
+    for symbol in symbols:
+        open_time, _ = ohlcv_store.load(symbol, interval)
+        if open_time.size >= need:
+            continue
+        try:
+            got = market_gateway.download_klines(
+                symbol, interval, need,
+                before_request=lambda n: limiter.acquire(market_gateway.klines_weight(n)),
+            )
+        except Exception as e:
+            print(f"[BACKTEST] {symbol}: backfill dështoi: {e}")
+            continue
+        added = ohlcv_store.backfill(symbol, interval, *got)
+        print(f"[BACKTEST] {symbol}: +{added} qirinj {interval}")
+
+
+# ======================================================
+#            PARITET ME BOTIN (crypto_swing)
+# ======================================================
+
+# Strategjitë me kontroll pariteti ndaj botit; të tjerat raportohen si të paverifikuara
+PARITY_CHECKED = {"crypto_swing"}
+
+def check_parity(symbol: str, samples: int = 200, seed: int = 0) -> Dict[str, int]:
+    """
+    Krahason tabelën e faktorëve me funksionet e crypto_swing_bot mbi
+    dritaret që do t'i shihte boti (qirinj të rastësishëm). Kthen numrin e
+    mospërputhjeve për faktor.
+    """
+    import crypto_swing_bot as bot
+    from bar_aggregator import resample_aligned
+    from candle_store import columns_to_frame
+
+    table = build_table("crypto_swing", symbol)
+    if table is None:
+        return {}
+    col = table.columns
+    cfg = table.cfg
+    rng = np.random.default_rng(seed)
+    ts = rng.choice(np.arange(table.start, len(table)), size=min(samples, len(table) - table.start), replace=False)
+    ohlcv = np.vstack([table.open, table.high, table.low, table.close, table.volume])
+    sign = {"bull": 1, "bear": -1, "choppy": 0, "neutral": 0}
+    bad: Dict[str, int] = {}
+
+    def expect(name, ok):
+        bad[name] = bad.get(name, 0) + (not ok)
+
+    for t in ts.tolist():
+        lo = t - cfg["base_limit"] + 1
+        base = columns_to_frame(table.open_time[lo:t + 1], ohlcv[:, lo:t + 1])
+        d1 = resample_aligned(base, "1d").iloc[-cfg["htf_window"]:]
+        h4 = base.iloc[-cfg["window"]:]
+        price = float(h4["Close"].iloc[-1])
+
+        expect("trend", sign[bot.detect_trend_d1(d1)] == col["trend"][t])
+        expect("structure", sign[bot.classify_structure(h4)[0]] == col["structure"][t])
+        expect("adx", abs(bot.calculate_adx(h4, 14) - col["adx"][t]) < 1e-6 * max(1.0, col["adx"][t]))
+        expect("vol_ratio", abs(bot.check_volume_confirmation(h4, 20)[1] - col["vol_ratio"][t]) < 1e-9)
+        ob = bot.find_recent_order_block(h4, "bull")
+        expect("ob_bull", (ob is not None and ob[0] <= price <= ob[1] * 1.01) == col["ob_bull"][t])
+        ob = bot.find_recent_order_block(h4, "bear")
+        expect("ob_bear", (ob is not None and ob[0] * 0.99 <= price <= ob[1]) == col["ob_bear"][t])
+        expect("fvg_bull", bot.has_recent_fvg(h4, "bull") == col["fvg_bull"][t])
+        expect("fvg_bear", bot.has_recent_fvg(h4, "bear") == col["fvg_bear"][t])
+        div = bot.detect_rsi_divergence(h4, rsi_period=14, lookback=40)
+        expect("div_bull", div[0] == col["div_bull"][t])
+        expect("div_bear", div[1] == col["div_bear"][t])
+        expect("ema_align", sign[bot.check_ema_alignment(h4)] == col["ema_align"][t])
+        expect("rsi", abs(bot.calculate_rsi(h4, 14) - col["rsi"][t]) < 1e-6)
+
+        sup, res = bot.find_support_resistance_levels(h4, lookback=100)
+        near_res, near_sup = table.near_sr(np.array([t]))
+        expect("near_res", bot.is_near_sr_level(price, res, 0.015) == near_res[0])
+        expect("near_sup", bot.is_near_sr_level(price, sup, 0.015) == near_sup[0])
+    return bad
+
+
+# ======================================================
+#                       CLI
+# ======================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest i vektorizuar për botat crypto")
+    parser.add_argument("strategy", choices=sorted(STRATEGIES))
+    parser.add_argument("--symbols", nargs="*", help="default: të gjithë simbolet në ohlcv_store")
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--backfill", action="store_true", help="shkarko historinë që mungon nga Binance")
+    parser.add_argument("--check", type=int, default=0, metavar="N", help="kontroll pariteti me N dritare (swing)")
+    parser.add_argument("--out", default=None, help="CSV e trade-ve")
+    args = parser.parse_args()
+
+    symbols = args.symbols or stored_symbols(args.strategy)
+    if args.backfill:
+        backfill(args.strategy, symbols, args.days)
+        symbols = args.symbols or stored_symbols(args.strategy)
+    if not symbols:
+        print(f"[BACKTEST] S'ka histori në {ohlcv_store.DATA_DIR} për {args.strategy}.")
+        return
+
+    if args.check:
+        if args.strategy not in PARITY_CHECKED:
+            print(f"[BACKTEST] --check mbështetet vetëm për {', '.join(sorted(PARITY_CHECKED))}.")
+            return
+        for symbol in symbols:
+            bad = check_parity(symbol, args.check)
+            print(f"[CHECK] {symbol}: " + (", ".join(f"{k}={v}" for k, v in bad.items() if v) or "OK"))
+        print(
+            "[CHECK] Kujdes: krahasohen vetëm faktorët. crypto_swing_bot live sot nuk nxjerr sinjale "
+            "(analyze_symbol dështon te MA50: KeyError 'close', buy_score para caktimit), "
+            "kështu që OK këtu nuk do të thotë backtest == boti live."
+        )
+        return
+
+    start = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=args.days)
+    t0 = time.perf_counter()
+    trades = run(args.strategy, symbols, start=start, workers=args.workers)
+    elapsed = time.perf_counter() - t0
+
+    stats = summarize(trades)
+    print(f"[BACKTEST] {args.strategy}: {len(symbols)} simbole, {args.days} ditë, {elapsed:.1f}s")
+    if args.strategy not in PARITY_CHECKED:
+        print(
+            f"[BACKTEST] KUJDES: {args.strategy} I PAVERIFIKUAR – faktorët nuk janë krahasuar me botin "
+            f"(pa --check), rezultatet mund të mos përputhen me sinjalet live."
+        )
+    for key, value in stats.items():
+        print(f"  {key:<14} {value:.4f}" if isinstance(value, float) else f"  {key:<14} {value}")
+    if not trades.empty:
+        per_symbol = trades.groupby("symbol")["r"].agg(["count", "sum"]).sort_values("sum", ascending=False)
+        print(per_symbol.head(10).to_string())
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{args.strategy}_trades.csv")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    trades.to_csv(out, index=False)
+    equity_curve(trades).to_csv(out.replace(".csv", "_equity.csv"))
+    print(f"[BACKTEST] Trade-t: {out}")
+
+
+if __name__ == "__main__":
+    main()
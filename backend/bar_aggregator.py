@@ -0,0 +1,263 @@
+"""
+Agregim inkremental i qirinjve në timeframe më të lartë (p.sh. 1H -> 4H, 1H -> D1).
+
+Në vend që çdo skanim të kopjojë gjithë historinë 1H dhe të bëjë pesë
+`resample` (first/max/min/last/sum), `BarAggregator` mban bar-et e mbyllura
+dhe rreshtat bazë të bar-it të fundit (ende të hapur). Në çdo `sync()` palos
+vetëm qirinjtë bazë të rinj (dhe përditësimin e qirit të fundit që ende po
+formohet), kështu puna për skanim është O(qirinj të rinj).
+
+Rezultati përputhet me:
+    df[~df.index.duplicated(keep="last")].resample(rule).agg(first/max/min/last/sum).dropna()
+  - bin-et "4h" (orë) janë absolute nga mesnata lokale e rreshtit të parë
+    (origin="start_day" i pandas)
+  - bin-et "1d" ndjekin mesnatën lokale (me DST), si te pandas
+  - bar-i i fundit mund të jetë i pjesshëm: `partial()` e tregon, dhe
+    `frame(include_partial=False)` e heq
+  - bar-i i parë i dritares ndërtohet vetëm nga rreshtat brenda dritares
+
+Rishikimet e qirinjve bazë më të vjetër se i fundit i palosur injorohen
+(yfinance ndryshon zakonisht vetëm qirin që po formohet).
+
+Për Binance (qirinj të përafruar me epokën UTC) `resample_aligned` nxjerr
+timeframe më të lartë nga një seri bazë, me të njëjtat bin-e si exchange-i.
+"""
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from candle_store import INTERVAL_MS, OHLCV_COLUMNS, columns_to_frame
+
+_HOUR_MS = 3_600_000
+_DAY_MS = 86_400_000
+
+
+def _rule_ms(rule: str) -> Tuple[int, bool]:
+    """'4h' -> (4 orë në ms, False); '1d' -> (1 ditë, True = mesnatë lokale)."""
+    rule = rule.lower()
+    n = int(rule[:-1] or 1)
+    if rule.endswith("h"):
+        return n * _HOUR_MS, False
+    if rule.endswith("d") and n == 1:
+        return _DAY_MS, True
+    raise ValueError(f"rule i pambështetur: {rule}")
+
+
+def _aggregate(bins: np.ndarray, cols: np.ndarray):
+    """Grupon rreshtat e njëpasnjëshëm me të njëjtin bin -> (bins, ohlcv (5, k))."""
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    ends = np.r_[starts[1:], bins.size] - 1
+    out = np.empty((len(OHLCV_COLUMNS), starts.size), dtype=np.float64)
+    out[0] = cols[0, starts]
+    out[1] = np.maximum.reduceat(cols[1], starts)
+    out[2] = np.minimum.reduceat(cols[2], starts)
+    out[3] = cols[3, ends]
+    out[4] = np.add.reduceat(cols[4], starts)
+    return bins[starts], out
+
+
+def _dedupe_sorted(t: np.ndarray, cols: np.ndarray):
+    """Rendit sipas kohës dhe mban rreshtin e fundit për çdo kohë (si duplicated(keep="last"))."""
+    order = np.argsort(t, kind="stable")
+    t, cols = t[order], cols[:, order]
+    keep = np.r_[t[1:] != t[:-1], True]
+    return t[keep], cols[:, keep]
+
+
+class BarAggregator:
+    """Mban bar-et e një rule (p.sh. "4h") për një simbol, të ushqyera nga qirinj bazë."""
+
+    def __init__(self, rule: str = "4h"):
+        self.rule = rule
+        self.step, self.local_days = _rule_ms(rule)
+        self.reset()
+
+    def reset(self):
+        self.origin: Optional[int] = None       # ms; bin = (t - origin) // step
+        self.tz = None
+        self.last_base: Optional[int] = None    # open_time (ms, UTC) i qirit bazë të fundit
+        self.bins = np.empty(0, dtype=np.int64)  # bin-et e mbyllura
+        self.bars = np.empty((len(OHLCV_COLUMNS), 0), dtype=np.float64)
+        self.pending_t = np.empty(0, dtype=np.int64)  # rreshtat bazë të bar-it të hapur
+        self.pending = np.empty((len(OHLCV_COLUMNS), 0), dtype=np.float64)
+
+    # ---------------- bin-et ----------------
+
+    def _clock(self, t: np.ndarray) -> np.ndarray:
+        """Koha mbi të cilën bëhet binning: UTC për orë, ora lokale për ditë."""
+        if not self.local_days or self.tz is None:
+            return t
+        idx = pd.DatetimeIndex(t.view("datetime64[ms]")).tz_localize("UTC").tz_convert(self.tz)
+        return idx.tz_localize(None).as_unit("ms").asi8
+
+    def _bin_of(self, t: np.ndarray) -> np.ndarray:
+        return (self._clock(t) - self.origin) // self.step
+
+    def _origin_for(self, first: pd.Timestamp) -> int:
+        if self.local_days:
+            return 0  # mesnatat lokale: bin = ditë nga epoka në orën lokale
+        return int(first.normalize().value // 1_000_000)
+
+    def _label(self, bins: np.ndarray) -> pd.DatetimeIndex:
+        ms = bins * self.step + self.origin
+        idx = pd.DatetimeIndex(ms.view("datetime64[ms]"))
+        if self.tz is None:
+            return idx
+        if self.local_days:
+            return idx.tz_localize(self.tz, ambiguous=True, nonexistent="shift_forward")
+        return idx.tz_localize("UTC").tz_convert(self.tz)
+
+    # ---------------- palosja ----------------
+
+    def _fold(self, t: np.ndarray, cols: np.ndarray):
+        if t.size == 0:
+            return
+        t = np.concatenate([self.pending_t, t])
+        cols = np.concatenate([self.pending, cols], axis=1)
+        t_bins = self._bin_of(t)
+        bins, bars = _aggregate(t_bins, cols)
+
+        # bar-i i fundit mbetet i hapur; rreshtat e tij ruhen për përditësime
+        keep = t_bins == bins[-1]
+        self.pending_t = t[keep]
+        self.pending = cols[:, keep]
+        if bins.size > 1:
+            self.bins = np.concatenate([self.bins, bins[:-1]])
+            self.bars = np.concatenate([self.bars, bars[:, :-1]], axis=1)
+        self.last_base = int(t[-1])
+
+    def _resume_at(self, index: pd.DatetimeIndex, ns: np.ndarray, origin: int) -> Optional[int]:
+        """
+        Pozicioni i qirit bazë të fundit të palosur në `ns`, ose None kur
+        gjendja nuk vazhdon dot (dritare e re, tz/origin tjetër, qiri i humbur).
+        """
+        if self.last_base is None or self.tz != index.tz:
+            return None
+        if (origin - self.origin) % self.step:
+            return None
+        last = self.last_base * 1_000_000
+        start = int(np.searchsorted(ns, last))
+        if start == ns.size or ns[start] != last:
+            return None
+        return start
+
+    def _bin_end(self, b: int) -> int:
+        """Fillimi (ms, UTC) i bin-it pas `b`."""
+        if self.local_days and self.tz is not None:
+            return int(self._label(np.array([b + 1]))[0].value // 1_000_000)
+        return (b + 1) * self.step + self.origin
+
+    def sync(self, base: pd.DataFrame) -> pd.DataFrame:
+        """
+        Përditëson bar-et me qirinjtë bazë të rinj të `base` (dritarja e plotë
+        e botit) dhe kthen DataFrame-in e rezultatit (përfshirë bar-in e pjesshëm).
+
+        Konvertohen dhe binohen vetëm rreshtat nga qiri i fundit i palosur e
+        tutje; pjesa tjetër e dritares preket vetëm me searchsorted.
+        """
+        if base is None or base.empty:
+            return pd.DataFrame()
+
+        index = pd.DatetimeIndex(base.index)
+        ns = index.as_unit("ns").asi8  # pamje, UTC edhe për indeks me tz
+        origin = self._origin_for(index[0])
+        start = self._resume_at(index, ns, origin)
+        if start is None:
+            # rindërtim: pastro gjithë dritaren një herë
+            if index.has_duplicates:
+                keep = ~index.duplicated(keep="last")
+                base, index = base[keep], index[keep]
+            if not index.is_monotonic_increasing:
+                order = np.argsort(index.asi8, kind="stable")
+                base, index = base.iloc[order], index[order]
+            ns = index.as_unit("ns").asi8
+            self.reset()
+            self.tz = index.tz
+            self.origin = self._origin_for(index[0])
+            start = 0
+        else:
+            if origin != self.origin:
+                # dritarja u zhvendos me ditë të plota: bin-et mbeten, ndrysho vetëm numërimin
+                shift = (origin - self.origin) // self.step
+                self.bins -= shift
+                self.origin = origin
+            # qiri bazë i fundit mund të jetë përditësuar -> hiqe nga pending dhe palose sërish
+            drop = self.pending_t >= self.last_base
+            self.pending_t = self.pending_t[~drop]
+            self.pending = self.pending[:, ~drop]
+
+        # vetëm pamje numpy të kolonave; kopjohen/binohen vetëm rreshtat nga `start`
+        values = [base[name].to_numpy(dtype=np.float64) for name in OHLCV_COLUMNS]
+        t = ns[start:] // 1_000_000
+        cols = np.vstack([v[start:] for v in values])
+        if t.size > 1 and not (t[1:] > t[:-1]).all():
+            t, cols = _dedupe_sorted(t, cols)
+        self._fold(t, cols)
+
+        # Bar-i i parë i dritares: vetëm rreshtat brenda dritares (si pandas)
+        first_bin = int(self._bin_of(ns[:1] // 1_000_000)[0])
+        lo = int(np.searchsorted(self.bins, first_bin))
+        self.bins = self.bins[lo:]
+        self.bars = self.bars[:, lo:]
+        if self.bins.size and self.bins[0] == first_bin:
+            head_end = int(np.searchsorted(ns, self._bin_end(first_bin) * 1_000_000))
+            head_t, head = _dedupe_sorted(ns[:head_end], np.vstack([v[:head_end] for v in values]))
+            _, bar = _aggregate(np.full(head_t.size, first_bin), head)
+            self.bars[:, 0] = bar[:, 0]
+
+        return self.frame()
+
+    # ---------------- rezultati ----------------
+
+    def partial(self, now_ms: Optional[int] = None) -> bool:
+        """True nëse intervali i bar-it të fundit nuk ka përfunduar ende."""
+        if self.pending_t.size == 0:
+            return False
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        last_bin = self._bin_of(self.pending_t[-1:])
+        end = self._label(last_bin + 1)[0]
+        return now_ms < int(end.value // 1_000_000)
+
+    def frame(self, include_partial: bool = True) -> pd.DataFrame:
+        """Bar-et si DataFrame OHLCV; pa `include_partial` hiqet bar-i që ende po formohet."""
+        bins, bars = self.bins, self.bars
+        if self.pending_t.size and (include_partial or not self.partial()):
+            pb, pbar = _aggregate(self._bin_of(self.pending_t), self.pending)
+            bins = np.concatenate([bins, pb])
+            bars = np.concatenate([bars, pbar], axis=1)
+        if bins.size == 0:
+            return pd.DataFrame()
+        return pd.DataFrame(dict(zip(OHLCV_COLUMNS, bars)), index=self._label(bins), copy=False)
+
+
+# ======================================================
+#        TIMEFRAME MË I LARTË NGA SERIA BAZË (BINANCE)
+# ======================================================
+
+def resample_aligned(base: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    Nxjerr qirinjtë `interval` (p.sh. "1d" nga "4h", "1h" nga "5m") nga
+    DataFrame-i bazë me indeks UTC (si CandleSeries.to_frame).
+
+    Bin-et janë nga epoka UTC, si te Binance Futures (D1 hapet 00:00 UTC),
+    kështu që një bar i plotë përputhet me qirin e exchange-it. Bin-i i parë
+    hiqet nëse seria bazë fillon në mes të tij; i fundit mund të jetë ende
+    i hapur, njësoj si qiri i fundit nga /fapi/v1/klines.
+    """
+    if base is None or base.empty:
+        return pd.DataFrame()
+
+    lowercase = "Open" not in base.columns
+    names = [c.lower() for c in OHLCV_COLUMNS] if lowercase else list(OHLCV_COLUMNS)
+    step = INTERVAL_MS[interval]
+
+    open_time = pd.DatetimeIndex(base.index).as_unit("ms").asi8
+    cols = np.vstack([base[name].to_numpy(dtype=np.float64) for name in names])
+    bins, bars = _aggregate(open_time // step, cols)
+
+    if open_time[0] % step:
+        bins, bars = bins[1:], bars[:, 1:]
+    return columns_to_frame(bins * step, bars, lowercase=lowercase)
@@ -0,0 +1,86 @@
+"""
+Benchmark: dekodimi i përgjigjes /fapi/v1/klines (1500 qirinj).
+
+Krahason:
+  - legacy: resp.json() + float() për çdo fushë + pd.DataFrame + pd.to_datetime
+  - fast:   decode_klines(bytes: orjson + np.asarray) + CandleSeries.extend + to_frame()
+
+Përdorim:
+    python benchmarks/bench_kline_decode.py [n_candles] [repeats]
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+from candle_store import (  # noqa: E402
+    CandleSeries,
+    _synthetic_klines,
+    decode_klines,
+)
+
+
+def make_payload(n: int) -> bytes:
+    """Përgjigje sintetike me 12 fushat e Binance për çdo kline."""
+    rows = _synthetic_klines(n, 300_000, seed=7)
+    full = [r + ["123456.78901234", 4321, "61.234", "7890.12345678", "0"] for r in rows]
+    return json.dumps(full, separators=(",", ":")).encode()
+
+
+def legacy_decode(raw: bytes) -> pd.DataFrame:
+    data = json.loads(raw)
+    rows = []
+    for k in data:
+        rows.append(
+            (
+                int(k[0]),
+                float(k[1]),
+                float(k[2]),
+                float(k[3]),
+                float(k[4]),
+                float(k[5]),
+            )
+        )
+    df = pd.DataFrame(rows, columns=["open_time", "Open", "High", "Low", "Close", "Volume"])
+    df["open_time"] = pd.to_datetime(df["open_time"], unit="ms", utc=True)
+    df.set_index("open_time", inplace=True)
+    return df.sort_index()
+
+
+def fast_decode(raw: bytes, capacity: int) -> pd.DataFrame:
+    series = CandleSeries(capacity=capacity)
+    series.extend(*decode_klines(raw))
+    return series.to_frame()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    raw = make_payload(n)
+
+    # kontrollo që të dyja rrugët japin të njëjtat të dhëna
+    ref = legacy_decode(raw)
+    got = fast_decode(raw, n)
+    assert (ref.index == got.index).all()
+    assert (ref.to_numpy() == got.to_numpy()).all()
+
+    cases = [
+        ("legacy json+float+DataFrame", lambda: legacy_decode(raw)),
+        ("decode_klines (bytes)", lambda: decode_klines(raw)),
+        ("decode_klines + to_frame", lambda: fast_decode(raw, n)),
+    ]
+
+    print(f"[BENCH] {n} qirinj, {len(raw)} bytes, {repeats} përsëritje")
+    base = None
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=repeats, repeat=3)) / repeats
+        base = base or best
+        print(f"  {name:<30} {best * 1000:8.3f} ms   x{base / best:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark: 1H -> 4H për forex_swing_bot.
+
+Krahason për një dritare 1H prej 60 ditësh që lëviz me një qiri për skanim:
+  - legacy:      copy + drop duplicates + pesë resample (resample_to_4h i vjetër)
+  - incremental: BarAggregator("4h").sync() që palos vetëm qirinjtë e rinj
+
+Para matjes kontrollon që të dyja rrugët japin të njëjtin rezultat (përfshirë
+kalimet DST, vrimat e fundjavës, dublikatat dhe qirin e fundit që ndryshon).
+
+Përdorim:
+    python benchmarks/bench_resample_4h.py [n_scans]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from bar_aggregator import BarAggregator  # noqa: E402
+
+WINDOW = 60 * 24  # LOOKBACK_DAYS_4H = 60 ditë 1H
+
+
+def legacy_resample(h1: pd.DataFrame, rule: str = "4h") -> pd.DataFrame:
+    df = h1.copy()
+    df = df[~df.index.duplicated(keep="last")]
+    out = pd.DataFrame()
+    out["Open"] = df["Open"].resample(rule).first()
+    out["High"] = df["High"].resample(rule).max()
+    out["Low"] = df["Low"].resample(rule).min()
+    out["Close"] = df["Close"].resample(rule).last()
+    out["Volume"] = df["Volume"].resample(rule).sum()
+    return out.dropna()
+
+
+def make_h1(seed: int = 0, tz: str = "Europe/London") -> pd.DataFrame:
+    """Seri 1H sintetike si te yfinance për FX: pa fundjavë, me vrima, në tz lokale."""
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range("2025-01-01", "2025-12-31", freq="1h", tz="UTC")
+    idx = idx[idx.dayofweek < 5]
+    idx = idx[rng.random(len(idx)) > 0.02]
+    close = 1.1 + np.cumsum(rng.normal(0, 0.0005, len(idx)))
+    df = pd.DataFrame(
+        {
+            "Open": close + rng.normal(0, 0.0002, len(idx)),
+            "High": close + 0.001,
+            "Low": close - 0.001,
+            "Close": close,
+            "Volume": rng.integers(0, 1000, len(idx)).astype(float),
+        },
+        index=idx,
+    )
+    return df.tz_convert(tz)
+
+
+def windows(h1: pd.DataFrame, n_scans: int, window: int = WINDOW):
+    """Dritare që lëvizin me një qiri; qiri i fundit ndryshon si qiri që po formohet."""
+    for end in range(window, min(len(h1), window + n_scans)):
+        w = h1.iloc[end - window:end].copy()
+        if end % 2:
+            w.iloc[-1, w.columns.get_loc("Close")] += 0.0003
+            w.iloc[-1, w.columns.get_loc("High")] += 0.0004
+        if end % 5 == 0:
+            w = pd.concat([w, w.iloc[-1:]])
+        yield w
+
+
+def time_sync(scans) -> float:
+    agg = BarAggregator("4h")
+    agg.sync(scans[0])
+    t0 = time.perf_counter()
+    for w in scans[1:]:
+        agg.sync(w)
+    return (time.perf_counter() - t0) / (len(scans) - 1)
+
+
+def main():
+    n_scans = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    h1 = make_h1()
+    scans = list(windows(h1, n_scans))
+
+    for rule in ("4h", "1d"):
+        agg = BarAggregator(rule)
+        for w in scans:
+            ref = legacy_resample(w, "D" if rule == "1d" else rule)
+            got = agg.sync(w)
+            assert (ref.index == got.index).all(), rule
+            assert np.allclose(ref.to_numpy(dtype=float), got.to_numpy()), rule
+
+    t0 = time.perf_counter()
+    for w in scans:
+        legacy_resample(w)
+    legacy = (time.perf_counter() - t0) / len(scans)
+
+    incremental = time_sync(scans)
+    # dritare 4x më e madhe: sync duhet të mbetet ~i njëjtë (O(qirinj të rinj))
+    wide = time_sync(list(windows(h1, min(n_scans, 500), WINDOW * 4)))
+
+    print(f"[BENCH] {len(scans)} skanime, dritare {WINDOW} qirinj 1H")
+    print(f"  {'legacy copy+5x resample':<28} {legacy * 1000:8.3f} ms")
+    print(f"  {'BarAggregator.sync':<28} {incremental * 1000:8.3f} ms   x{legacy / incremental:5.1f}")
+    print(f"  {'BarAggregator.sync (4x)':<28} {wide * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
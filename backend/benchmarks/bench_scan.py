@@ -0,0 +1,495 @@
+"""
+Benchmark: një kalim i plotë skanimi i botit mbi fixture kline të regjistruara.
+
+Fixture-t janë folder-a capture (formati i capture.py). Nëse nuk jepet
+`--fixtures`, krijohen një herë me seri sintetike deterministe për 100/400
+simbole (në benchmarks/fixtures/, jashtë git-it) dhe ripërdoren. Riluajtja
+bëhet me capture.Replayer: fetch-et kthejnë frame-in e rekordit, sinjalet
+mblidhen, dhe çdo thirrje HTTP (requests) bllokohet, që asnjë kalim të mos
+prekë rrjetin.
+
+Tre kalime mbi të njëjtat rekorde, secili me modul të freskët të botit:
+  - kohë:    simbole/sekondë dhe latenca p50/p99 për simbol (pa instrumentim)
+  - faktorë: koha e çdo funksioni të botit (inclusive dhe self)
+  - memorie: piku i alokimeve (tracemalloc) gjatë analizës së një simboli
+
+Rezultati ruhet si JSON (benchmarks/results/scan_{bot}_{n}.json). Me
+`--baseline` krahasohet me një rezultat të mëparshëm dhe procesi del me kod 1
+nëse ndonjë metrikë përkeqësohet më shumë se `--tolerance`. Nëse më shumë se
+`--max-error-ratio` e analizave hedhin exception, rezultati nuk ruhet dhe
+procesi del me kod 1: kohët do të matnin rrugën e gabimit, jo analizën.
+Një bot që nuk importohet raportohet pa traceback dhe procesi del me kod 2.
+
+Gjendja e botave sot (BOT_STATUS; `--help` e liston):
+  - forex_swing_bot, forex_scalper_bot: benchmark-ohen (kërkojnë yfinance)
+  - crypto_scalp_bot: nuk importohet (IndentationError te moduli)
+  - crypto_swing_bot: importohet, por çdo analyze_symbol hedh exception
+    (calculate_ma lexon df['close'] -> KeyError, pastaj buy_score para
+    inicializimit), kështu që del me kod 1 nga `--max-error-ratio`
+
+Përdorim:
+    python benchmarks/bench_scan.py forex_swing_bot --symbols 100 400
+    python benchmarks/bench_scan.py forex_swing_bot --symbols 100 --baseline benchmarks/results/
+    python benchmarks/bench_scan.py forex_scalper_bot --fixtures data/capture/forex_scalper_bot
+"""
+import argparse
+import functools
+import inspect
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import zlib
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import requests  # noqa: E402
+
+import capture  # noqa: E402
+from candle_store import INTERVAL_MS, columns_to_frame  # noqa: E402
+
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# Çfarë regjistron secili bot në capture (shih CAPTURE.record te botat)
+FIXTURES = {
+    "crypto_swing_bot": {"kind": "klines", "frames": {"4h": 1566}, "lower": False, "scan_seconds": 600},
+    "crypto_scalp_bot": {"kind": "klines", "frames": {"5m": 3012}, "lower": True, "scan_seconds": 600},
+    "forex_swing_bot": {"kind": "ohlc_batch", "frames": {"1d": 180, "1h": 60 * 24}, "lower": False, "scan_seconds": 900},
+    "forex_scalper_bot": {"kind": "ohlc_batch", "frames": {"5m": 3 * 288}, "lower": False, "scan_seconds": 60},
+}
+FIXTURE_VERSION = 1
+
+# Çfarë pritet sot nga secili bot (shfaqet te --help; None = benchmark-ohet)
+BOT_STATUS = {
+    "crypto_swing_bot": "çdo analizë dështon (KeyError 'close' te calculate_ma)",
+    "crypto_scalp_bot": "nuk importohet (IndentationError)",
+    "forex_swing_bot": None,
+    "forex_scalper_bot": None,
+}
+FIXTURE_END_MS = 1767571200000  # 2026-01-05 00:00 UTC, që fixture-t të jenë të njëjta kudo
+
+# Metrikat që krahasohen me baseline: (rruga në JSON, True = më e madhe është më mirë)
+CHECKS = [
+    ("symbols_per_second", True),
+    ("latency_ms.p50", False),
+    ("latency_ms.p99", False),
+    ("peak_memory_mb.analysis", False),
+]
+
+# Funksione të botit që nuk janë faktorë analize
+SKIP_FUNCTIONS = {"main_loop", "get_top_usdt_perps"}
+
+# Pjesa maksimale e analizave që mund të hedhin exception para se matja të refuzohet
+MAX_ERROR_RATIO = 0.05
+
+
+# ======================================================
+#                     FIXTURES
+# ======================================================
+
+def _symbol_names(bot_id: str, n: int) -> List[str]:
+    suffix = "USDT" if bot_id.startswith("crypto") else "=X"
+    return [f"S{i:03d}{suffix}" for i in range(n)]
+
+
+def _synthetic_series(n: int, seed: int) -> np.ndarray:
+    """OHLCV (5, n): random walk me regjime trendi, që faktorët të ndizen."""
+    rng = np.random.default_rng(seed)
+    drift = 0.002 * np.sin(np.arange(n) / rng.uniform(40, 160) + rng.uniform(0, 6.28))
+    close = 100.0 * np.exp(np.cumsum(drift + rng.normal(0, 0.008, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.003, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.003, n)))
+    volume = np.abs(rng.normal(1000, 300, n)) * (1 + 2 * (rng.random(n) < 0.05))
+    return np.vstack([open_, high, low, close, volume])
+
+
+def _window(open_time: np.ndarray, ohlcv: np.ndarray, ts_ms: int, step: int, size: int, lower: bool) -> pd.DataFrame:
+    """Dritarja që sheh boti në `ts_ms`: qiri i fundit është ende duke u formuar."""
+    last = int(np.searchsorted(open_time, ts_ms, side="right"))
+    t = open_time[last - size:last]
+    w = ohlcv[:, last - size:last].copy()
+    frac = (ts_ms - t[-1]) / step
+    o, c = w[0, -1], w[3, -1]
+    w[3, -1] = o + (c - o) * frac
+    w[1, -1] = max(o, w[3, -1]) + (w[1, -1] - max(o, c)) * frac
+    w[2, -1] = min(o, w[3, -1]) - (min(o, c) - w[2, -1]) * frac
+    w[4, -1] *= frac
+    return columns_to_frame(t, w, lowercase=lower)
+
+
+def make_fixture(bot_id: str, n_symbols: int, passes: int, root: str = FIXTURES_DIR) -> str:
+    """Krijon (ose ripërdor) folder-in capture për `n_symbols` x `passes`; kthen rrugën."""
+    spec = FIXTURES[bot_id]
+    base = os.path.join(root, f"{n_symbols}x{passes}")
+    directory = os.path.join(base, bot_id)
+    manifest_path = os.path.join(directory, "fixture.json")
+    manifest = {"version": FIXTURE_VERSION, "bot_id": bot_id, "symbols": n_symbols, "passes": passes}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            if json.load(f) == manifest:
+                return directory
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+    scan_ms = spec["scan_seconds"] * 1000
+    symbols = _symbol_names(bot_id, n_symbols)
+    series = {}
+    for interval, size in spec["frames"].items():
+        step = INTERVAL_MS[interval]
+        n = size + passes * scan_ms // step + 2
+        last = (FIXTURE_END_MS + passes * scan_ms) // step * step
+        open_time = last - np.arange(n - 1, -1, -1, dtype=np.int64) * step
+        series[interval] = (step, size, open_time, {
+            s: _synthetic_series(n, seed=zlib.crc32(f"{s}/{interval}".encode())) for s in symbols
+        })
+
+    writer = capture.CaptureWriter(bot_id, directory=base)
+    for p in range(passes):
+        ts_p = FIXTURE_END_MS + p * scan_ms
+        for k, (interval, (step, size, open_time, data)) in enumerate(series.items()):
+            if spec["kind"] == "klines":
+                for i, symbol in enumerate(symbols):
+                    frame = _window(open_time, data[symbol], ts_p + i, step, size, spec["lower"])
+                    writer.record("klines", (symbol, interval, size), {"": frame}, ts_ms=ts_p + i)
+            else:
+                frames = {s: _window(open_time, data[s], ts_p + k, step, size, spec["lower"]) for s in symbols}
+                writer.record("ohlc_batch", (interval,), frames, ts_ms=ts_p + k)
+    writer.close()
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    return directory
+
+
+# ======================================================
+#                     MATJA
+# ======================================================
+
+class FactorTimer:
+    """Mbështjell funksionet e botit dhe mat kohën inclusive dhe self të secilit."""
+
+    def __init__(self):
+        self.stats: Dict[str, List[float]] = {}  # emri -> [thirrje, total s, self s]
+        self.stack: List[float] = []
+
+    def wrap(self, name: str, fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            self.stack.append(0.0)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                total = time.perf_counter() - t0
+                children = self.stack.pop()
+                if self.stack:
+                    self.stack[-1] += total
+                s = self.stats.setdefault(name, [0, 0.0, 0.0])
+                s[0] += 1
+                s[1] += total
+                s[2] += total - children
+        return timed
+
+    def install(self, bot):
+        for name, fn in list(vars(bot).items()):
+            if (inspect.isfunction(fn) and fn.__module__ == bot.__name__
+                    and not name.startswith("analyze_symbol") and name not in SKIP_FUNCTIONS):
+                setattr(bot, name, self.wrap(name, fn))
+
+
+class BenchReplayer(capture.Replayer):
+    """Replayer që mat latencën e çdo analize (dhe opsionalisht pikun e memories)."""
+
+    def __init__(self, bot_id: str, memory: bool = False):
+        # modul i freskët: gjendja e botit (cache, sinjalet e fundit) nis nga zero
+        for name in (bot_id, "forex_scalp_bot"):
+            sys.modules.pop(name, None)
+        super().__init__(bot_id)
+        self.memory = memory
+        self.latencies: List[float] = []
+        self.peak_bytes = 0
+        self.first_error: Optional[str] = None
+
+    def _recording(self, fn):
+        """Ruan exception-in e parë (traceback-u i Replayer shkon te devnull)."""
+        @functools.wraps(fn)
+        def call(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if self.first_error is None:
+                    self.first_error = f"{args[0] if args else '?'}: {type(e).__name__}: {e}"
+                raise
+        return call
+
+    def _analyze(self, fn, *args, **kwargs):
+        if self.memory:
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        super()._analyze(self._recording(fn), *args, **kwargs)
+        self.latencies.append(time.perf_counter() - t0)
+        if self.memory:
+            self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1])
+
+    def feed(self, ts_ms, kind, key, frames):
+        if kind == "ohlc_batch":
+            self.bot.SYMBOLS = sorted(frames)
+        super().feed(ts_ms, kind, key, frames)
+
+
+class NetworkBlocked(RuntimeError):
+    pass
+
+
+class BotNotImportable(RuntimeError):
+    pass
+
+
+def _block_network():
+    """Çdo requests.get/post kalon nga Session.request -> bllokohet dhe numërohet."""
+    calls = []
+
+    def blocked(session, method, url, *args, **kwargs):
+        calls.append(url)
+        raise NetworkBlocked(f"rrjeti është i bllokuar në benchmark: {method} {url}")
+
+    requests.sessions.Session.request = blocked
+    return calls
+
+
+def _replay(directory: str, replayer: BenchReplayer) -> float:
+    """Kalon të gjitha rekordet; kthen kohën vetëm të analizës (pa dekodimin e capture)."""
+    elapsed = 0.0
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for ts_ms, kind, key, frames in capture.CaptureReader(directory).records():
+            t0 = time.perf_counter()
+            replayer.feed(ts_ms, kind, key, frames)
+            elapsed += time.perf_counter() - t0
+    return elapsed
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip()
+    except Exception:
+        return ""
+
+
+def _replayer(bot_id: str, memory: bool = False) -> BenchReplayer:
+    """BenchReplayer, ose BotNotImportable kur moduli i botit nuk ngarkohet."""
+    try:
+        return BenchReplayer(bot_id, memory=memory)
+    except (SyntaxError, ImportError) as e:
+        raise BotNotImportable(f"{bot_id} nuk importohet: {type(e).__name__}: {e}") from e
+
+
+def run_bench(bot_id: str, directory: str, passes: int, profile: bool = True, memory: bool = True) -> dict:
+    network_calls = _block_network()
+
+    replayer = _replayer(bot_id)
+    seconds = _replay(directory, replayer)
+    lat_ms = np.asarray(replayer.latencies) * 1000
+    analyses = replayer.analyses
+    symbols = analyses // passes if passes else analyses
+
+    result = {
+        "bot_id": bot_id,
+        "symbols": symbols,
+        "passes": passes,
+        "analyses": analyses,
+        "errors": replayer.errors,
+        "error_ratio": round(replayer.errors / analyses, 4) if analyses else 0.0,
+        "first_error": replayer.first_error,
+        "signals": len(replayer.signals),
+        "network_calls": len(network_calls),
+        "seconds": round(seconds, 4),
+        "symbols_per_second": round(analyses / seconds, 2) if seconds else 0.0,
+        "latency_ms": {
+            "mean": round(float(lat_ms.mean()), 3) if lat_ms.size else 0.0,
+            "p50": round(float(np.percentile(lat_ms, 50)), 3) if lat_ms.size else 0.0,
+            "p99": round(float(np.percentile(lat_ms, 99)), 3) if lat_ms.size else 0.0,
+            "max": round(float(lat_ms.max()), 3) if lat_ms.size else 0.0,
+        },
+    }
+
+    if profile:
+        replayer = _replayer(bot_id)
+        timer = FactorTimer()
+        timer.install(replayer.bot)
+        profiled = _replay(directory, replayer)
+        result["factors"] = {
+            name: {
+                "calls": calls,
+                "total_ms": round(total * 1000, 2),
+                "self_ms": round(own * 1000, 2),
+                "self_pct": round(100 * own / profiled, 2) if profiled else 0.0,
+            }
+            for name, (calls, total, own) in sorted(timer.stats.items(), key=lambda kv: -kv[1][2])
+        }
+
+    if memory:
+        replayer = _replayer(bot_id, memory=True)
+        tracemalloc.start()
+        try:
+            _replay(directory, replayer)
+        finally:
+            tracemalloc.stop()
+        result["peak_memory_mb"] = {
+            "analysis": round(replayer.peak_bytes / 2**20, 3),
+            "rss": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+    result["env"] = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+    return result
+
+
+# ======================================================
+#                     BASELINE
+# ======================================================
+
+def _get(result: dict, path: str) -> Optional[float]:
+    value = result
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Kthen listën e regresioneve (bosh = OK) dhe printon tabelën e krahasimit."""
+    regressions = []
+    print(f"{'METRIC':<28}{'BASELINE':>12}{'CURRENT':>12}{'CHANGE':>10}")
+    for path, higher_better in CHECKS:
+        old, new = _get(baseline, path), _get(result, path)
+        if old is None or new is None or old == 0:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{path:<28}{old:>12.3f}{new:>12.3f}{change:>+10.1%}{flag}")
+        if flag:
+            regressions.append(f"{path}: {old} -> {new} ({change:+.1%})")
+    if baseline.get("errors") != result.get("errors"):
+        print(f"[BENCH] Kujdes: gabimet e analizës ndryshuan {baseline.get('errors')} -> {result.get('errors')}")
+    return regressions
+
+
+def _baseline_path(baseline: str, name: str) -> str:
+    return os.path.join(baseline, name) if os.path.isdir(baseline) else baseline
+
+
+def main():
+    status = "; ".join(f"{bot}: {note or 'OK'}" for bot, note in sorted(BOT_STATUS.items()))
+    parser = argparse.ArgumentParser(description="Benchmark i kalimit të skanimit të botave")
+    parser.add_argument("bot_id", choices=sorted(FIXTURES), help=f"gjendja sot – {status}")
+    parser.add_argument("--symbols", type=int, nargs="+", default=[100, 400])
+    parser.add_argument("--passes", type=int, default=3, help="kalime skanimi për fixture sintetike")
+    parser.add_argument("--fixtures", default=None, help="folder capture i regjistruar (në vend të atij sintetik)")
+    parser.add_argument("--out", default=RESULTS_DIR, help="folder-i i rezultateve JSON")
+    parser.add_argument("--baseline", default=None, help="rezultat JSON (ose folder) për krahasim")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="përkeqësimi i lejuar (0.15 = 15%%)")
+    parser.add_argument("--no-profile", action="store_true", help="pa kohën për faktor")
+    parser.add_argument("--no-memory", action="store_true", help="pa matjen e memories")
+    parser.add_argument("--max-error-ratio", type=float, default=MAX_ERROR_RATIO,
+                        help="pjesa maksimale e analizave me exception (0.05 = 5%%)")
+    args = parser.parse_args()
+
+    capture.CAPTURE_DIR = ""  # botat nuk duhet të regjistrojnë gjatë benchmark-ut
+    if args.fixtures:
+        runs = [(args.fixtures, None, 1)]
+    else:
+        runs = []
+        for n in args.symbols:
+            t0 = time.perf_counter()
+            directory = make_fixture(args.bot_id, n, args.passes)
+            print(f"[BENCH] Fixture {directory} ({time.perf_counter() - t0:.1f}s)")
+            runs.append((directory, n, args.passes))
+
+    if BOT_STATUS.get(args.bot_id):
+        print(f"[BENCH] Kujdes: {args.bot_id} – {BOT_STATUS[args.bot_id]}")
+
+    failed = []
+    for directory, n, passes in runs:
+        try:
+            result = run_bench(args.bot_id, directory, passes, not args.no_profile, not args.no_memory)
+        except BotNotImportable as e:
+            print(f"[BENCH] GABIM: {e}")
+            sys.exit(2)
+        if n is None:
+            result["fixture"] = os.path.abspath(directory)
+        name = f"scan_{args.bot_id}_{n or 'capture'}.json"
+
+        print(
+            f"[BENCH] {args.bot_id} {result['symbols']} simbole x {result['passes']} kalime: "
+            f"{result['symbols_per_second']:.1f} simbole/s, p50 {result['latency_ms']['p50']:.2f} ms, "
+            f"p99 {result['latency_ms']['p99']:.2f} ms, {result['errors']} gabime, {result['signals']} sinjale"
+        )
+        if result["network_calls"]:
+            print(f"[BENCH] Kujdes: {result['network_calls']} thirrje rrjeti u bllokuan")
+        if result["error_ratio"] > args.max_error_ratio:
+            print(
+                f"[BENCH] GABIM: {result['errors']}/{result['analyses']} analiza hodhën exception "
+                f"({result['error_ratio']:.0%} > {args.max_error_ratio:.0%}); matja mat rrugën e gabimit, "
+                f"rezultati nuk ruhet.\n        I pari: {result['first_error']}"
+            )
+            failed.append(f"{name}: {result['error_ratio']:.0%} e analizave dështuan")
+            continue
+        if "peak_memory_mb" in result:
+            mem = result["peak_memory_mb"]
+            print(f"[BENCH] Memoria: pik {mem['analysis']:.2f} MB për analizë, RSS max {mem['rss']:.0f} MB")
+        for factor, stats in list(result.get("factors", {}).items())[:10]:
+            print(f"    {factor:<34}{stats['calls']:>8} thirrje{stats['self_ms']:>12.1f} ms self{stats['self_pct']:>7.1f}%")
+
+        os.makedirs(args.out, exist_ok=True)
+        out = os.path.join(args.out, name)
+        baseline_file = _baseline_path(args.baseline, name) if args.baseline else None
+        if baseline_file and os.path.abspath(baseline_file) == os.path.abspath(out) and os.path.exists(out):
+            with open(out) as f:
+                baseline = json.load(f)  # lexohet para se të mbishkruhet
+        elif baseline_file:
+            if not os.path.exists(baseline_file):
+                print(f"[BENCH] S'ka baseline: {baseline_file}")
+                baseline = None
+            else:
+                with open(baseline_file) as f:
+                    baseline = json.load(f)
+        else:
+            baseline = None
+
+        with open(out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"[BENCH] Rezultati: {out}")
+
+        if baseline is not None:
+            failed += compare(result, baseline, args.tolerance)
+
+    if failed:
+        print("[BENCH] Dështoi:\n  " + "\n  ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
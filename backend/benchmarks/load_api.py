@@ -0,0 +1,467 @@
+"""
+Load test i API-t (main_full.py): N bota + M klientë të app-it + FCM i rremë.
+
+Harness-i nis `uvicorn load_app:app --workers W` në një folder të përkohshëm
+(signals.db i ri), regjistron device-t dhe përdoruesit premium, pastaj për
+`--duration` sekonda:
+  - çdo bot dërgon sinjale (POST /signals/ingest, me push te topic-u i
+    analysis_type, sinjalet brenda PUSH_COALESCE_SECONDS në një digest;
+    `--replay-rate` e sinjaleve riprovohen me të njëjtin
+    idempotency_key), heartbeat (POST /api/heartbeat) dhe mbyll sinjale
+    (POST /signals/{id}/close)
+  - `--targeted-rate` e device-ve ruajnë preferenca (POST /devices/preferences)
+    dhe marrin push direkt vetëm për analysis_type e tyre
+  - çdo klient lexon /signals, /stats dhe /premium/check/{email} me pushime
+    të rastësishme mes kërkesave, si app-i
+FCM-i i rremë është një server HTTP lokal me vonesë/gabime të konfigurueshme.
+
+Raporti jep për çdo endpoint kërkesat/s, latencën p50/p95/p99 dhe gabimet,
+mesazhet e FCM-së, dhe kohën e SQLite për select/write/commit nga çdo worker
+(commit-et e ngadalta dhe "database is locked" = kontestim i lock-ut të
+signals.db). Rezultati ruhet edhe si JSON.
+
+Përdorim:
+    python benchmarks/load_api.py --bots 4 --clients 200 --devices 500 --duration 60
+    python benchmarks/load_api.py --url http://127.0.0.1:8000 --clients 50   # server ekzistues, pa FCM të rremë
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import numpy as np
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# (source, analysis_type, timeframe) si te botat
+BOTS = [
+    ("crypto_swing_bot", "crypto_swing", "4H"),
+    ("crypto_scalp_bot", "crypto_scalping", "5m"),
+    ("forex_swing_bot", "forex_swing", "4H"),
+    ("forex_scalper_bot", "forex_intraday", "5m"),
+]
+
+# Commit më i gjatë se kaq numërohet si pritje për lock-un e signals.db
+SLOW_COMMIT_MS = 50
+
+
+# ======================================================
+#                     FCM I RREMË
+# ======================================================
+
+class FakeFcm:
+    """
+    Server HTTP që imiton FCM v1 messages:send (me vonesë dhe gabime) dhe
+    iid batchAdd/batchRemove të subscribe/unsubscribe_from_topic (pa gabime).
+    """
+
+    def __init__(self, latency_ms: float, fail_rate: float):
+        self.latency = latency_ms / 1000
+        self.fail_rate = fail_rate
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.tokens = set()
+        self.subscribed: Dict[str, set] = defaultdict(set)
+        fcm = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status: int, payload: dict):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path.endswith((":batchAdd", ":batchRemove")):
+                    tokens = body.get("registration_tokens", [])
+                    with fcm.lock:
+                        if self.path.endswith(":batchAdd"):
+                            fcm.subscribed[body.get("to", "")].update(tokens)
+                        else:
+                            fcm.subscribed[body.get("to", "")].difference_update(tokens)
+                    self._reply(200, {"results": [{} for _ in tokens]})
+                    return
+                time.sleep(fcm.latency)
+                with fcm.lock:
+                    fail = random.random() < fcm.fail_rate
+                    if fail:
+                        fcm.failed += 1
+                    else:
+                        fcm.sent += 1
+                        fcm.tokens.add(body.get("token") or body.get("topic") or body.get("condition"))
+                    n = fcm.sent
+                if fail:
+                    self._reply(503, {"error": "UNAVAILABLE"})
+                else:
+                    self._reply(200, {"name": f"projects/load/messages/{n}"})
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/projects/load/messages:send"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+# ======================================================
+#                     SERVERI
+# ======================================================
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str, workers: int, fcm_url: str):
+    port = _free_port()
+    env = dict(os.environ, LOAD_FAKE_FCM_URL=fcm_url, LOAD_STATS_DIR=workdir)
+    log = open(os.path.join(workdir, "server.log"), "w")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "load_app:app", "--app-dir", BENCH_DIR,
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn doli me kod {proc.returncode}, shih {log.name}")
+        try:
+            if requests.get(f"{url}/health", timeout=1).ok:
+                return proc, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("uvicorn nuk u nis brenda 60s")
+
+
+def stop_server(proc):
+    proc.send_signal(signal.SIGINT)  # shutdown i rregullt -> workers shkruajnë db_{pid}.json
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# ======================================================
+#                     NGARKESA
+# ======================================================
+
+class Recorder:
+    """Latenca dhe statusi për çdo endpoint (rruga me {parametra})."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def call(self, session: requests.Session, name: str, method: str, url: str, **kwargs) -> Optional[requests.Response]:
+        t0 = time.perf_counter()
+        try:
+            resp = session.request(method, url, timeout=30, **kwargs)
+            error = None if resp.ok else str(resp.status_code)
+            if resp.status_code >= 500 and "locked" in resp.text:
+                error = f"{resp.status_code} locked"
+        except requests.RequestException as e:
+            resp, error = None, type(e).__name__
+        ms = (time.perf_counter() - t0) * 1000
+        with self.lock:
+            self.latency[name].append(ms)
+            if error:
+                self.errors[name][error] += 1
+        return resp if error is None else None
+
+
+def _think(stop: threading.Event, mean_seconds: float):
+    stop.wait(random.expovariate(1 / mean_seconds) if mean_seconds > 0 else 0)
+
+
+def bot_worker(url: str, rec: Recorder, stop: threading.Event, bot: tuple, n: int, args):
+    source, analysis_type, timeframe = bot
+    session = requests.Session()
+    name = f"{source}_{n}" if n else source
+    open_ids: List[int] = []
+    next_heartbeat = 0.0
+    while not stop.is_set():
+        now = time.time()
+        if now >= next_heartbeat:
+            rec.call(session, "POST /api/heartbeat", "POST", f"{url}/api/heartbeat",
+                     json={"name": name, "last_signal_time": datetime.now(timezone.utc).isoformat()})
+            next_heartbeat = now + args.heartbeat_interval
+
+        entry = random.uniform(1, 50000)
+        direction = random.choice(["BUY", "SELL"])
+        sign = 1 if direction == "BUY" else -1
+        payload = {
+            "bot_id": name,
+            "idempotency_key": uuid.uuid4().hex,
+            "symbol": f"S{random.randrange(400):03d}USDT",
+            "direction": direction,
+            "entry": entry,
+            "tp": entry * (1 + sign * 0.045),
+            "sl": entry * (1 - sign * 0.015),
+            "time": datetime.now(timezone.utc).isoformat(),
+            "timeframe": timeframe,
+            "source": source,
+            "analysis_type": analysis_type,
+            "status": "open",
+            "extra_text": "load test",
+        }
+        resp = rec.call(session, "POST /signals/ingest", "POST", f"{url}/signals/ingest", json=payload)
+        if resp is not None:
+            open_ids.append(resp.json()["id"])
+            if random.random() < args.replay_rate:
+                replay = rec.call(session, "POST /signals/ingest (replay)", "POST", f"{url}/signals/ingest", json=payload)
+                if replay is not None and replay.json()["id"] != open_ids[-1]:
+                    with rec.lock:  # riprovimi krijoi rresht të ri = idempotenca nuk punon
+                        rec.errors["POST /signals/ingest (replay)"]["duplicate"] += 1
+        if len(open_ids) > 5:
+            signal_id = open_ids.pop(random.randrange(len(open_ids)))
+            hit = random.choice(["tp", "sl", "be"])
+            pnl = {"tp": 4.5, "sl": -1.5, "be": 0.0}[hit]
+            rec.call(session, "POST /signals/{id}/close", "POST", f"{url}/signals/{signal_id}/close",
+                     params={"hit": hit, "pnl_percent": pnl})
+        _think(stop, args.signal_interval)
+
+
+def client_worker(url: str, rec: Recorder, stop: threading.Event, n: int, args):
+    session = requests.Session()
+    email = f"user{n}@load.test"
+    types = [b[1] for b in BOTS]
+    while not stop.is_set():
+        action = random.random()
+        if action < 0.6:
+            params = {"limit": 100}
+            if random.random() < 0.5:
+                params["analysis_type"] = random.choice(types)
+            rec.call(session, "GET /signals", "GET", f"{url}/signals", params=params)
+        elif action < 0.85:
+            rec.call(session, "GET /stats", "GET", f"{url}/stats",
+                     params={"analysis_type": random.choice(types), "period": random.choice(["daily", "weekly", "monthly"])})
+        else:
+            rec.call(session, "GET /premium/check/{email}", "GET", f"{url}/premium/check/{email}")
+        _think(stop, args.poll_interval)
+
+
+def seed(url: str, args):
+    session = requests.Session()
+    types = [b[1] for b in BOTS]
+    for i in range(args.devices):
+        token = f"load-token-{i:06d}"
+        session.post(f"{url}/register_device", json={"token": token, "platform": "android"}, timeout=30)
+        if random.random() < args.targeted_rate:  # ndjek vetëm një strategji
+            session.post(f"{url}/devices/preferences", json={"token": token, "analysis_types": [random.choice(types)]}, timeout=30)
+    for i in range(0, args.clients, 5):  # çdo i pesti klient është premium
+        session.post(f"{url}/admin/premium/add", params={"email": f"user{i}@load.test"}, timeout=30)
+
+
+def run_load(url: str, args) -> Recorder:
+    rec = Recorder()
+    stop = threading.Event()
+    threads = []
+    for i in range(args.bots):
+        threads.append(threading.Thread(target=bot_worker, args=(url, rec, stop, BOTS[i % len(BOTS)], i // len(BOTS), args)))
+    for i in range(args.clients):
+        threads.append(threading.Thread(target=client_worker, args=(url, rec, stop, i, args)))
+    for t in threads:
+        t.daemon = True
+        t.start()
+    stop.wait(args.duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=35)
+    return rec
+
+
+# ======================================================
+#                     RAPORTI
+# ======================================================
+
+def endpoint_report(rec: Recorder, duration: float) -> Dict[str, dict]:
+    report = {}
+    for name in sorted(rec.latency):
+        lat = np.asarray(rec.latency[name])
+        report[name] = {
+            "requests": int(lat.size),
+            "rps": round(lat.size / duration, 2),
+            "p50_ms": round(float(np.percentile(lat, 50)), 2),
+            "p95_ms": round(float(np.percentile(lat, 95)), 2),
+            "p99_ms": round(float(np.percentile(lat, 99)), 2),
+            "max_ms": round(float(lat.max()), 2),
+            "errors": dict(rec.errors.get(name, {})),
+        }
+    return report
+
+
+def db_report(workdir: str) -> dict:
+    """Bashkon db_{pid}.json e worker-ave; p99 përafrohet nga histogrami."""
+    merged: Dict[str, dict] = {}
+    locked = 0
+    workers = 0
+    buckets_ms: List[int] = []
+    for fname in sorted(os.listdir(workdir)):
+        if not (fname.startswith("db_") and fname.endswith(".json")):
+            continue
+        workers += 1
+        with open(os.path.join(workdir, fname)) as f:
+            data = json.load(f)
+        buckets_ms = data["buckets_ms"]
+        locked += data["locked"]
+        for kind, s in data["stats"].items():
+            m = merged.setdefault(kind, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "buckets": [0] * len(s["buckets"])})
+            m["count"] += s["count"]
+            m["total_ms"] += s["total_ms"]
+            m["max_ms"] = max(m["max_ms"], s["max_ms"])
+            m["buckets"] = [a + b for a, b in zip(m["buckets"], s["buckets"])]
+
+    # pool-i i SQLAlchemy (5 + 10 lidhje për worker) shteron kur kërkesat mbajnë lidhjen gjatë
+    pool_timeouts = 0
+    log_path = os.path.join(workdir, "server.log")
+    if os.path.exists(log_path):
+        with open(log_path, errors="replace") as f:
+            pool_timeouts = sum("QueuePool limit" in line for line in f)
+
+    out = {"workers_reported": workers, "locked_errors": locked, "pool_timeouts": pool_timeouts}
+    for kind, m in merged.items():
+        cum = np.cumsum(m["buckets"])
+        p99_bucket = int(np.searchsorted(cum, 0.99 * m["count"]))
+        slow = sum(c for edge, c in zip(buckets_ms + [float("inf")], m["buckets"]) if edge > SLOW_COMMIT_MS)
+        out[kind] = {
+            "count": m["count"],
+            "mean_ms": round(m["total_ms"] / m["count"], 3) if m["count"] else 0.0,
+            "p99_le_ms": buckets_ms[p99_bucket] if p99_bucket < len(buckets_ms) else None,
+            "max_ms": round(m["max_ms"], 2),
+            f"over_{SLOW_COMMIT_MS}ms": slow,
+        }
+    return out
+
+
+def print_report(result: dict):
+    print(f"{'ENDPOINT':<30}{'REQ':>8}{'RPS':>8}{'P50':>9}{'P95':>9}{'P99':>9}{'MAX':>9}  ERRORS")
+    for name, r in result["endpoints"].items():
+        errors = ", ".join(f"{k}:{v}" for k, v in r["errors"].items()) or "-"
+        print(f"{name:<30}{r['requests']:>8}{r['rps']:>8.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+              f"{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}  {errors}")
+
+    fcm = result.get("fcm")
+    if fcm:
+        print(
+            f"[LOAD] FCM i rremë: {fcm['sent']} dërguar, {fcm['failed']} dështuar, "
+            f"{fcm['tokens']} marrës (device/topic), {fcm.get('subscribed', 0)} device të abonuar te topic-et"
+        )
+
+    db = result.get("db")
+    if db:
+        for kind in ("select", "write", "commit"):
+            if kind in db:
+                d = db[kind]
+                p99 = f"<= {d['p99_le_ms']} ms" if d["p99_le_ms"] is not None else "> 5 s"
+                print(f"[LOAD] DB {kind:<7}{d['count']:>8} herë, mesatare {d['mean_ms']:.2f} ms, p99 {p99}, max {d['max_ms']:.0f} ms")
+        slow = db.get("commit", {}).get(f"over_{SLOW_COMMIT_MS}ms", 0) + db.get("write", {}).get(f"over_{SLOW_COMMIT_MS}ms", 0)
+        if db["locked_errors"] or slow:
+            print(f"[LOAD] KUJDES: kontestim i lock-ut në signals.db – {slow} shkrime/commit > {SLOW_COMMIT_MS} ms, "
+                  f"{db['locked_errors']} gabime 'database is locked'")
+        if db["pool_timeouts"]:
+            print(f"[LOAD] KUJDES: {db['pool_timeouts']} kërkesa pritën 30s për lidhje DB (QueuePool i shteruar)")
+        if db["workers_reported"] < result["config"]["workers"]:
+            print(f"[LOAD] Vetëm {db['workers_reported']}/{result['config']['workers']} workers raportuan kohën e DB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test i main_full.py (bota + klientë + FCM i rremë)")
+    parser.add_argument("--bots", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--devices", type=int, default=500, help="device të regjistruar (push për çdo sinjal)")
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn workers")
+    parser.add_argument("--signal-interval", type=float, default=5, help="sekonda mesatarisht mes sinjaleve të një boti")
+    parser.add_argument("--heartbeat-interval", type=float, default=30)
+    parser.add_argument("--targeted-rate", type=float, default=0.0, help="pjesa e device-ve me preferenca (një analysis_type)")
+    parser.add_argument("--replay-rate", type=float, default=0.05, help="pjesa e sinjaleve që riprovohen me të njëjtin çelës")
+    parser.add_argument("--poll-interval", type=float, default=5, help="sekonda mesatarisht mes kërkesave të një klienti")
+    parser.add_argument("--fcm-latency-ms", type=float, default=20)
+    parser.add_argument("--fcm-fail-rate", type=float, default=0.0)
+    parser.add_argument("--url", default=None, help="server ekzistues (pa nisje, pa FCM të rremë, pa statistika DB)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="mos e fshi folder-in e përkohshëm (signals.db, server.log)")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    fcm = proc = None
+    workdir = tempfile.mkdtemp(prefix="load_api_")
+    try:
+        if args.url:
+            url = args.url.rstrip("/")
+        else:
+            fcm = FakeFcm(args.fcm_latency_ms, args.fcm_fail_rate)
+            proc, url = start_server(workdir, args.workers, fcm.url)
+            print(f"[LOAD] uvicorn main_full ({args.workers} workers) në {url}, db: {workdir}/signals.db")
+        seed(url, args)
+        print(f"[LOAD] {args.bots} bota, {args.clients} klientë, {args.devices} device, {args.duration:.0f}s...")
+
+        t0 = time.perf_counter()
+        rec = run_load(url, args)
+        duration = time.perf_counter() - t0
+        if proc is not None:
+            stop_server(proc)
+            proc = None
+
+        result = {
+            "config": {k: v for k, v in vars(args).items() if k not in ("out", "keep")},
+            "duration": round(duration, 2),
+            "endpoints": endpoint_report(rec, duration),
+        }
+        if fcm is not None:
+            result["fcm"] = {
+                "sent": fcm.sent,
+                "failed": fcm.failed,
+                "tokens": len(fcm.tokens),
+                "subscribed": len(set().union(*fcm.subscribed.values())),
+            }
+            result["db"] = db_report(workdir)
+        print_report(result)
+
+        out = args.out or os.path.join(RESULTS_DIR, f"load_api_{args.bots}b_{args.clients}c.json")
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        with open(out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"[LOAD] Rezultati: {out}")
+    finally:
+        if proc is not None:
+            stop_server(proc)
+        if fcm is not None:
+            fcm.close()
+        if args.keep:
+            print(f"[LOAD] Folder-i: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+main_full.app për load test (nisur nga benchmarks/load_api.py).
+
+    uvicorn load_app:app --workers 2 --app-dir benchmarks   (cwd = folder i përkohshëm)
+
+Ndryshimet kundrejt prodhimit:
+  - push-et FCM (te topic-et, ose për device me PUSH_VIA_TOPICS=0) dhe
+    abonimet subscribe/unsubscribe_from_topic dërgohen te FCM-i i rremë i harness-it
+    (LOAD_FAKE_FCM_URL)
+  - koha e SQLite matet për çdo statement/commit dhe gabimet "database is
+    locked" numërohen; në shutdown çdo worker i shkruan te
+    {LOAD_STATS_DIR}/db_{pid}.json
+signals.db krijohet në cwd (SQLALCHEMY_DATABASE_URL = ./signals.db).
+"""
+import json
+import os
+import sys
+import time
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+from firebase_admin import messaging  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import main_full  # noqa: E402
+
+FAKE_FCM_URL = os.environ.get("LOAD_FAKE_FCM_URL", "")
+STATS_DIR = os.environ.get("LOAD_STATS_DIR", ".")
+
+# Kufijtë e histogramit të kohës së DB (ms); i fundit = pafundësi
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+# ======================================================
+#                     FCM I RREMË
+# ======================================================
+
+_fcm = requests.Session()
+
+
+def _fake_send(message, dry_run=False, app=None):
+    resp = _fcm.post(
+        FAKE_FCM_URL,
+        json={"token": message.token, "topic": message.topic, "condition": message.condition, "data": message.data},
+        timeout=10,
+    )
+    resp.raise_for_status()
+    return resp.json()["name"]
+
+
+def _fake_topic_call(operation: str, tokens, topic):
+    tokens = [tokens] if isinstance(tokens, str) else tokens
+    resp = _fcm.post(
+        FAKE_FCM_URL.rsplit("/v1/", 1)[0] + f"/iid/v1:{operation}",
+        json={"to": f"/topics/{topic}", "registration_tokens": tokens},
+        timeout=10,
+    )
+    resp.raise_for_status()
+    return messaging.TopicManagementResponse(resp.json())
+
+
+def _fake_subscribe(tokens, topic, app=None):
+    return _fake_topic_call("batchAdd", tokens, topic)
+
+
+def _fake_unsubscribe(tokens, topic, app=None):
+    return _fake_topic_call("batchRemove", tokens, topic)
+
+
+if FAKE_FCM_URL:
+    messaging.send = _fake_send
+    messaging.subscribe_to_topic = _fake_subscribe
+    messaging.unsubscribe_from_topic = _fake_unsubscribe
+    main_full.firebase_app = object()  # send_push_to_all_devices kërkon vetëm != None
+
+
+# ======================================================
+#                     KOHA E SQLITE
+# ======================================================
+
+class DbTimer:
+    """Histogram kohe për llojet e statement-eve (select / write / commit)."""
+
+    def __init__(self):
+        self.stats: Dict[str, dict] = {}
+        self.locked = 0
+
+    def add(self, kind: str, ms: float):
+        s = self.stats.get(kind)
+        if s is None:
+            s = self.stats[kind] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "buckets": [0] * (len(BUCKETS_MS) + 1)}
+        s["count"] += 1
+        s["total_ms"] += ms
+        s["max_ms"] = max(s["max_ms"], ms)
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        s["buckets"][i] += 1
+
+    def dump(self):
+        path = os.path.join(STATS_DIR, f"db_{os.getpid()}.json")
+        with open(path, "w") as f:
+            json.dump({"pid": os.getpid(), "buckets_ms": BUCKETS_MS, "locked": self.locked, "stats": self.stats}, f)
+
+
+DB = DbTimer()
+
+
+@event.listens_for(main_full.engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["load_t0"] = time.perf_counter()
+
+
+@event.listens_for(main_full.engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    t0 = conn.info.pop("load_t0", None)
+    if t0 is not None:
+        verb = statement.lstrip().split(None, 1)[0].lower()
+        DB.add("select" if verb in ("select", "pragma") else "write", (time.perf_counter() - t0) * 1000)
+
+
+@event.listens_for(main_full.engine, "handle_error")
+def _on_error(context):
+    if "database is locked" in str(context.original_exception):
+        DB.locked += 1
+
+
+_commit = Session.commit
+
+
+def _timed_commit(self):
+    # në SQLite commit-i pret lock-un EXCLUSIVE -> këtu duket kontestimi
+    t0 = time.perf_counter()
+    try:
+        return _commit(self)
+    finally:
+        DB.add("commit", (time.perf_counter() - t0) * 1000)
+
+
+Session.commit = _timed_commit
+
+app = main_full.app
+app.add_event_handler("shutdown", DB.dump)
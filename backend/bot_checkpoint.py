@@ -0,0 +1,118 @@
+"""
+Checkpoint i gjendjes në memorie të një boti për restart të ngrohtë.
+
+Boti jep një funksion që kthen gjendjen (cache e qirinjve, agregatorët 4H,
+memoria e deduplikimit) si dict; `Checkpoint` e ruan me pickle te
+{BOT_CHECKPOINT_DIR}/{bot_id}.pkl:
+  - periodikisht pas një kalimi (`after_pass`, çdo CHECKPOINT_SECONDS)
+  - në SIGTERM (systemctl stop/restart, deploy.sh): nëse boti është mes
+    kalimeve ruhet menjëherë, përndryshe në fund të kalimit aktual, që mos
+    të ruhet një seri qirinjsh në mes të përditësimit
+
+Në startim `load()` e kthen gjendjen vetëm nëse është e këtij boti, e këtij
+formati dhe jo më e vjetër se MAX_AGE_SECONDS; përndryshe boti nis bosh si
+më parë. File-i shkruhet nga vetë boti (pickle lexohet vetëm nga aty).
+`BOT_CHECKPOINT=0` e çaktivizon.
+"""
+import os
+import pickle
+import signal
+import sys
+import time
+from typing import Callable, Optional
+
+ENABLED = os.getenv("BOT_CHECKPOINT", "1") != "0"
+CHECKPOINT_DIR = os.getenv(
+    "BOT_CHECKPOINT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "checkpoints"),
+)
+CHECKPOINT_SECONDS = 600
+MAX_AGE_SECONDS = 6 * 3600
+FORMAT_VERSION = 1
+
+StateFn = Callable[[], dict]
+
+
+class Checkpoint:
+    def __init__(self, bot_id: str, directory: str = CHECKPOINT_DIR, max_age: float = MAX_AGE_SECONDS):
+        self.bot_id = bot_id
+        self.path = os.path.join(directory, f"{bot_id}.pkl")
+        self.max_age = max_age
+        self.saved_at = 0.0
+        self.state_fn: Optional[StateFn] = None
+        self.in_pass = False
+        self.stop_requested = False
+
+    def save(self, state: dict):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        t0 = time.perf_counter()
+        with open(tmp, "wb") as f:
+            pickle.dump(
+                {"version": FORMAT_VERSION, "bot_id": self.bot_id, "saved_at": time.time(), "state": state},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp, self.path)
+        self.saved_at = time.time()
+        size_kb = os.path.getsize(self.path) / 1024
+        print(f"[CHECKPOINT] Ruajtur {self.path} ({size_kb:.0f} KB, {time.perf_counter() - t0:.2f}s)")
+
+    def load(self) -> Optional[dict]:
+        """Gjendja e ruajtur, ose None kur mungon, është e huaj ose e vjetër."""
+        if not ENABLED or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except Exception as e:
+            print(f"[CHECKPOINT] {self.path} nuk u lexua: {e}")
+            return None
+        if data.get("version") != FORMAT_VERSION or data.get("bot_id") != self.bot_id:
+            print(f"[CHECKPOINT] {self.path} është i një formati/boti tjetër, injorohet.")
+            return None
+        age = time.time() - data["saved_at"]
+        if age > self.max_age:
+            print(f"[CHECKPOINT] {self.path} është {age / 60:.0f} min i vjetër, injorohet.")
+            return None
+        print(f"[CHECKPOINT] Gjendja u rikthye nga {self.path} ({age / 60:.1f} min e vjetër)")
+        return data["state"]
+
+    # ---------------- cikli i botit ----------------
+
+    def install(self, state_fn: StateFn):
+        """Regjistron funksionin e gjendjes dhe handler-in e SIGTERM."""
+        self.state_fn = state_fn
+        if ENABLED:
+            signal.signal(signal.SIGTERM, self._on_sigterm)
+
+    def begin_pass(self):
+        self.in_pass = True
+
+    def after_pass(self):
+        """Thirret pas çdo kalimi: ruan periodikisht, ose ruan dhe del kur kërkohet ndalimi."""
+        self.in_pass = False
+        if not ENABLED or self.state_fn is None:
+            return
+        if self.stop_requested:
+            self._save_and_exit()
+        if time.time() - self.saved_at >= CHECKPOINT_SECONDS:
+            self._try_save()
+
+    def _try_save(self):
+        try:
+            self.save(self.state_fn())
+        except Exception as e:
+            print(f"[CHECKPOINT] Ruajtja dështoi: {e}")
+
+    def _save_and_exit(self):
+        self._try_save()
+        sys.exit(0)
+
+    def _on_sigterm(self, signum, frame):
+        if self.in_pass:
+            print("[CHECKPOINT] SIGTERM: ruhet në fund të kalimit aktual...")
+            self.stop_requested = True
+            return
+        print("[CHECKPOINT] SIGTERM: ruhet gjendja para daljes...")
+        self._save_and_exit()
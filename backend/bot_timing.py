@@ -0,0 +1,190 @@
+"""
+Matje e lehtë e kohës për fazat e një boti: fetch, indikatorët, çdo faktor
+i score-it dhe dërgimi te backend-i.
+
+Funksionet e botit mbështillen me `@TIMING.timed("factor.order_block")`
+(ose `with TIMING.phase("fetch"): ...`). Për çdo kalim skanimi mblidhen
+kohët e çdo faze; `end_pass()` printon tabelën (total, mesatare, p99,
+numri) dhe e ruan si përmbledhjen e fundit. Kohët janë inclusive: një
+faktor që thërret një indikator e përfshin edhe atë.
+
+Me `BOT_STATUS_PORT` (p.sh. 8771) boti hap një endpoint lokal:
+    curl http://127.0.0.1:8771/status
+që kthen përmbledhjen e kalimit të fundit si JSON. `BOT_TIMING=0` i çaktivizon
+të gjitha matjet (dekoruesit kthejnë funksionin origjinal).
+
+Numëruesit (`TIMING.count("fetch.error")`, "cache.hit", "cache.miss") mblidhen
+po ashtu për kalim; `telemetry()` i përmbledh për heartbeat-in te API-ja.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import numpy as np
+
+ENABLED = os.getenv("BOT_TIMING", "1") != "0"
+STATUS_PORT = int(os.getenv("BOT_STATUS_PORT", "0") or 0)
+
+
+class PhaseTimer:
+    """Kohët e fazave të një boti, të grupuara për kalim skanimi."""
+
+    def __init__(self, bot_id: str):
+        self.bot_id = bot_id
+        self.samples: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+        self.pass_started = time.perf_counter()
+        self.passes = 0
+        self.started_at = time.time()
+        self.last: Optional[dict] = None
+
+    def add(self, name: str, seconds: float):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = []
+        samples.append(seconds)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def timed(self, name: str):
+        """Dekorues: mat çdo thirrje të funksionit si fazën `name`."""
+        def decorator(fn):
+            if not ENABLED:
+                return fn
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.add(name, time.perf_counter() - t0)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            if ENABLED:
+                self.add(name, time.perf_counter() - t0)
+
+    def end_pass(self, symbols: Optional[int] = None, show: bool = True) -> dict:
+        """Mbyll kalimin: llogarit përmbledhjen, e printon dhe nis kalimin e ri."""
+        now = time.perf_counter()
+        phases = {}
+        for name, samples in sorted(self.samples.items()):
+            arr = np.asarray(samples)
+            phases[name] = {
+                "count": int(arr.size),
+                "total_s": round(float(arr.sum()), 4),
+                "mean_ms": round(float(arr.mean()) * 1000, 3),
+                "p99_ms": round(float(np.percentile(arr, 99)) * 1000, 3),
+            }
+        self.passes += 1
+        summary = {
+            "bot_id": self.bot_id,
+            "pass": self.passes,
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "pass_seconds": round(now - self.pass_started, 3),
+            "symbols": symbols,
+            "phases": phases,
+            "counters": dict(self.counters),
+        }
+        self.last = summary
+        self.samples = {}
+        self.counters = {}
+        self.pass_started = now
+        if show and phases:
+            print(format_summary(summary))
+        return summary
+
+    def status(self) -> dict:
+        return {
+            "bot_id": self.bot_id,
+            "uptime_seconds": round(time.time() - self.started_at),
+            "passes": self.passes,
+            "last_pass": self.last,
+        }
+
+    def telemetry(self) -> Optional[dict]:
+        """Telemetria e kalimit të fundit për POST /api/heartbeat (None para kalimit të parë)."""
+        if self.last is None:
+            return None
+        counters = self.last["counters"]
+        hits = counters.get("cache.hit", 0)
+        lookups = hits + counters.get("cache.miss", 0)
+        return {
+            "pass_no": self.last["pass"],
+            "scan_seconds": self.last["pass_seconds"],
+            "symbols": self.last["symbols"],
+            "fetch_errors": counters.get("fetch.error", 0),
+            "cache_hit_rate": round(hits / lookups, 4) if lookups else None,
+            "rss_mb": rss_mb(),
+        }
+
+
+def rss_mb() -> Optional[float]:
+    """Memoria rezidente e procesit (MB); në Linux nga /proc, përndryshe maksimumi nga getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    except ImportError:
+        return None
+
+
+def format_summary(summary: dict) -> str:
+    """Tabela e një kalimi, renditur sipas kohës totale."""
+    lines = [
+        f"[TIMING] Pass {summary['pass']}: {summary['pass_seconds']:.1f}s"
+        + (f", {summary['symbols']} simbole" if summary.get("symbols") is not None else ""),
+        f"{'PHASE':<28}{'TOTAL s':>10}{'MEAN ms':>10}{'P99 ms':>10}{'COUNT':>8}",
+    ]
+    for name, p in sorted(summary["phases"].items(), key=lambda kv: -kv[1]["total_s"]):
+        lines.append(f"{name:<28}{p['total_s']:>10.2f}{p['mean_ms']:>10.2f}{p['p99_ms']:>10.2f}{p['count']:>8}")
+    return "\n".join(lines)
+
+
+def start_status_server(timer: PhaseTimer, port: int = STATUS_PORT) -> Optional[ThreadingHTTPServer]:
+    """Nis GET /status në 127.0.0.1:port në një thread daemon (port 0 = jo)."""
+    if not port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/status"):
+                self.send_error(404)
+                return
+            body = json.dumps(timer.status()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    except OSError as e:
+        print(f"[TIMING] Status endpoint nuk u hap në portin {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[TIMING] Status: http://127.0.0.1:{port}/status")
+    return server
@@ -0,0 +1,232 @@
+"""
+Arena qirinjsh në memorie të përbashkët (multiprocessing.shared_memory).
+
+market_gateway është i vetmi shkrues: pas çdo rifreskimi kopjon dritaren e
+(simbol, interval) në një segment të përbashkët. Botat e lexojnë segmentin
+read-only, pa mbajtur kopje të tyre të historisë, kështu RAM-i i qirinjve
+paguhet një herë në VPS dhe jo një herë për çdo bot.
+
+Layout i një segmenti (little-endian):
+    header (64 B): magic, capacity, seq, length, last_open_time, closed
+    open_time  int64   [capacity]
+    ohlcv      float64 [5, capacity]   (rendi OHLCV_COLUMNS)
+
+`seq` funksionon si seqlock: shkruesi e bën tek para shkrimit dhe çift pas
+tij. Lexuesi kopjon të dhënat dhe riprovon nëse seq ishte tek ose ndryshoi,
+kështu nuk sheh kurrë një dritare gjysmë të shkruar. `version = seq // 2`
+rritet me çdo publikim, që lexuesi ta dijë kur ka qirinj të rinj.
+Kur shkruesi e mbyll/rikrijon segmentin vendos `closed = 1`; lexuesi e lëshon
+dhe e hap sërish me emrin e njëjtë.
+"""
+import mmap
+import os
+import time
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from candle_store import OHLCV_COLUMNS, columns_to_frame
+
+ARENA_PREFIX = os.getenv("CANDLE_ARENA_PREFIX", "candles")
+ARENA_ENABLED = os.getenv("CANDLE_ARENA", "1") == "1"
+
+MAGIC = 0x43414E44  # "CAND"
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "<u4"),
+        ("capacity", "<u4"),
+        ("seq", "<u8"),
+        ("length", "<u8"),
+        ("last_open_time", "<i8"),
+        ("closed", "<u4"),
+    ]
+)
+
+# Në Linux segmentet janë file në /dev/shm dhe lexuesi i hap me mmap read-only
+_SHM_DIR = "/dev/shm"
+
+
+def segment_name(symbol: str, interval: str) -> str:
+    safe = "".join(ch if ch.isalnum() else "_" for ch in symbol)
+    return f"{ARENA_PREFIX}_{interval}_{safe}"
+
+
+def segment_size(capacity: int) -> int:
+    return HEADER_SIZE + capacity * 8 * (1 + len(OHLCV_COLUMNS))
+
+
+def header_capacity(buf) -> int:
+    return int(np.ndarray((), dtype=HEADER_DTYPE, buffer=buf)["capacity"])
+
+
+def _views(buf, capacity: int):
+    header = np.ndarray((), dtype=HEADER_DTYPE, buffer=buf, offset=0)
+    ts = np.ndarray((capacity,), dtype="<i8", buffer=buf, offset=HEADER_SIZE)
+    cols = np.ndarray(
+        (len(OHLCV_COLUMNS), capacity), dtype="<f8", buffer=buf, offset=HEADER_SIZE + capacity * 8
+    )
+    return header, ts, cols
+
+
+# ======================================================
+#                     SHKRUESI
+# ======================================================
+
+class ArenaWriter:
+    """Shkruesi i vetëm (market_gateway). Një segment për (simbol, interval)."""
+
+    def __init__(self):
+        self.segments: Dict[Tuple[str, str], shared_memory.SharedMemory] = {}
+
+    def _create(self, symbol: str, interval: str, capacity: int) -> shared_memory.SharedMemory:
+        name = segment_name(symbol, interval)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=segment_size(capacity))
+        except FileExistsError:
+            # mbetje nga një gateway i mëparshëm që u ndal pa pastruar
+            old = shared_memory.SharedMemory(name=name)
+            self._retire(old)
+            shm = shared_memory.SharedMemory(name=name, create=True, size=segment_size(capacity))
+
+        header, _, _ = _views(shm.buf, capacity)
+        header["capacity"] = capacity
+        header["seq"] = 0
+        header["length"] = 0
+        header["last_open_time"] = -1
+        header["closed"] = 0
+        header["magic"] = MAGIC
+        return shm
+
+    @staticmethod
+    def _retire(shm: shared_memory.SharedMemory):
+        if shm.size >= HEADER_SIZE:
+            np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)["closed"] = 1
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def publish(self, symbol: str, interval: str, open_time: np.ndarray, ohlcv: np.ndarray, capacity: int):
+        """Shkruan dritaren e fundit (deri në `capacity` qirinj) dhe rrit versionin."""
+        key = (symbol, interval)
+        shm = self.segments.get(key)
+        if shm is not None and header_capacity(shm.buf) < capacity:
+            self._retire(shm)
+            shm = None
+        if shm is None:
+            shm = self.segments[key] = self._create(symbol, interval, capacity)
+
+        header, ts, cols = _views(shm.buf, header_capacity(shm.buf))
+        n = min(len(open_time), len(ts))
+        seq = int(header["seq"])
+        header["seq"] = seq + 1  # tek: shkrim në vazhdim
+        ts[:n] = open_time[len(open_time) - n:]
+        cols[:, :n] = ohlcv[:, ohlcv.shape[1] - n:]
+        header["length"] = n
+        header["last_open_time"] = ts[n - 1] if n else -1
+        header["seq"] = seq + 2
+
+    def close(self):
+        for shm in self.segments.values():
+            self._retire(shm)
+        self.segments.clear()
+
+
+# ======================================================
+#                     LEXUESI
+# ======================================================
+
+class _Mapping:
+    """Segment i hapur nga lexuesi: mmap read-only në Linux, SharedMemory gjetkë."""
+
+    __slots__ = ("handle", "buf", "capacity")
+
+    def __init__(self, name: str):
+        path = os.path.join(_SHM_DIR, name)
+        if os.path.isdir(_SHM_DIR):
+            with open(path, "rb") as f:
+                self.handle = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.buf = memoryview(self.handle)
+        else:  # pragma: no cover – p.sh. Windows
+            self.handle = shared_memory.SharedMemory(name=name)
+            self.buf = self.handle.buf
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.buf)
+        if int(header["magic"]) != MAGIC:
+            self.close()
+            raise FileNotFoundError(name)
+        self.capacity = int(header["capacity"])
+
+    def close(self):
+        try:
+            self.buf.release()
+            self.handle.close()
+        except (BufferError, ValueError):
+            # ka ende pamje numpy mbi segmentin; GC e mbyll më vonë
+            pass
+
+
+class ArenaReader:
+    """Lexues për botat; kthen None kur segmenti nuk ekziston (p.sh. gateway i ndalur)."""
+
+    def __init__(self):
+        self.maps: Dict[Tuple[str, str], _Mapping] = {}
+
+    def _map(self, symbol: str, interval: str) -> Optional[_Mapping]:
+        key = (symbol, interval)
+        m = self.maps.get(key)
+        if m is not None:
+            if not int(np.ndarray((), dtype=HEADER_DTYPE, buffer=m.buf)["closed"]):
+                return m
+            m.close()
+            del self.maps[key]
+        try:
+            m = self.maps[key] = _Mapping(segment_name(symbol, interval))
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        return m
+
+    def version(self, symbol: str, interval: str) -> Optional[int]:
+        m = self._map(symbol, interval)
+        if m is None:
+            return None
+        return int(np.ndarray((), dtype=HEADER_DTYPE, buffer=m.buf)["seq"]) // 2
+
+    def read(
+        self, symbol: str, interval: str, limit: Optional[int] = None, timeout: float = 1.0
+    ) -> Optional[Tuple[np.ndarray, np.ndarray, int]]:
+        """
+        Kopje konsistente e qirinjve të fundit: (open_time, ohlcv (5, n), version).
+        Kopja është e vogël (disa qindra rreshta) dhe nuk ndryshon nën strategji.
+        """
+        m = self._map(symbol, interval)
+        if m is None:
+            return None
+        header, ts, cols = _views(m.buf, m.capacity)
+        deadline = time.monotonic() + timeout
+        while True:
+            seq = int(header["seq"])
+            if not seq & 1:
+                n = int(header["length"])
+                lo = n - min(n, limit) if limit else 0
+                open_time = ts[lo:n].copy()
+                ohlcv = cols[:, lo:n].copy()
+                if int(header["seq"]) == seq:
+                    return open_time, ohlcv, seq // 2
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(0.0005)
+
+    def frame(self, symbol: str, interval: str, limit: Optional[int] = None, lowercase: bool = False) -> Optional[pd.DataFrame]:
+        got = self.read(symbol, interval, limit)
+        if got is None:
+            return None
+        return columns_to_frame(got[0], got[1], lowercase=lowercase)
+
+    def close(self):
+        for m in self.maps.values():
+            m.close()
+        self.maps.clear()
@@ -0,0 +1,356 @@
+"""
+Ruajtje kompakte e qirinjve (OHLCV) për botat.
+
+Në vend të një DataFrame me DatetimeIndex për çdo simbol/timeframe,
+ruajmë kolonat si array NumPy të njëpasnjëshme:
+  - open_time: int64 (milisekonda UTC)
+  - Open/High/Low/Close/Volume: float32 te botat (CANDLE_DTYPE), float64 sipas kërkesës
+
+Buffer-i është "unazor" me kapacitet fiks: qirinjtë e rinj shtohen në fund
+dhe më të vjetrit bien jashtë. Funksionet e vjetra që presin DataFrame
+marrin një pamje (view) pa kopjim të kolonave OHLCV me `to_frame()`.
+"""
+import sys
+import time
+import tracemalloc
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson as _json  # opsional, më i shpejtë se json standard
+except ImportError:  # pragma: no cover
+    import json as _json
+
+OHLCV_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+
+# Tipi i kolonave OHLCV në cache-t e botave: 28 B/qiri (me open_time) kundrejt
+# 48 B të DataFrame-it float64; ~7 shifra të sakta mjaftojnë për çmimet e Binance.
+CANDLE_DTYPE = np.float32
+
+# Gjatësia e intervaleve të Binance në milisekonda
+INTERVAL_MS = {
+    "1m": 60_000,
+    "5m": 300_000,
+    "15m": 900_000,
+    "30m": 1_800_000,
+    "1h": 3_600_000,
+    "4h": 14_400_000,
+    "1d": 86_400_000,
+}
+
+
+class CandleSeries:
+    """
+    Seri qirinjsh për një (simbol, interval) me buffer unazor.
+
+    Brenda mbajmë capacity + slack rreshta (slack ~3%): shtimi shkruan në fund
+    dhe, kur mbushet buffer-i, dritarja aktive zhvendoset në fillim (një
+    kopjim i vetëm çdo `slack` shtime). Kështu dritarja [start:end] është gjithmonë
+    e njëpasnjëshme dhe `to_frame()` mund të kthejë slice pa kopjim.
+
+    Kujdes: pamja e kthyer nga `to_frame()` është e vlefshme deri në
+    shtimin e radhës (append/extend mund të mbishkruajnë memorien poshtë saj).
+    """
+
+    __slots__ = ("capacity", "dtype", "_ts", "_cols", "_start", "_end")
+
+    def __init__(self, capacity: int, dtype=np.float64, slack: Optional[int] = None):
+        if capacity <= 0:
+            raise ValueError("capacity duhet të jetë > 0")
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+        if slack is None:
+            slack = max(8, self.capacity // 32)
+        size = self.capacity + max(1, int(slack))
+        self._ts = np.zeros(size, dtype=np.int64)
+        self._cols = np.zeros((len(OHLCV_COLUMNS), size), dtype=self.dtype)
+        self._start = 0
+        self._end = 0
+
+    # ---------------- madhësia / qasja ----------------
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def empty(self) -> bool:
+        return self._end == self._start
+
+    @property
+    def last_open_time(self) -> Optional[int]:
+        """Koha (ms) e qirit të fundit, ose None nëse seria është bosh."""
+        if self.empty:
+            return None
+        return int(self._ts[self._end - 1])
+
+    @property
+    def open_time(self) -> np.ndarray:
+        return self._ts[self._start:self._end]
+
+    def column(self, name: str) -> np.ndarray:
+        return self._cols[OHLCV_COLUMNS.index(name), self._start:self._end]
+
+    @property
+    def ohlcv(self) -> np.ndarray:
+        """Pamje (5, n) mbi kolonat OHLCV të dritares aktive."""
+        return self._cols[:, self._start:self._end]
+
+    @property
+    def nbytes(self) -> int:
+        """Bajtët e alokuar për këtë seri (përfshirë rreshtat rezervë)."""
+        return int(self._ts.nbytes + self._cols.nbytes)
+
+    # ---------------- shtimi ----------------
+
+    def _make_room(self):
+        # Buffer-i u mbush: zhvendos dritaren aktive në fillim.
+        n = self._end - self._start
+        self._ts[:n] = self._ts[self._start:self._end]
+        self._cols[:, :n] = self._cols[:, self._start:self._end]
+        self._start = 0
+        self._end = n
+
+    def append(self, open_time: int, o: float, h: float, l: float, c: float, v: float):
+        """
+        Shton një qiri. Nëse open_time është i njëjtë me qirin e fundit
+        (qiri ende i hapur në exchange), e përditëson në vend që ta shtojë.
+        Qirinjtë më të vjetër se i fundit injorohen.
+        """
+        open_time = int(open_time)
+        if not self.empty:
+            last = self._ts[self._end - 1]
+            if open_time == last:
+                self._cols[:, self._end - 1] = (o, h, l, c, v)
+                return
+            if open_time < last:
+                return
+
+        if self._end == len(self._ts):
+            self._make_room()
+
+        self._ts[self._end] = open_time
+        self._cols[:, self._end] = (o, h, l, c, v)
+        self._end += 1
+        if self._end - self._start > self.capacity:
+            self._start += 1
+
+    def extend_rows(self, rows: Iterable[List]):
+        """
+        Shton rreshta në formatin e Binance klines:
+        [ openTime, open, high, low, close, volume, closeTime, ... ]
+        """
+        for k in rows:
+            self.append(
+                int(k[0]),
+                float(k[1]),
+                float(k[2]),
+                float(k[3]),
+                float(k[4]),
+                float(k[5]),
+            )
+
+    def extend(self, open_time: np.ndarray, cols: np.ndarray):
+        """
+        Shton shumë qirinj njëherësh (pa rreshta Python).
+        open_time: int64 (n,), cols: (5, n) në rendin OHLCV_COLUMNS.
+        Qirinjtë duhet të jenë të renditur sipas kohës (si nga Binance).
+        """
+        open_time = np.asarray(open_time, dtype=np.int64)
+        cols = np.asarray(cols)
+        if open_time.size == 0:
+            return
+
+        if not self.empty:
+            last = self._ts[self._end - 1]
+            mask = open_time >= last
+            if not mask.all():
+                open_time = open_time[mask]
+                cols = cols[:, mask]
+            if open_time.size and open_time[0] == last:
+                # qiri i hapur: përditëso rreshtin e fundit
+                self._cols[:, self._end - 1] = cols[:, 0]
+                open_time = open_time[1:]
+                cols = cols[:, 1:]
+            if open_time.size == 0:
+                return
+
+        n = open_time.size
+        if n >= self.capacity:
+            self._ts[:self.capacity] = open_time[-self.capacity:]
+            self._cols[:, :self.capacity] = cols[:, -self.capacity:]
+            self._start = 0
+            self._end = self.capacity
+            return
+
+        if self._end + n > len(self._ts):
+            # mbaj vetëm aq rreshta të vjetër sa nevojiten për kapacitetin
+            keep = min(len(self), self.capacity - n)
+            src = self._end - keep
+            self._ts[:keep] = self._ts[src:self._end]
+            self._cols[:, :keep] = self._cols[:, src:self._end]
+            self._start = 0
+            self._end = keep
+
+        self._ts[self._end:self._end + n] = open_time
+        self._cols[:, self._end:self._end + n] = cols
+        self._end += n
+        if self._end - self._start > self.capacity:
+            self._start = self._end - self.capacity
+
+    # ---------------- pamja për kodin e vjetër ----------------
+
+    def to_frame(self, lowercase: bool = False) -> pd.DataFrame:
+        """
+        Kthen DataFrame me kolonat OHLCV si pamje mbi array-t (pa kopjim)
+        dhe DatetimeIndex UTC (open_time).
+        """
+        if self.empty:
+            return pd.DataFrame()
+        return columns_to_frame(self.open_time, self.ohlcv, lowercase=lowercase)
+
+
+def to_price(value) -> float:
+    """
+    Çmim nga cache float32 si float Python me paraqitjen më të shkurtër
+    (60000.12, jo 60000.12109375), për payload-in e sinjalit.
+    """
+    if isinstance(value, np.float32):
+        return float(str(value))
+    return float(value)
+
+
+def columns_to_frame(open_time: np.ndarray, cols: np.ndarray, lowercase: bool = False) -> pd.DataFrame:
+    """
+    (open_time int64 ms, cols (5, n)) -> DataFrame OHLCV me DatetimeIndex UTC.
+    Kolonat janë pamje mbi `cols` (pa kopjim).
+    """
+    if len(open_time) == 0:
+        return pd.DataFrame()
+    names = [c.lower() for c in OHLCV_COLUMNS] if lowercase else list(OHLCV_COLUMNS)
+    data = {name: cols[i] for i, name in enumerate(names)}
+    index = pd.DatetimeIndex(
+        np.asarray(open_time, dtype=np.int64).view("datetime64[ms]"), name="open_time"
+    ).tz_localize("UTC")
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+# ======================================================
+#              DEKODIMI I KLINES (BINANCE)
+# ======================================================
+
+def decode_klines(raw: bytes):
+    """
+    Dekodon përgjigjen e /fapi/v1/klines në kolona NumPy: JSON parser
+    (orjson nëse është i instaluar) dhe një np.asarray float64 mbi 6 fushat
+    e para të çdo rreshti (numrat si string konvertohen nga NumPy).
+
+    Kthen (open_time int64 (n,), ohlcv float64 (5, n)).
+    """
+    rows = _json.loads(raw)
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty((len(OHLCV_COLUMNS), 0))
+    table = np.asarray([k[:6] for k in rows], dtype=np.float64)
+    return table[:, 0].astype(np.int64), np.ascontiguousarray(table[:, 1:6].T)
+
+
+# ======================================================
+#                  MEMORY REPORT
+# ======================================================
+
+def legacy_frame_from_rows(rows: List[List]) -> pd.DataFrame:
+    """Rruga e vjetër e fetch_klines: list tuple-sh -> DataFrame -> to_datetime."""
+    df = pd.DataFrame(
+        [(int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5])) for k in rows],
+        columns=["open_time", *OHLCV_COLUMNS],
+    )
+    df["open_time"] = pd.to_datetime(df["open_time"], unit="ms", utc=True)
+    df.set_index("open_time", inplace=True)
+    return df.sort_index()
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """Bajtët e një DataFrame (me index) siç i mban boti sot."""
+    if df is None or df.empty:
+        return 0
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _peak_alloc(fn) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _synthetic_klines(n: int, step_ms: int, seed: int) -> List[List]:
+    rng = np.random.default_rng(seed)
+    start = int(time.time() * 1000) // step_ms * step_ms - n * step_ms
+    price = 100.0
+    rows = []
+    for i in range(n):
+        o = price
+        c = o * (1 + rng.normal(0, 0.01))
+        h = max(o, c) * (1 + abs(rng.normal(0, 0.003)))
+        l = min(o, c) * (1 - abs(rng.normal(0, 0.003)))
+        v = abs(rng.normal(1000, 300))
+        t = start + i * step_ms
+        rows.append([t, f"{o:.8f}", f"{h:.8f}", f"{l:.8f}", f"{c:.8f}", f"{v:.3f}", t + step_ms - 1])
+        price = c
+    return rows
+
+
+def memory_report(n_symbols: int = 100, universe=(("1d", 260, 86_400_000), ("4h", 300, 14_400_000))):
+    """
+    Printon bajtët për simbol para (DataFrame i ri në çdo fetch) dhe pas
+    (CandleSeries CANDLE_DTYPE në cache, ku çdo skanim shton vetëm qirinjtë
+    e fundit; f64 jepet për krahasim):
+      - resident: memoria që mbetet e zënë për serinë
+      - alloc/pass: piku i alokimeve gjatë një rifreskimi
+    """
+    totals = dict(df_res=0, df_alloc=0, f64_res=0, f32_res=0, cs_alloc=0)
+    header = f"{'SERIES':<14}{'DF res':>10}{'DF alloc':>10}{'CS64 res':>10}{'CS32 res':>10}{'CS alloc':>10}"
+    print(header)
+    for s in range(n_symbols):
+        for interval, limit, step in universe:
+            rows = _synthetic_klines(limit + 2, step, seed=s)
+            head, tail = rows[:limit], rows[-2:]
+
+            df = legacy_frame_from_rows(head)
+            df_alloc = _peak_alloc(lambda: legacy_frame_from_rows(head))
+
+            s64 = CandleSeries(capacity=limit, dtype=np.float64)
+            s64.extend_rows(head)
+            s32 = CandleSeries(capacity=limit, dtype=CANDLE_DTYPE)
+            s32.extend_rows(head)
+            cs_alloc = _peak_alloc(lambda: (s32.extend_rows(tail), s32.to_frame()))
+
+            row = dict(
+                df_res=frame_nbytes(df), df_alloc=df_alloc,
+                f64_res=s64.nbytes, f32_res=s32.nbytes, cs_alloc=cs_alloc,
+            )
+            for k, v in row.items():
+                totals[k] += v
+            if s < 3:
+                print(
+                    f"{'SYM%03d/%s' % (s, interval):<14}{row['df_res']:>10}{row['df_alloc']:>10}"
+                    f"{row['f64_res']:>10}{row['f32_res']:>10}{row['cs_alloc']:>10}"
+                )
+
+    n = max(n_symbols, 1)
+    print("-" * len(header))
+    print(
+        f"[MEMORY] {n_symbols} simbole x {len(universe)} TF | bytes/simbol: "
+        f"DataFrame res={totals['df_res'] // n} alloc/pass={totals['df_alloc'] // n} | "
+        f"CandleSeries f64 res={totals['f64_res'] // n} f32 res={totals['f32_res'] // n} "
+        f"alloc/pass={totals['cs_alloc'] // n} | f32 kundrejt DataFrame: "
+        f"{100 * (1 - totals['f32_res'] / max(totals['df_res'], 1)):.0f}% më pak"
+    )
+
+
+if __name__ == "__main__":
+    # Univers tipik i crypto_swing_bot: 100 simbole x (D1 260 + 4H 300) qirinj.
+    memory_report(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,406 @@
+"""
+Regjistrim dhe riluajtje (record & replay) e të dhënave të tregut që sheh boti.
+
+Kur `MARKET_CAPTURE_DIR` është vendosur, çdo bot shkruan çdo përgjigje të
+fetch-it (qirinjtë që i kalon analizës) në një file capture vetëm-shtim:
+
+    {MARKET_CAPTURE_DIR}/{bot_id}/{YYYY-MM-DD}.cap   rekordet (zlib)
+    {MARKET_CAPTURE_DIR}/{bot_id}/{YYYY-MM-DD}.idx   indeksi (ts ms, offset)
+
+Një rekord = (ts, kind, key, frames). Për çdo frame ruhen vetëm qirinjtë e
+rinj (delta) kundrejt rekordit të mëparshëm të të njëjtit stream, plus
+gjatësia e dritares; çdo KEYFRAME_SECONDS dhe në fillim të çdo file-i
+shkruhet dritarja e plotë, që leximi të mund të fillojë nga çdo orë.
+Një rekord i prerë në fund (crash) injorohet nga lexuesi.
+
+Riluajtja (`python capture.py replay ...`) i kalon capture-at sërish nëpër
+`analyze_symbol` të botit, me orën e botit të fiksuar në kohën e rekordit
+dhe pa rrjet (sinjalet mblidhen në vend që të dërgohen), pa pritje mes
+skanimeve: mjet debug-u dhe njëkohësisht ngarkesë reale për benchmark.
+
+Përdorim:
+    MARKET_CAPTURE_DIR=data/capture python3 crypto_swing_bot.py
+    python capture.py replay data/capture/crypto_swing_bot --from 2026-01-05T10:00 --to 2026-01-05T12:00
+"""
+import argparse
+import importlib
+import json
+import os
+import struct
+import sys
+import time
+import traceback
+import zlib
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from candle_store import OHLCV_COLUMNS, columns_to_frame
+
+# ======================================================
+#                     CONFIG
+# ======================================================
+
+CAPTURE_DIR = os.getenv("MARKET_CAPTURE_DIR", "")   # bosh = pa regjistrim
+
+# Sa shpesh shkruhet dritarja e plotë e çdo stream-i
+KEYFRAME_SECONDS = 6 * 3600
+
+ZLIB_LEVEL = 6
+
+MAGIC = 0x52504143  # "CAPR"
+RECORD_HEADER = struct.Struct("<IIq")  # magic, gjatësia e body-t, ts (ms)
+INDEX_DTYPE = np.dtype([("ts", "<i8"), ("offset", "<u8")])
+
+_UTC = "UTC"
+
+
+def _frame_columns(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, str, bool]:
+    """DataFrame OHLCV -> (open_time ms UTC, ohlcv (5, n), tz, kolona lowercase)."""
+    lower = "Open" not in df.columns
+    names = [c.lower() for c in OHLCV_COLUMNS] if lower else list(OHLCV_COLUMNS)
+    index = pd.DatetimeIndex(df.index)
+    tz = "" if index.tz is None else str(index.tz)
+    utc = index.tz_localize(_UTC) if index.tz is None else index.tz_convert(_UTC)
+    open_time = utc.as_unit("ms").asi8
+    ohlcv = np.vstack([df[name].to_numpy(dtype=np.float64) for name in names])
+    return open_time, ohlcv, tz, lower
+
+
+def _columns_frame(open_time: np.ndarray, ohlcv: np.ndarray, tz: str, lower: bool) -> pd.DataFrame:
+    df = columns_to_frame(open_time.copy(), ohlcv.copy(), lowercase=lower)
+    if df.empty:
+        return df
+    if not tz:
+        return df.tz_localize(None)
+    if tz != _UTC:
+        return df.tz_convert(tz)
+    return df
+
+
+# ======================================================
+#                     SHKRUESI
+# ======================================================
+
+class CaptureWriter:
+    """Shkruesi i capture-ave të një boti (një file në ditë UTC)."""
+
+    def __init__(self, bot_id: str, directory: str = CAPTURE_DIR):
+        self.directory = os.path.join(directory, bot_id)
+        os.makedirs(self.directory, exist_ok=True)
+        self.day: Optional[str] = None
+        self.data = None
+        self.index = None
+        self.keyframe_at = 0
+        # (kind, key, emri) -> (open_time, ohlcv) i rekordit të fundit
+        self.state: Dict[Tuple, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def _open(self, ts_ms: int):
+        day = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+        if day == self.day:
+            return
+        self.close()
+        self.day = day
+        self.data = open(os.path.join(self.directory, f"{day}.cap"), "ab")
+        self.index = open(os.path.join(self.directory, f"{day}.idx"), "ab")
+        self.state.clear()  # çdo file fillon me dritare të plota
+
+    def _delta(self, stream: Tuple, open_time: np.ndarray, ohlcv: np.ndarray) -> int:
+        """Sa rreshta në fillim të dritares janë të njëjtë me rekordin e mëparshëm (0 = e plotë)."""
+        prev = self.state.get(stream)
+        if prev is None or open_time.size == 0:
+            return 0
+        p_time, p_ohlcv = prev
+        # qiri i fundit i mëparshëm mund të jetë përditësuar -> rishkruhet
+        s = int(np.searchsorted(open_time, p_time[-1]))
+        if s == 0 or s > p_time.size - 1:
+            return 0
+        lo = p_time.size - 1 - s
+        if not (
+            np.array_equal(open_time[:s], p_time[lo:lo + s])
+            and np.array_equal(ohlcv[:, :s], p_ohlcv[:, lo:lo + s], equal_nan=True)
+        ):
+            return 0
+        return s
+
+    def record(self, kind: str, key: tuple, frames: Dict[str, pd.DataFrame], ts_ms: Optional[int] = None):
+        """Shton një rekord: `frames` janë DataFrame-t që boti i kalon analizës."""
+        if ts_ms is None:
+            ts_ms = int(time.time() * 1000)
+        self._open(ts_ms)
+        if ts_ms >= self.keyframe_at:
+            self.state.clear()
+            self.keyframe_at = ts_ms + KEYFRAME_SECONDS * 1000
+
+        meta = []
+        chunks = []
+        for name, df in frames.items():
+            if df is None or df.empty:
+                continue
+            open_time, ohlcv, tz, lower = _frame_columns(df)
+            stream = (kind, key, name)
+            skip = self._delta(stream, open_time, ohlcv)
+            self.state[stream] = (open_time, ohlcv)
+            meta.append({"name": name, "n": int(open_time.size), "skip": skip, "tz": tz, "lower": lower})
+            chunks.append(open_time[skip:].tobytes())
+            chunks.append(np.ascontiguousarray(ohlcv[:, skip:]).tobytes())
+        if not meta:
+            return
+
+        header = json.dumps({"kind": kind, "key": list(key), "frames": meta}).encode()
+        body = zlib.compress(struct.pack("<I", len(header)) + header + b"".join(chunks), ZLIB_LEVEL)
+        offset = self.data.tell()
+        self.data.write(RECORD_HEADER.pack(MAGIC, len(body), ts_ms) + body)
+        self.data.flush()
+        self.index.write(np.array([(ts_ms, offset)], dtype=INDEX_DTYPE).tobytes())
+        self.index.flush()
+
+    def close(self):
+        for f in (self.data, self.index):
+            if f is not None:
+                f.close()
+        self.data = self.index = None
+        self.day = None
+
+
+_WRITERS: Dict[str, CaptureWriter] = {}
+
+
+def writer_for(bot_id: str) -> Optional[CaptureWriter]:
+    """CaptureWriter i botit, ose None kur MARKET_CAPTURE_DIR nuk është vendosur."""
+    if not CAPTURE_DIR:
+        return None
+    writer = _WRITERS.get(bot_id)
+    if writer is None:
+        writer = _WRITERS[bot_id] = CaptureWriter(bot_id)
+    return writer
+
+
+# ======================================================
+#                     LEXUESI
+# ======================================================
+
+class CaptureReader:
+    """Lexon rekordet e një folderi capture sipas kohës, duke rindërtuar dritaret."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.files = sorted(f[:-4] for f in os.listdir(directory) if f.endswith(".cap"))
+
+    def _raw(self, day: str, start_ms: Optional[int]) -> Iterator[Tuple[int, bytes]]:
+        data_path = os.path.join(self.directory, f"{day}.cap")
+        index_path = os.path.join(self.directory, f"{day}.idx")
+        offset = 0
+        if start_ms is not None and os.path.exists(index_path):
+            idx = np.fromfile(index_path, dtype=INDEX_DTYPE)
+            # fillo një keyframe më herët që dritaret të rindërtohen
+            pos = int(np.searchsorted(idx["ts"], start_ms - KEYFRAME_SECONDS * 1000))
+            if pos < idx.size:
+                offset = int(idx["offset"][pos])
+            elif idx.size:
+                return
+        with open(data_path, "rb") as f:
+            f.seek(offset)
+            while True:
+                head = f.read(RECORD_HEADER.size)
+                if len(head) < RECORD_HEADER.size:
+                    return
+                magic, length, ts_ms = RECORD_HEADER.unpack(head)
+                body = f.read(length)
+                if magic != MAGIC or len(body) < length:
+                    return  # rekord i prerë në fund
+                yield ts_ms, body
+
+    def records(
+        self, start_ms: Optional[int] = None, end_ms: Optional[int] = None
+    ) -> Iterator[Tuple[int, str, tuple, Dict[str, pd.DataFrame]]]:
+        """(ts, kind, key, {emri: DataFrame}) në rendin e regjistrimit."""
+        for day in self.files:
+            if start_ms is not None and day < _day(start_ms - KEYFRAME_SECONDS * 1000):
+                continue
+            if end_ms is not None and day > _day(end_ms):
+                break
+            state: Dict[Tuple, Tuple[np.ndarray, np.ndarray]] = {}
+            for ts_ms, body in self._raw(day, start_ms):
+                if end_ms is not None and ts_ms > end_ms:
+                    return
+                raw = zlib.decompress(body)
+                (hlen,) = struct.unpack_from("<I", raw)
+                header = json.loads(raw[4:4 + hlen])
+                key = tuple(header["key"])
+                pos = 4 + hlen
+                frames = {}
+                for meta in header["frames"]:
+                    rows = meta["n"] - meta["skip"]
+                    open_time = np.frombuffer(raw, dtype="<i8", count=rows, offset=pos)
+                    pos += rows * 8
+                    ohlcv = np.frombuffer(raw, dtype="<f8", count=rows * len(OHLCV_COLUMNS), offset=pos)
+                    ohlcv = ohlcv.reshape(len(OHLCV_COLUMNS), rows)
+                    pos += ohlcv.nbytes
+
+                    stream = (header["kind"], key, meta["name"])
+                    if meta["skip"]:
+                        prev = state.get(stream)
+                        if prev is None:
+                            continue  # delta pa keyframe (fillim në mes të file-it)
+                        p_time, p_ohlcv = prev
+                        keep = p_time[:-1] < open_time[0] if rows else np.ones(p_time.size - 1, dtype=bool)
+                        open_time = np.concatenate([p_time[:-1][keep], open_time])[-meta["n"]:]
+                        ohlcv = np.concatenate([p_ohlcv[:, :-1][:, keep], ohlcv], axis=1)[:, -meta["n"]:]
+                    state[stream] = (open_time, ohlcv)
+                    frames[meta["name"]] = _columns_frame(open_time, ohlcv, meta["tz"], meta["lower"])
+                if start_ms is not None and ts_ms < start_ms:
+                    continue
+                if frames:
+                    yield ts_ms, header["kind"], key, frames
+
+
+def _day(ts_ms: int) -> str:
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+# ======================================================
+#                     RILUAJTJA
+# ======================================================
+
+class _ReplayClock(datetime):
+    """datetime.now() i botit kthen kohën e rekordit që po riluhet."""
+
+    now_ms = 0
+
+    @classmethod
+    def now(cls, tz=None):
+        dt = datetime.fromtimestamp(cls.now_ms / 1000, tz=timezone.utc)
+        return dt.astimezone(tz) if tz is not None else dt.replace(tzinfo=None)
+
+
+class Replayer:
+    """
+    Kalon rekordet nëpër analizën e një boti. Fetch-et dhe dërgimet e botit
+    zëvendësohen në modul: fetch kthen frame-in e rekordit, sinjalet mblidhen.
+    """
+
+    def __init__(self, bot_id: str):
+        self.bot_id = bot_id
+        self.bot = importlib.import_module(bot_id if bot_id != "forex_scalper_bot" else "forex_scalp_bot")
+        self.signals: List[dict] = []
+        self.analyses = 0
+        self.errors = 0
+        self.current: Dict[str, pd.DataFrame] = {}
+        self.pending: Dict[str, Dict[str, pd.DataFrame]] = {}
+
+        bot = self.bot
+        bot.datetime = _ReplayClock
+        bot.send_signal_to_backend = self._collect
+        for name in ("notify_signal_sent", "send_heartbeat", "send_telegram_message"):
+            if hasattr(bot, name):
+                setattr(bot, name, lambda *a, **k: None)
+        if hasattr(bot, "fetch_klines"):
+            bot.fetch_klines = lambda symbol, *a, **k: self.current.get(symbol, pd.DataFrame())
+        if hasattr(bot, "fetch_klines_5m"):
+            bot.fetch_klines_5m = lambda symbol, *a, **k: self.current.get(symbol, pd.DataFrame())
+
+    def _collect(self, **kwargs):
+        kwargs["time"] = _ReplayClock.now(timezone.utc).isoformat()
+        self.signals.append(kwargs)
+
+    def _analyze(self, fn, *args, **kwargs):
+        # si main_loop: një gabim në një simbol nuk ndal riluajtjen
+        self.analyses += 1
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            self.errors += 1
+            print(f"[{args[0]}] Exception in analyze:")
+            traceback.print_exc(file=sys.stdout)
+
+    def feed(self, ts_ms: int, kind: str, key: tuple, frames: Dict[str, pd.DataFrame]):
+        _ReplayClock.now_ms = ts_ms
+        bot = self.bot
+        if kind == "klines":
+            symbol = key[0]
+            self.current = {symbol: frames[""]}
+            self._analyze(getattr(bot, "analyze_symbol", None) or bot.analyze_symbol_scalp, symbol)
+        elif kind == "ohlc_batch":
+            interval = key[0]
+            self.pending[interval] = frames
+            if self.bot_id == "forex_swing_bot":
+                if interval != "1h":
+                    return
+                d1 = self.pending.get("1d", {})
+                for symbol in bot.SYMBOLS:
+                    self._analyze(
+                        bot.analyze_symbol, symbol,
+                        d1=d1.get(symbol, pd.DataFrame()), h1=frames.get(symbol, pd.DataFrame()),
+                    )
+            else:
+                for symbol in bot.SYMBOLS:
+                    self._analyze(bot.analyze_symbol, symbol, df=frames.get(symbol, pd.DataFrame()))
+
+
+def _parse_time(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return int(ts.value // 1_000_000)
+
+
+def replay(directory: str, start: Optional[str] = None, end: Optional[str] = None,
+           verbose: bool = False, out: Optional[str] = None) -> dict:
+    """Riluan një folder capture; kthen statistikat e riluajtjes."""
+    bot_id = os.path.basename(os.path.normpath(directory))
+    replayer = Replayer(bot_id)
+    reader = CaptureReader(directory)
+
+    records = 0
+    t0 = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(sys.stdout if verbose else devnull):
+        for ts_ms, kind, key, frames in reader.records(_parse_time(start), _parse_time(end)):
+            replayer.feed(ts_ms, kind, key, frames)
+            records += 1
+    elapsed = time.perf_counter() - t0
+
+    if out:
+        with open(out, "w") as f:
+            for signal in replayer.signals:
+                f.write(json.dumps(signal, default=str) + "\n")
+    return {
+        "bot_id": bot_id,
+        "records": records,
+        "analyses": replayer.analyses,
+        "errors": replayer.errors,
+        "signals": replayer.signals,
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Riluajtje e capture-ave të botave")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    rp = sub.add_parser("replay", help="kalo capture-at nëpër analyze_symbol")
+    rp.add_argument("directory", help="p.sh. data/capture/crypto_swing_bot")
+    rp.add_argument("--from", dest="start", default=None)
+    rp.add_argument("--to", dest="end", default=None)
+    rp.add_argument("--out", default=None, help="sinjalet si JSON lines")
+    rp.add_argument("--verbose", action="store_true", help="shfaq print-et e botit")
+    args = parser.parse_args()
+
+    stats = replay(args.directory, args.start, args.end, args.verbose, args.out)
+    rate = stats["analyses"] / stats["seconds"] if stats["seconds"] else 0.0
+    print(
+        f"[REPLAY] {stats['bot_id']}: {stats['records']} rekorde, {stats['analyses']} analiza, "
+        f"{stats['errors']} gabime, {len(stats['signals'])} sinjale në {stats['seconds']:.2f}s ({rate:.0f} analiza/s)"
+    )
+    for signal in stats["signals"]:
+        print(
+            f"  {signal['time']} {signal.get('symbol')} {signal.get('direction')} "
+            f"entry={signal.get('entry')} sl={signal.get('sl')} tp={signal.get('tp')}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 ﻿import time
 from datetime import datetime, timezone
+from typing import Dict, Tuple
 from zoneinfo import ZoneInfo
 import traceback
 
@@ -7,6 +8,15 @@ import requests
 import pandas as pd
 import numpy as np
 
+import bot_checkpoint
+import bot_timing
+import capture
+import market_gateway
+import ohlcv_store
+import signal_trace
+from bar_aggregator import resample_aligned
+from candle_store import CandleSeries, INTERVAL_MS, columns_to_frame
+
 # =====================================================
 #                     CONFIG
 # =====================================================
@@ -39,6 +49,26 @@ MIN_ADX_STRENGTH = 20  # ulur për më shumë sinjale (ishte 28)
 # Volume confirmation threshold
 MIN_VOLUME_RATIO = 1.8  # volume duhet të jetë 1.8x mbi mesatare (ishte 1.5)
 
+# 1H nxirret nga 5m (një kërkesë për simbol): 12 qirinj 5m për çdo 1H
+LIMIT_1H = 250
+LIMIT_5M = 300
+BASE_LIMIT_5M = (LIMIT_1H + 1) * 12
+
+# Cache e qirinjve 5m: symbol -> CandleSeries
+CANDLE_CACHE: Dict[str, CandleSeries] = {}
+
+# Regjistrimi i qirinjve të analizuar (MARKET_CAPTURE_DIR), për capture.py replay
+CAPTURE = capture.writer_for("crypto_scalp_bot")
+
+# Kohët e fazave për kalim skanimi (BOT_STATUS_PORT hap /status lokal)
+TIMING = bot_timing.PhaseTimer("crypto_scalp_bot")
+
+# Sinjalet e kalimit, dërgohen bashkë me POST /signals/batch në fund të kalimit
+SIGNAL_BATCH = signal_trace.SignalBatch(f"{ADMIN_API_BASE}/signals/batch")
+
+# Gjendja në memorie ruhet periodikisht dhe në SIGTERM, rikthehet në startim
+CHECKPOINT = bot_checkpoint.Checkpoint("crypto_scalp_bot")
+
 # Memorie p├½r sinjalin e fundit
 last_signal_time = {}   # { "BTCUSDT": datetime }
 last_signal_side = {}   # { "BTCUSDT": "BUY" ose "SELL" }
@@ -84,6 +114,7 @@ def is_near_sr_level(price: float, levels: list, tolerance: float = 0.008) -> bo
     return False
 
 
+@TIMING.timed("factor.divergence")
 def detect_rsi_divergence(df: pd.DataFrame, rsi_period: int = 14, lookback: int = 20) -> tuple:
     """
     Detekton bullish dhe bearish divergence n├½ RSI.
@@ -114,6 +145,7 @@ def detect_rsi_divergence(df: pd.DataFrame, rsi_period: int = 14, lookback: int
     return bullish_div, bearish_div
 
 
+@TIMING.timed("factor.trend_1h")
 def detect_trend_1h(df_1h: pd.DataFrame) -> str:
     """
     Trend n├½ 1H me EMA50 dhe EMA200.
@@ -141,17 +173,20 @@ def detect_trend_1h(df_1h: pd.DataFrame) -> str:
 #                 ADMIN MONITORING
 # =====================================================
 
+@TIMING.timed("post.heartbeat")
 def send_heartbeat():
     """
     D├½rgon nj├½ heartbeat te backend q├½ admini t├½ shoh├½ q├½ boti ├½sht├½ gjall├½.
+    Bashkë me të dërgohet telemetria e kalimit të fundit (koha e skanimit,
+    simbolet, gabimet e fetch, cache hit rate, memoria).
     """
     try:
         payload = {
-            "bot_id": BOT_ID,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "name": BOT_ID,
+            "telemetry": TIMING.telemetry(),
         }
         resp = requests.post(
-            f"{ADMIN_API_BASE}/admin/bot_heartbeat",
+            f"{ADMIN_API_BASE}/api/heartbeat",
             json=payload,
             timeout=5,
         )
@@ -163,31 +198,6 @@ def send_heartbeat():
         print(f"[HEARTBEAT] ERROR: {e}")
 
 
-def notify_signal_sent(symbol: str, direction: str):
-    """
-    Njofton backend-in se ky bot ka d├½rguar sinjal.
-    P├½rdoret p├½r /admin/bot_signal dhe p├½r System status n├½ app.
-    """
-    try:
-        payload = {
-            "bot_id": BOT_ID,
-            "symbol": symbol,
-            "direction": direction.upper(),
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-        }
-        resp = requests.post(
-            f"{ADMIN_API_BASE}/admin/bot_signal",
-            json=payload,
-            timeout=5,
-        )
-        if not resp.ok:
-            print(f"[BOT_SIGNAL_LOG] Γ¥î {resp.status_code}: {resp.text}")
-        else:
-            print(f"[BOT_SIGNAL_LOG] Γ£à {symbol} {direction}")
-    except Exception as e:
-        print(f"[BOT_SIGNAL_LOG] ERROR: {e}")
-
-
 # =====================================================
 #             D├ïRGIMI I SINJALEVE TE BACKEND
 # =====================================================
@@ -200,6 +210,7 @@ def send_signal_to_backend(
     sl: float,
     tp: float,
     extra_text: str = "",
+    candle_time=None,
 ):
     """
     D├½rgon sinjal te FastAPI (tabela kryesore e sinjaleve).
@@ -217,26 +228,127 @@ def send_signal_to_backend(
         "status": "open",
         "extra_text": extra_text,
     }
+    trace = signal_trace.new_trace(candle_time)
+    payload.update(trace)
+    payload["bot_id"] = BOT_ID
+    payload["idempotency_key"] = signal_trace.idempotency_key(BOT_ID, trace)
+    payload["cooldown_minutes"] = MIN_MINUTES_BETWEEN_SIGNALS
+
+    print(f"[BACKEND] ⏳ Signal në radhë: {symbol} {direction} {timeframe}")
+    if SIGNAL_BATCH.add(payload):
+        flush_signals()
+
+
+@TIMING.timed("post.signal")
+def flush_signals():
+    """
+    Dërgon sinjalet e kalimit me një POST /signals/batch (një transaksion në
+    API, rezultat për çdo sinjal; të pa dërguarit riprovohen kalimin tjetër).
+    """
+    SIGNAL_BATCH.flush()
+
+
+def warm_dedup_state():
+    """
+    Mbush memorien e sinjaleve të fundit nga API-ja (një query) në startim,
+    që pas një restarti të mos ridërgohen sinjalet e orëve të fundit.
+    """
+    for symbol, side, t in signal_trace.fetch_last_signals(ADMIN_API_BASE, SOURCE_NAME):
+        last_signal_time[symbol] = t  # rreshtat janë sipas kohës: mbetet i fundit
+        last_signal_side[symbol] = side
+
+
+def checkpoint_state() -> dict:
+    return {
+        "candles": CANDLE_CACHE,
+        "last_signal_side": last_signal_side,
+        "last_signal_time": last_signal_time,
+    }
+
+
+def restore_checkpoint():
+    """Rikthen gjendjen nga checkpoint-i (nëse është i freskët) para kalimit të parë."""
+    state = CHECKPOINT.load()
+    if state is None:
+        return
+    # seritë me kapacitet tjetër (konfigurim i ndryshuar mes deploy-eve) shkarkohen sërish
+    CANDLE_CACHE.update(
+        (key, series) for key, series in state.get("candles", {}).items() if series.capacity == BASE_LIMIT_5M
+    )
+    last_signal_side.update(state.get("last_signal_side", {}))
+    last_signal_time.update(state.get("last_signal_time", {}))
+
+
+# =====================================================
+#              HELPER: KLINES (BINANCE)
+# =====================================================
 
+@TIMING.timed("fetch.klines")
+def fetch_klines_5m(symbol: str) -> pd.DataFrame:
+    """
+    Seria bazë 5m (kolona lowercase). Mbahet në CANDLE_CACHE e mbushur nga
+    ohlcv_store dhe kërkohen vetëm qirinjtë e rinj; kur market_gateway
+    është aktiv merret prej tij.
+    """
     try:
-        resp = requests.post(BACKEND_URL, json=payload, timeout=5)
-        if not resp.ok:
-            print(f"[BACKEND] Γ¥î Error {resp.status_code}: {resp.text}")
+        got = market_gateway.client_klines(symbol, "5m", BASE_LIMIT_5M)
+        if got is not None:
+            CANDLE_CACHE.pop(symbol, None)
+            TIMING.count("cache.hit")
+            return columns_to_frame(*got, lowercase=True)
+
+        series = CANDLE_CACHE.get(symbol)
+        if series is None:
+            TIMING.count("cache.miss")
+            series = CANDLE_CACHE[symbol] = CandleSeries(capacity=BASE_LIMIT_5M)
+            series.extend(*ohlcv_store.load(symbol, "5m", limit=BASE_LIMIT_5M))
         else:
-            data = resp.json()
-            print(
-                f"[BACKEND] Γ£à Signal saved (id={data.get('id')}): "
-                f"{symbol} {direction} {timeframe} "
-                f"E={entry:.4f} SL={sl:.4f} TP={tp:.4f}"
-            )
-    except Exception as e:
-        print(f"[BACKEND] Exception sending signal: {e}")
+            TIMING.count("cache.hit")
+
+        req_limit = BASE_LIMIT_5M
+        if len(series) >= BASE_LIMIT_5M:
+            missing = (int(time.time() * 1000) - series.last_open_time) // INTERVAL_MS["5m"] + 1
+            req_limit = int(min(BASE_LIMIT_5M, max(2, missing + 1)))
+
+        open_time, ohlcv = market_gateway.download_klines(symbol, "5m", req_limit)
+        if open_time.size == 0:
+            TIMING.count("fetch.error")
+            return pd.DataFrame()
+        series.extend(open_time, ohlcv)
+        ohlcv_store.append(symbol, "5m", open_time, ohlcv)
+        return series.to_frame(lowercase=True)
+
+    except RuntimeError as e:
+        print(f"[{symbol}] {e}")
+        TIMING.count("fetch.error")
+        return pd.DataFrame()
+    except Exception:
+        print(f"[{symbol}] Exception in fetch_klines_5m:")
+        traceback.print_exc()
+        TIMING.count("fetch.error")
+        return pd.DataFrame()
+
+
+@TIMING.timed("fetch.timeframes")
+def fetch_timeframes(symbol: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Kthen (1h, 5m) nga një seri e vetme 5m: 1H agregohet lokalisht me bin-e
+    të plota orësh UTC si te Binance, një kërkesë për simbol për skanim.
+    """
+    base = fetch_klines_5m(symbol)
+    if base.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    if CAPTURE is not None:
+        CAPTURE.record("klines", (symbol, "5m", BASE_LIMIT_5M), {"": base})
+    df_1h = resample_aligned(base, "1h").iloc[-LIMIT_1H:]
+    return df_1h, base.iloc[-LIMIT_5M:]
 
 
 # =====================================================
 #                  LOGJIKA E SCALPING
 # =====================================================
 
+@TIMING.timed("analyze")
 def analyze_symbol_scalp(symbol: str):
     """
     Strategji e p├½rmir├½suar:
@@ -250,8 +362,8 @@ def analyze_symbol_scalp(symbol: str):
     - 4 nga 6 kushte duhet t├½ jen├½ TRUE
     """
 
-    # 1H p├½r trend
-    df_1h = fetch_klines(symbol, interval="1h", limit=250)
+    # 1H p├½r trend, 5M p├½r entry (një kërkesë; 1H nga 5m)
+    df_1h, df_5m = fetch_timeframes(symbol)
     if df_1h.empty:
         return
 
@@ -261,7 +373,6 @@ def analyze_symbol_scalp(symbol: str):
         return
 
     # 5M p├½r entry
-    df_5m = fetch_klines(symbol, interval="5m", limit=300)
     if df_5m.empty or len(df_5m) < 50:
         return
 
@@ -482,7 +593,7 @@ def analyze_symbol_scalp(symbol: str):
         f"Score={used_score:.1f}/6, RR={risk_reward_ratio:.2f}, ADX={adx_5m:.1f} [{local_time_str}]"
     )
 
-    # 1) d├½rgo sinjalin te tabela kryesore
+    # d├½rgo sinjalin te tabela kryesore
     send_signal_to_backend(
         symbol=symbol,
         direction=direction,
@@ -491,11 +602,9 @@ def analyze_symbol_scalp(symbol: str):
         sl=sl,
         tp=tp,
         extra_text=extra,
+        candle_time=df_5m.index[-1],
     )
 
-    # 2) njofto admin backend-in
-    notify_signal_sent(symbol, direction)
-
 
 # =====================================================
 #                      MAIN LOOP
@@ -514,12 +623,17 @@ def main_loop():
     print(f"Analysis type: {ANALYSIS_TYPE}")
     print(f"Symbols: {len(symbols)}  (USDT-M PERPETUAL)")
     print(f"Scan every {SCAN_INTERVAL} seconds.\n")
+    bot_timing.start_status_server(TIMING)
+    restore_checkpoint()
+    CHECKPOINT.install(checkpoint_state)
+    warm_dedup_state()
 
     # d├½rgo nj├½ heartbeat kur starton
     send_heartbeat()
     last_heartbeat_ts = time.time()
 
     while True:
+        CHECKPOINT.begin_pass()
         now_ts = time.time()
 
         # heartbeat periodik
@@ -533,6 +647,12 @@ def main_loop():
             except Exception:
                 print(f"[{symbol}] Exception in analyze_symbol_scalp:")
                 traceback.print_exc()
+        flush_signals()
+        TIMING.end_pass(len(symbols))
+        # telemetria e kalimit sapo mbyllet
+        send_heartbeat()
+        last_heartbeat_ts = time.time()
+        CHECKPOINT.after_pass()
 
         print(f"\nSleeping {SCAN_INTERVAL} seconds...\n")
         time.sleep(SCAN_INTERVAL)
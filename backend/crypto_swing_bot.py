@@ -9,6 +9,15 @@ import pandas as pd
 import requests
 import traceback
 
+import bot_checkpoint
+import bot_timing
+import capture
+import market_gateway
+import ohlcv_store
+import signal_trace
+from bar_aggregator import resample_aligned
+from candle_store import CANDLE_DTYPE, CandleSeries, INTERVAL_MS, columns_to_frame, to_price
+
 # ======================================================
 #                     CONFIG
 # ======================================================
@@ -37,6 +46,10 @@ INTERVAL_4H = "4h"
 LIMIT_D1 = 260      # mjafton pÃ«r EMA200
 LIMIT_4H = 300
 
+# D1 nxirret nga 4H (një kërkesë për simbol): 6 qirinj 4H për çdo D1
+# +1 ditë se D1 i parë i pjesshëm hidhet
+BASE_LIMIT_4H = (LIMIT_D1 + 1) * 6
+
 # Sa sekonda pushim mes skanimeve
 SLEEP_SECONDS = 600   # 10 minuta
 
@@ -67,6 +80,21 @@ MIN_VOLUME_RATIO = 1.2  # volume aktual duhet tÃ« jetÃ« 1.2x mbi mesatare
 last_signal_side: Dict[str, str] = {}
 last_signal_time: Dict[Tuple[str, str], datetime] = {}  # (symbol, side) -> time
 
+# Cache e qirinjve: (symbol, interval) -> CandleSeries
+CANDLE_CACHE: Dict[Tuple[str, str], CandleSeries] = {}
+
+# Regjistrimi i qirinjve të analizuar (MARKET_CAPTURE_DIR), për capture.py replay
+CAPTURE = capture.writer_for(BOT_ID)
+
+# Kohët e fazave për kalim skanimi (BOT_STATUS_PORT hap /status lokal)
+TIMING = bot_timing.PhaseTimer(BOT_ID)
+
+# Sinjalet e kalimit, dërgohen bashkë me POST /signals/batch në fund të kalimit
+SIGNAL_BATCH = signal_trace.SignalBatch(f"{ADMIN_API_BASE}/signals/batch")
+
+# Gjendja në memorie ruhet periodikisht dhe në SIGTERM, rikthehet në startim
+CHECKPOINT = bot_checkpoint.Checkpoint(BOT_ID)
+
 # Heartbeat config
 HEARTBEAT_INTERVAL = 300  # 5 minuta
 last_heartbeat_ts: float = 0.0
@@ -116,50 +144,82 @@ def get_top_usdt_perps(limit: int = TOP_N_SYMBOLS) -> List[str]:
         ]
 
 
+@TIMING.timed("fetch.klines")
 def fetch_klines(symbol: str, interval: str, limit: int) -> pd.DataFrame:
     """
     Merr OHLCV nga Binance Futures USDT-M.
+    Qirinjtë mbahen në CANDLE_CACHE (CandleSeries), të mbushur në startim
+    nga ohlcv_store; kërkohen vetëm qirinjtë e rinj dhe ata të mbyllur
+    ruhen në disk. Kthehet pamje DataFrame mbi cache.
+    Nëse market_gateway është aktiv, qirinjtë merren prej tij (një shkarkim
+    i përbashkët për të gjithë botat).
     """
     try:
-        url = f"{BINANCE_FAPI_BASE}/fapi/v1/klines"
-        params = {"symbol": symbol, "interval": interval, "limit": limit}
-        resp = requests.get(url, params=params, timeout=10)
-        if not resp.ok:
-            print(f"[{symbol}] Klines error {resp.status_code}: {resp.text}")
-            return pd.DataFrame()
+        key = (symbol, interval)
+
+        got = market_gateway.client_klines(symbol, interval, limit)
+        if got is not None:
+            # historia mbahet te gateway (arena e përbashkët); mos e dyfisho këtu
+            CANDLE_CACHE.pop(key, None)
+            TIMING.count("cache.hit")
+            return columns_to_frame(*got)
+
+        series = CANDLE_CACHE.get(key)
+        if series is None:
+            # startim: lexo historinë nga disku, shkarko vetëm pjesën që mungon
+            TIMING.count("cache.miss")
+            series = CandleSeries(capacity=limit, dtype=CANDLE_DTYPE)
+            series.extend(*ohlcv_store.load(symbol, interval, limit=limit))
+            CANDLE_CACHE[key] = series
+        else:
+            TIMING.count("cache.hit")
 
-        data = resp.json()
-        if not data:
+        req_limit = limit
+        if len(series) >= limit:
+            # sa qirinj kanë kaluar nga i fundit (+1 për qirin që po formohet)
+            step = INTERVAL_MS[interval]
+            missing = (int(time.time() * 1000) - series.last_open_time) // step + 1
+            req_limit = int(min(limit, max(2, missing + 1)))
+
+        # Klines format: [ openTime, open, high, low, close, volume, closeTime, ... ]
+        # (faqe me endTime kur req_limit > 1500)
+        open_time, ohlcv = market_gateway.download_klines(symbol, interval, req_limit)
+        if open_time.size == 0:
             print(f"[{symbol}] No klines data interval={interval}")
+            TIMING.count("fetch.error")
             return pd.DataFrame()
 
-        # Klines format: [ openTime, open, high, low, close, volume, closeTime, ... ]
-        rows = []
-        for k in data:
-            rows.append(
-                (
-                    int(k[0]),
-                    float(k[1]),
-                    float(k[2]),
-                    float(k[3]),
-                    float(k[4]),
-                    float(k[5]),
-                )
-            )
-        df = pd.DataFrame(
-            rows, columns=["open_time", "Open", "High", "Low", "Close", "Volume"]
-        )
-        df["open_time"] = pd.to_datetime(df["open_time"], unit="ms", utc=True)
-        df.set_index("open_time", inplace=True)
-        df = df.sort_index()
-        return df
+        series.extend(open_time, ohlcv)
+        ohlcv_store.append(symbol, interval, open_time, ohlcv)
+        return series.to_frame()
 
+    except RuntimeError as e:
+        print(f"[{symbol}] {e}")
+        TIMING.count("fetch.error")
+        return pd.DataFrame()
     except Exception:
         print(f"[{symbol}] Exception in fetch_klines({interval}):")
         traceback.print_exc()
+        TIMING.count("fetch.error")
         return pd.DataFrame()
 
 
+@TIMING.timed("fetch.timeframes")
+def fetch_timeframes(symbol: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Kthen (d1, h4) nga një seri e vetme 4H: D1 agregohet lokalisht me bin-e
+    00:00 UTC si te Binance, kështu që një skanim bën një kërkesë për simbol
+    dhe D1 është gjithmonë në përputhje me 4H.
+    """
+    base = fetch_klines(symbol, INTERVAL_4H, BASE_LIMIT_4H)
+    if base.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    if CAPTURE is not None:
+        CAPTURE.record("klines", (symbol, INTERVAL_4H, BASE_LIMIT_4H), {"": base})
+    d1 = resample_aligned(base, INTERVAL_D1).iloc[-LIMIT_D1:]
+    return d1, base.iloc[-LIMIT_4H:]
+
+
 # ======================================================
 #                  ATR (Average True Range)
 # ======================================================
@@ -168,6 +228,7 @@ def fetch_klines(symbol: str, interval: str, limit: int) -> pd.DataFrame:
 #                  RSI (Relative Strength Index)
 # ======================================================
 
+@TIMING.timed("indicator.rsi")
 def calculate_rsi(df: pd.DataFrame, period: int = 14) -> float:
     """
     Llogarit RSI për df['Close'].
@@ -181,6 +242,7 @@ def calculate_rsi(df: pd.DataFrame, period: int = 14) -> float:
     rsi = 100 - (100 / (1 + rs))
     return float(rsi.iloc[-1]) if len(rsi) > 0 else 0.0
 
+@TIMING.timed("indicator.atr")
 def calculate_atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
     """
     Llogarit ATR (Average True Range) pÃ«r volatility measurement.
@@ -204,6 +266,7 @@ def calculate_atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
 #                  ADX (Trend Strength)
 # ======================================================
 
+@TIMING.timed("indicator.adx")
 def calculate_adx(df: pd.DataFrame, period: int = 14) -> float:
     """
     Llogarit ADX (Average Directional Index) pÃ«r tÃ« matur forcÃ«n e trendit.
@@ -245,6 +308,7 @@ def calculate_adx(df: pd.DataFrame, period: int = 14) -> float:
     return float(adx.iloc[-1]) if len(adx) > 0 else 0.0
 
 
+@TIMING.timed("indicator.ema")
 def check_ema_alignment(df: pd.DataFrame) -> str:
     """
     Kontrollon alignment të EMA 8, 21, 50 për trend confirmation.
@@ -271,6 +335,7 @@ def check_ema_alignment(df: pd.DataFrame) -> str:
 #                D1 TREND (EMA50 / EMA200)
 # ======================================================
 
+@TIMING.timed("factor.trend_d1")
 def detect_trend_d1(d1: pd.DataFrame) -> str:
     """
     Trend D1 nÃ« bazÃ« tÃ« EMA50 dhe EMA200.
@@ -322,6 +387,7 @@ def find_swings(df: pd.DataFrame, lookback: int = 3):
     return np.array(swing_high_idx, dtype=int), np.array(swing_low_idx, dtype=int)
 
 
+@TIMING.timed("factor.structure")
 def classify_structure(h4: pd.DataFrame):
     """
     Klasifikon strukturÃ«n 4H si "bull", "bear", ose "choppy".
@@ -364,6 +430,7 @@ def classify_structure(h4: pd.DataFrame):
 #                  ORDER BLOCK (4H)
 # ======================================================
 
+@TIMING.timed("factor.order_block")
 def find_recent_order_block(df: pd.DataFrame, direction: str, lookback: int = 60) -> Optional[Tuple[float, float, float]]:
     """
     Gjen njÃ« order block tÃ« fundit me kritere tÃ« pÃ«rmirÃ«suara.
@@ -459,6 +526,7 @@ def find_recent_order_block(df: pd.DataFrame, direction: str, lookback: int = 60
 #                  VOLUME CONFIRMATION
 # ======================================================
 
+@TIMING.timed("factor.volume")
 def check_volume_confirmation(df: pd.DataFrame, lookback: int = 20) -> Tuple[bool, float]:
     """
     Kontrollon nÃ«se volume aktual Ã«shtÃ« mÃ« i lartÃ« se mesatarja.
@@ -484,6 +552,7 @@ def check_volume_confirmation(df: pd.DataFrame, lookback: int = 20) -> Tuple[boo
 #              SUPPORT / RESISTANCE LEVELS
 # ======================================================
 
+@TIMING.timed("factor.sr_levels")
 def find_support_resistance_levels(df: pd.DataFrame, lookback: int = 100, num_levels: int = 5) -> Tuple[List[float], List[float]]:
     """
     Gjen nivelet kryesore tÃ« support dhe resistance duke pÃ«rdorur swing highs/lows.
@@ -543,6 +612,7 @@ def is_near_sr_level(price: float, levels: List[float], tolerance: float = 0.01)
 #                  RSI DIVERGENCE
 # ======================================================
 
+@TIMING.timed("factor.divergence")
 def detect_rsi_divergence(df: pd.DataFrame, rsi_period: int = 14, lookback: int = 30) -> Tuple[bool, bool]:
     """
     Detekton bullish dhe bearish divergence nÃ« RSI.
@@ -588,6 +658,7 @@ def detect_rsi_divergence(df: pd.DataFrame, rsi_period: int = 14, lookback: int
 #                     FVG (4H)
 # ======================================================
 
+@TIMING.timed("factor.fvg")
 def has_recent_fvg(df: pd.DataFrame, direction: str, lookback: int = 40) -> bool:
     """
     FVG i thjeshtuar (3 qirinj).
@@ -619,6 +690,7 @@ def has_recent_fvg(df: pd.DataFrame, direction: str, lookback: int = 40) -> bool
 #                   CRT (Change of Character)
 # ======================================================
 
+@TIMING.timed("factor.crt")
 def detect_crt(h4: pd.DataFrame,
                swing_high_idx: np.ndarray,
                swing_low_idx: np.ndarray,
@@ -652,17 +724,20 @@ def detect_crt(h4: pd.DataFrame,
 #                 ADMIN MONITORING
 # ======================================================
 
+@TIMING.timed("post.heartbeat")
 def send_heartbeat():
     """
     DÃ«rgon njÃ« heartbeat te backend qÃ« admini tÃ« shohÃ« qÃ« boti Ã«shtÃ« gjallÃ«.
+    Bashkë me të dërgohet telemetria e kalimit të fundit (koha e skanimit,
+    simbolet, gabimet e fetch, cache hit rate, memoria).
     """
     try:
         payload = {
-            "bot_id": BOT_ID,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "name": BOT_ID,
+            "telemetry": TIMING.telemetry(),
         }
         resp = requests.post(
-            f"{ADMIN_API_BASE}/admin/bot_heartbeat",
+            f"{ADMIN_API_BASE}/api/heartbeat",
             json=payload,
             timeout=5,
         )
@@ -674,31 +749,6 @@ def send_heartbeat():
         print(f"[HEARTBEAT] ERROR: {e}")
 
 
-def notify_signal_sent(symbol: str, direction: str):
-    """
-    Njofton backend-in se ky bot ka dÃ«rguar sinjal.
-    PÃ«rdoret pÃ«r /admin/bot_signal dhe pÃ«r System status nÃ« app.
-    """
-    try:
-        payload = {
-            "bot_id": BOT_ID,
-            "symbol": symbol,
-            "direction": direction.upper(),
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-        }
-        resp = requests.post(
-            f"{ADMIN_API_BASE}/admin/bot_signal",
-            json=payload,
-            timeout=5,
-        )
-        if not resp.ok:
-            print(f"[BOT_SIGNAL_LOG] âŒ {resp.status_code}: {resp.text}")
-        else:
-            print(f"[BOT_SIGNAL_LOG] âœ… {symbol} {direction}")
-    except Exception as e:
-        print(f"[BOT_SIGNAL_LOG] ERROR: {e}")
-
-
 # ======================================================
 #                 BACKEND â€“ SEND SIGNAL
 # ======================================================
@@ -711,6 +761,7 @@ def send_signal_to_backend(
     sl: float,
     tp: float,
     extra_text: str = "",
+    candle_time=None,
 ):
     """
     DÃ«rgon sinjal te FastAPI...
@@ -728,44 +779,80 @@ def send_signal_to_backend(
         "status": "open",
         "extra_text": extra_text,
     }
+    trace = signal_trace.new_trace(candle_time)
+    payload.update(trace)
+    payload["bot_id"] = BOT_ID
+    payload["idempotency_key"] = signal_trace.idempotency_key(BOT_ID, trace)
+    payload["cooldown_minutes"] = MIN_MINUTES_BETWEEN_SIGNALS
+
+    print(f"[BACKEND] ⏳ Signal në radhë: {symbol} {direction} {timeframe}")
+    if SIGNAL_BATCH.add(payload):
+        flush_signals()
+
+
+@TIMING.timed("post.signal")
+def flush_signals():
+    """
+    Dërgon sinjalet e kalimit me një POST /signals/batch (një transaksion në
+    API, rezultat për çdo sinjal; të pa dërguarit riprovohen kalimin tjetër).
+    """
+    SIGNAL_BATCH.flush()
+
+
+def warm_dedup_state():
+    """
+    Mbush memorien e sinjaleve të fundit nga API-ja (një query) në startim,
+    që pas një restarti të mos ridërgohen sinjalet e orëve të fundit.
+    """
+    for symbol, side, t in signal_trace.fetch_last_signals(ADMIN_API_BASE, SOURCE_NAME):
+        last_signal_time[(symbol, side)] = t
+        last_signal_side[symbol] = side  # rreshtat janë sipas kohës: mbetet i fundit
+
+
+def checkpoint_state() -> dict:
+    return {
+        "candles": CANDLE_CACHE,
+        "last_signal_side": last_signal_side,
+        "last_signal_time": last_signal_time,
+    }
 
-    try:
-        resp = requests.post(BACKEND_URL, json=payload, timeout=5)
-        if not resp.ok:
-            print(f"[BACKEND] âŒ Error {resp.status_code}: {resp.text}")
-        else:
-            data = resp.json()
-            print(
-                f"[BACKEND] âœ… Signal saved (id={data.get('id')}): "
-                f"{symbol} {direction} {timeframe} "
-                f"E={entry:.4f} SL={sl:.4f} TP={tp:.4f}"
-            )
-    except Exception as e:
-        print(f"[BACKEND] Exception sending signal: {e}")
+
+def restore_checkpoint():
+    """Rikthen gjendjen nga checkpoint-i (nëse është i freskët) para kalimit të parë."""
+    state = CHECKPOINT.load()
+    if state is None:
+        return
+    # seritë me kapacitet/tip tjetër (konfigurim i ndryshuar mes deploy-eve) shkarkohen sërish
+    CANDLE_CACHE.update(
+        (key, series) for key, series in state.get("candles", {}).items()
+        if series.capacity == BASE_LIMIT_4H and series.dtype == CANDLE_DTYPE
+    )
+    last_signal_side.update(state.get("last_signal_side", {}))
+    last_signal_time.update(state.get("last_signal_time", {}))
 
 
 # ======================================================
 #                    SIGNAL LOGIC
 # ======================================================
 
+@TIMING.timed("analyze")
 def analyze_symbol(symbol: str):
     global last_signal_side, last_signal_time
 
-    # ---------- D1 ----------
-    d1 = fetch_klines(symbol, INTERVAL_D1, LIMIT_D1)
+    # ---------- D1 + 4H (një kërkesë; D1 nga 4H) ----------
+    d1, h4 = fetch_timeframes(symbol)
     if d1.empty:
         print(f"[{symbol}] No D1 data.")
         return
     trend_d1 = detect_trend_d1(d1)
 
     # ---------- 4H ----------
-    h4 = fetch_klines(symbol, INTERVAL_4H, LIMIT_4H)
     if h4.empty or len(h4) < 60:
         print(f"[{symbol}] No/low 4H data.")
         return
 
     structure_4h, swing_high_idx, swing_low_idx = classify_structure(h4)
-    current_price = float(h4["Close"].iloc[-1])
+    current_price = to_price(h4["Close"].iloc[-1])
     
     # ===== ANALYTICAL INDICATORS =====
     # ATR pÃ«r dynamic SL/TP
@@ -1003,7 +1090,7 @@ def analyze_symbol(symbol: str):
         f"ADX={adx_value:.1f}, Vol={volume_ratio:.2f}x"
     )
 
-    # 1) DÃ«rgo sinjalin te tabela kryesore
+    # DÃ«rgo sinjalin te tabela kryesore
     send_signal_to_backend(
         symbol=symbol,
         direction=signal_side,
@@ -1012,11 +1099,9 @@ def analyze_symbol(symbol: str):
         sl=sl,
         tp=tp,
         extra_text=extra_text,
+        candle_time=h4.index[-1],
     )
 
-    # 2) Njofto admin backend-in qÃ« u dÃ«rgua sinjal
-    notify_signal_sent(symbol, signal_side)
-
 
 # ======================================================
 #                    MAIN LOOP
@@ -1032,11 +1117,17 @@ def main_loop():
     print(f"Symbols: {len(symbols)}  (top {TOP_N_SYMBOLS} USDT-M PERPETUAL)")
     print(f"TF: D1 + 4H, scan every {SLEEP_SECONDS} seconds.\n")
 
+    bot_timing.start_status_server(TIMING)
+    restore_checkpoint()
+    CHECKPOINT.install(checkpoint_state)
+    warm_dedup_state()
+
     # dÃ«rgo njÃ« heartbeat kur starton
     send_heartbeat()
     last_heartbeat_ts = time.time()
 
     while True:
+        CHECKPOINT.begin_pass()
         now_ts = time.time()
 
         # heartbeat periodik
@@ -1050,6 +1141,12 @@ def main_loop():
             except Exception:
                 print(f"[{symbol}] Exception in analyze_symbol:")
                 traceback.print_exc()
+        flush_signals()
+        TIMING.end_pass(len(symbols))
+        # telemetria e kalimit sapo mbyllet
+        send_heartbeat()
+        last_heartbeat_ts = time.time()
+        CHECKPOINT.after_pass()
         print(f"Sleeping {SLEEP_SECONDS} seconds...\n")
         time.sleep(SLEEP_SECONDS)
 
@@ -1,6 +1,6 @@
 ﻿import time
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Tuple, Optional
+from typing import Dict, Tuple, Optional, List
 
 import numpy as np
 import pandas as pd
@@ -8,6 +8,13 @@ import yfinance as yf
 import requests
 import traceback
 
+import bot_checkpoint
+import bot_timing
+import capture
+import market_gateway
+import signal_trace
+import yf_batch
+
 # ======================================================
 #                     CONFIG
 # ======================================================
@@ -32,7 +39,7 @@ SYMBOLS = [
     "AUDCHF=X", "AUDJPY=X", "NZDCAD=X", "NZDCHF=X", "NZDJPY=X",
     "CADCHF=X", "CADJPY=X", "CHFJPY=X"
 ]
-    from datetime import datetime  # Ensure datetime is imported for new factors
+from datetime import datetime  # Ensure datetime is imported for new factors
 
 
 INTERVAL = "5m"         # Scalping TF
@@ -60,6 +67,18 @@ MIN_MINUTES_BETWEEN_SIGNALS = 30
 # Memoria e sinjalit tÃ« fundit
 last_signal_time: Dict[Tuple[str, str], datetime] = {}  # (symbol, side) -> time
 
+# Regjistrimi i qirinjve të analizuar (MARKET_CAPTURE_DIR), për capture.py replay
+CAPTURE = capture.writer_for(BOT_ID)
+
+# Kohët e fazave për kalim skanimi (BOT_STATUS_PORT hap /status lokal)
+TIMING = bot_timing.PhaseTimer(BOT_ID)
+
+# Sinjalet e kalimit, dërgohen bashkë me POST /signals/batch në fund të kalimit
+SIGNAL_BATCH = signal_trace.SignalBatch(f"{ADMIN_API_BASE}/signals/batch")
+
+# Gjendja në memorie ruhet periodikisht dhe në SIGTERM, rikthehet në startim
+CHECKPOINT = bot_checkpoint.Checkpoint(BOT_ID)
+
 # Heartbeat config
 HEARTBEAT_INTERVAL = 300  # 5 minuta
 last_heartbeat_ts: float = 0.0
@@ -77,6 +96,7 @@ def send_signal_to_backend(
     sl: float,
     tp: float,
     extra_text: str = "",
+    candle_time=None,
 ):
     """
     DÃ«rgon sinjal te FastAPI (tabela signals).
@@ -94,37 +114,69 @@ def send_signal_to_backend(
         "status": "open",
         "extra_text": extra_text,
     }
+    trace = signal_trace.new_trace(candle_time)
+    payload.update(trace)
+    payload["bot_id"] = BOT_ID
+    payload["idempotency_key"] = signal_trace.idempotency_key(BOT_ID, trace)
+    payload["cooldown_minutes"] = MIN_MINUTES_BETWEEN_SIGNALS
 
-    try:
-        resp = requests.post(BACKEND_URL, json=payload, timeout=5)
-        if not resp.ok:
-            print(f"[BACKEND] âŒ Error {resp.status_code}: {resp.text}")
-        else:
-            data = resp.json()
-            print(
-                f"[BACKEND] âœ… Signal saved (id={data.get('id')}): "
-                f"{symbol} {direction} {timeframe} "
-                f"E={entry:.4f} SL={sl:.4f} TP={tp:.4f}"
-            )
-    except Exception as e:
-        print(f"[BACKEND] Exception sending signal: {e}")
+    print(f"[BACKEND] ⏳ Signal në radhë: {symbol} {direction} {timeframe}")
+    if SIGNAL_BATCH.add(payload):
+        flush_signals()
+
+
+@TIMING.timed("post.signal")
+def flush_signals():
+    """
+    Dërgon sinjalet e kalimit me një POST /signals/batch (një transaksion në
+    API, rezultat për çdo sinjal; të pa dërguarit riprovohen kalimin tjetër).
+    """
+    SIGNAL_BATCH.flush()
+
+
+def warm_dedup_state():
+    """
+    Mbush memorien e sinjaleve të fundit nga API-ja (një query) në startim,
+    që pas një restarti të mos ridërgohen sinjalet e orëve të fundit.
+    """
+    # API-ja i ruan simbolet pa "=X"
+    by_name = {s.replace("=X", ""): s for s in SYMBOLS}
+    for symbol, side, t in signal_trace.fetch_last_signals(ADMIN_API_BASE, SOURCE_NAME):
+        last_signal_time[(by_name.get(symbol, symbol), side)] = t
+
+
+def checkpoint_state() -> dict:
+    return {
+        "last_signal_time": last_signal_time,
+    }
+
+
+def restore_checkpoint():
+    """Rikthen gjendjen nga checkpoint-i (nëse është i freskët) para kalimit të parë."""
+    state = CHECKPOINT.load()
+    if state is None:
+        return
+    last_signal_time.update(state.get("last_signal_time", {}))
 
 
 # ======================================================
 #                 ADMIN MONITORING
 # ======================================================
 
+@TIMING.timed("post.heartbeat")
 def send_heartbeat():
     """
     DÃ«rgon njÃ« heartbeat te backend qÃ« admini tÃ« shohÃ« qÃ« boti Ã«shtÃ« gjallÃ«.
+    Bashkë me të dërgohet telemetria e kalimit të fundit (koha e skanimit,
+    simbolet, gabimet e fetch, cache hit rate, memoria).
     """
     try:
         payload = {
-            "bot_id": BOT_ID,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "name": BOT_ID,
+            "telemetry": TIMING.telemetry(),
         }
         resp = requests.post(
-            f"{ADMIN_API_BASE}/admin/bot_heartbeat",
+            f"{ADMIN_API_BASE}/api/heartbeat",
             json=payload,
             timeout=5,
         )
@@ -136,35 +188,11 @@ def send_heartbeat():
         print(f"[HEARTBEAT] ERROR: {e}")
 
 
-def notify_signal_sent(symbol: str, direction: str):
-    """
-    Njofton backend-in se ky bot ka dÃ«rguar sinjal.
-    PÃ«rdoret pÃ«r /admin/bot_signal dhe pÃ«r System status nÃ« app.
-    """
-    try:
-        payload = {
-            "bot_id": BOT_ID,
-            "symbol": symbol,
-            "direction": direction.upper(),
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-        }
-        resp = requests.post(
-            f"{ADMIN_API_BASE}/admin/bot_signal",
-            json=payload,
-            timeout=5,
-        )
-        if not resp.ok:
-            print(f"[BOT_SIGNAL_LOG] âŒ {resp.status_code}: {resp.text}")
-        else:
-            print(f"[BOT_SIGNAL_LOG] âœ… {symbol} {direction}")
-    except Exception as e:
-        print(f"[BOT_SIGNAL_LOG] ERROR: {e}")
-
-
 # ======================================================
 #                   DATA FETCHING
 # ======================================================
 
+@TIMING.timed("fetch.ohlc")
 def fetch_ohlc(symbol: str, interval: str = "5m", lookback_days: int = 3) -> pd.DataFrame:
     """
     Merr OHLC nga yfinance pÃ«r simbolin dhe intervalin e dhÃ«nÃ«.
@@ -199,10 +227,41 @@ def fetch_ohlc(symbol: str, interval: str = "5m", lookback_days: int = 3) -> pd.
         return pd.DataFrame()
 
 
+@TIMING.timed("fetch.batch")
+def fetch_ohlc_batch(symbols: List[str], interval: str = "5m", lookback_days: int = 3) -> Dict[str, pd.DataFrame]:
+    """
+    Merr OHLC për të gjithë simbolet me një kërkesë yfinance (multi-ticker,
+    threads). Vetëm simbolet që dështojnë riprovohen një nga një me fetch_ohlc.
+    Kur market_gateway është aktiv, të dhënat merren prej tij.
+    """
+    frames = market_gateway.client_ohlc(symbols, interval, lookback_days + 1)
+    if frames is not None:
+        TIMING.count("cache.hit", len(frames))
+        TIMING.count("fetch.error", len(symbols) - len(frames))
+        return frames
+
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=lookback_days + 1)
+
+    frames, failed = yf_batch.download_batch(symbols, interval, start, end)
+    TIMING.count("cache.miss", len(symbols))  # pa cache lokale: çdo simbol shkarkohet
+
+    if failed:
+        print(f"[BATCH] {interval}: {len(failed)} simbole dështuan, riprovim një nga një...")
+    for symbol in failed:
+        df = fetch_ohlc(symbol, interval=interval, lookback_days=lookback_days)
+        if not df.empty:
+            frames[symbol] = df
+    TIMING.count("fetch.error", len(symbols) - len(frames))
+
+    return frames
+
+
 # ======================================================
 #              SWINGS & TREND (HH, HL, LH, LL)
 # ======================================================
 
+@TIMING.timed("indicator.atr")
 def calculate_atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
     """
     Llogarit ATR (Average True Range).
@@ -221,6 +280,7 @@ def calculate_atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
     return atr
 
 
+@TIMING.timed("indicator.adx")
 def calculate_adx(df: pd.DataFrame, period: int = 14) -> float:
     """
     Llogarit ADX.
@@ -255,6 +315,7 @@ def calculate_adx(df: pd.DataFrame, period: int = 14) -> float:
     return float(adx.iloc[-1]) if len(adx) > 0 else 0.0
 
 
+@TIMING.timed("indicator.ema")
 def check_ema_alignment(df: pd.DataFrame) -> str:
     """
     Kontrollon alignment të EMA 8, 21, 50 për trend confirmation.
@@ -277,6 +338,7 @@ def check_ema_alignment(df: pd.DataFrame) -> str:
         return "neutral"
 
 
+@TIMING.timed("indicator.macd")
 def calculate_macd(df: pd.DataFrame, fast=12, slow=26, signal=9) -> tuple:
     """
     Llogarit MACD (Moving Average Convergence Divergence).
@@ -303,6 +365,7 @@ def calculate_macd(df: pd.DataFrame, fast=12, slow=26, signal=9) -> tuple:
     return float(macd_line.iloc[-1]), float(signal_line.iloc[-1]), float(histogram.iloc[-1]), bullish_cross, bearish_cross
 
 
+@TIMING.timed("indicator.stochastic")
 def calculate_stochastic(df: pd.DataFrame, period=14, smooth_k=3, smooth_d=3) -> tuple:
     """
     Llogarit Stochastic Oscillator (%K dhe %D).
@@ -335,6 +398,7 @@ def calculate_stochastic(df: pd.DataFrame, period=14, smooth_k=3, smooth_d=3) ->
     return float(k_smooth.iloc[-1]), float(d.iloc[-1]), oversold_cross_up, overbought_cross_down
 
 
+@TIMING.timed("factor.sr_levels")
 def find_support_resistance_levels(df: pd.DataFrame, lookback: int = 100, num_levels: int = 3) -> tuple:
     """
     Gjen nivelet kryesore tÃ« S/R.
@@ -385,6 +449,7 @@ def is_near_sr_level(price: float, levels: list, tolerance: float = 0.008) -> bo
     return False
 
 
+@TIMING.timed("factor.divergence")
 def detect_rsi_divergence(df: pd.DataFrame, rsi_period: int = 14, lookback: int = 20) -> tuple:
     """
     Detekton RSI divergence.
@@ -441,6 +506,7 @@ def find_swings(df: pd.DataFrame, lookback: int = 3):
     return np.array(swing_high_idx), np.array(swing_low_idx)
 
 
+@TIMING.timed("factor.trend")
 def classify_trend(df: pd.DataFrame) -> Tuple[str, Optional[int], Optional[int], Optional[int], Optional[int]]:
     """
     Kthen:
@@ -477,6 +543,7 @@ def classify_trend(df: pd.DataFrame) -> Tuple[str, Optional[int], Optional[int],
     return "choppy", h1_idx, h2_idx, l1_idx, l2_idx
 
 
+@TIMING.timed("indicator.ema20")
 def compute_ema(series: pd.Series, period: int = 20) -> pd.Series:
     return series.ewm(span=period, adjust=False).mean()
 
@@ -485,10 +552,13 @@ def compute_ema(series: pd.Series, period: int = 20) -> pd.Series:
 #                    SIGNAL LOGIC
 # ======================================================
 
-def analyze_symbol(symbol: str):
+@TIMING.timed("analyze")
+def analyze_symbol(symbol: str, df: Optional[pd.DataFrame] = None):
     global last_signal_time
 
-    df = fetch_ohlc(symbol, interval=INTERVAL, lookback_days=LOOKBACK_DAYS)
+    # df vjen nga fetch_ohlc_batch; nëse mungon, merre veç për simbolin
+    if df is None:
+        df = fetch_ohlc(symbol, interval=INTERVAL, lookback_days=LOOKBACK_DAYS)
     if df.empty or len(df) < 60:
         # print(f"[{symbol}] Not enough data for scalping.")
         return
@@ -693,7 +763,7 @@ def analyze_symbol(symbol: str):
         f"Score={score_used:.1f}/9, RR={risk_reward_ratio:.2f}, ADX={adx_value:.1f}"
     )
 
-    # 1) DÃ«rgo sinjalin te tabela kryesore
+    # DÃ«rgo sinjalin te tabela kryesore
     send_signal_to_backend(
         symbol=symbol,
         direction=side,
@@ -702,11 +772,9 @@ def analyze_symbol(symbol: str):
         sl=sl,
         tp=tp,
         extra_text=extra_text,
+        candle_time=df.index[-1],
     )
 
-    # 2) Njofto admin backend-in
-    notify_signal_sent(symbol, side)
-
 
 # ======================================================
 #                    MAIN LOOP
@@ -720,12 +788,17 @@ def main_loop():
     print(f"Analysis type: {ANALYSIS_TYPE}")
     print(f"Symbols: {len(SYMBOLS)} (Forex)")
     print(f"Timeframe: {INTERVAL}, scan every {SLEEP_SECONDS} seconds.\n")
+    bot_timing.start_status_server(TIMING)
+    restore_checkpoint()
+    CHECKPOINT.install(checkpoint_state)
+    warm_dedup_state()
 
     # Heartbeat fillestar
     send_heartbeat()
     last_heartbeat_ts = time.time()
 
     while True:
+        CHECKPOINT.begin_pass()
         now_ts = time.time()
 
         # Heartbeat periodik
@@ -733,12 +806,29 @@ def main_loop():
             send_heartbeat()
             last_heartbeat_ts = now_ts
 
+        scan_start = time.time()
+        frames = fetch_ohlc_batch(SYMBOLS, interval=INTERVAL, lookback_days=LOOKBACK_DAYS)
+        fetch_seconds = time.time() - scan_start
+        if CAPTURE is not None:
+            CAPTURE.record("ohlc_batch", (INTERVAL,), frames)
+
         for symbol in SYMBOLS:
             try:
-                analyze_symbol(symbol)
+                analyze_symbol(symbol, df=frames.get(symbol, pd.DataFrame()))
             except Exception:
                 print(f"[{symbol}] Exception in analyze_symbol:")
                 traceback.print_exc()
+
+        print(
+            f"[SCAN] Pass në {time.time() - scan_start:.1f}s "
+            f"(fetch {fetch_seconds:.1f}s, {INTERVAL} {len(frames)}/{len(SYMBOLS)})"
+        )
+        flush_signals()
+        TIMING.end_pass(len(SYMBOLS))
+        # telemetria e kalimit sapo mbyllet
+        send_heartbeat()
+        last_heartbeat_ts = time.time()
+        CHECKPOINT.after_pass()
         print(f"Sleeping {SLEEP_SECONDS} seconds...\n")
         time.sleep(SLEEP_SECONDS)
 
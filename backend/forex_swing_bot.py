@@ -1,6 +1,6 @@
 ﻿import time
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Tuple, Dict
+from typing import Optional, Tuple, Dict, List
 
 import pandas as pd
 import numpy as np
@@ -10,6 +10,15 @@ import traceback
 from zoneinfo import ZoneInfo
 import warnings
 
+import bot_checkpoint
+import bot_timing
+import capture
+import market_gateway
+import ohlcv_store
+import signal_trace
+import yf_batch
+from bar_aggregator import BarAggregator
+
 # Fik vetÃ«m FutureWarning nga yfinance
 warnings.filterwarnings("ignore", category=FutureWarning, module="yfinance")
 
@@ -68,6 +77,21 @@ last_signal_side: Dict[str, str] = {}
 last_signal_time: Dict[str, datetime] = {}
 MIN_MINUTES_BETWEEN_SIGNALS = 240  # minimum 4 orÃ« mes sinjaleve tÃ« njÃ«jta
 
+# Agregatorët 1H -> 4H për simbol (gjendja mbahet mes skanimeve)
+H4_AGGREGATORS: Dict[str, BarAggregator] = {}
+
+# Regjistrimi i qirinjve të analizuar (MARKET_CAPTURE_DIR), për capture.py replay
+CAPTURE = capture.writer_for(BOT_ID)
+
+# Kohët e fazave për kalim skanimi (BOT_STATUS_PORT hap /status lokal)
+TIMING = bot_timing.PhaseTimer(BOT_ID)
+
+# Sinjalet e kalimit, dërgohen bashkë me POST /signals/batch në fund të kalimit
+SIGNAL_BATCH = signal_trace.SignalBatch(f"{ADMIN_API_BASE}/signals/batch")
+
+# Gjendja në memorie ruhet periodikisht dhe në SIGTERM, rikthehet në startim
+CHECKPOINT = bot_checkpoint.Checkpoint(BOT_ID)
+
 # Heartbeat config
 HEARTBEAT_INTERVAL = 300  # 5 minuta
 last_heartbeat_ts: float = 0.0
@@ -77,6 +101,7 @@ last_heartbeat_ts: float = 0.0
 #                  TELEGRAM HELPERS
 # ======================================================
 
+@TIMING.timed("post.telegram")
 def send_telegram_message(text: str):
     """DÃ«rgon mesazh nÃ« tÃ« gjithÃ« CHAT_ID-t."""
     if not TELEGRAM_BOT_TOKEN:
@@ -103,17 +128,20 @@ def send_telegram_message(text: str):
 #              ADMIN / MONITORING HELPERS
 # ======================================================
 
+@TIMING.timed("post.heartbeat")
 def send_heartbeat():
     """
     DÃ«rgon njÃ« heartbeat te backend qÃ« admini tÃ« shohÃ« qÃ« boti Ã«shtÃ« gjallÃ«.
+    Bashkë me të dërgohet telemetria e kalimit të fundit (koha e skanimit,
+    simbolet, gabimet e fetch, cache hit rate, memoria).
     """
     try:
         payload = {
-            "bot_id": BOT_ID,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "name": BOT_ID,
+            "telemetry": TIMING.telemetry(),
         }
         resp = requests.post(
-            f"{ADMIN_API_BASE}/admin/bot_heartbeat",
+            f"{ADMIN_API_BASE}/api/heartbeat",
             json=payload,
             timeout=5,
         )
@@ -125,31 +153,6 @@ def send_heartbeat():
         print(f"[HEARTBEAT] ERROR: {e}")
 
 
-def notify_signal_sent(symbol: str, direction: str):
-    """
-    Njofton backend-in se ky bot ka dÃ«rguar sinjal
-    (pÃ«r statistika & system status te admini).
-    """
-    try:
-        payload = {
-            "bot_id": BOT_ID,
-            "symbol": symbol.replace("=X", "") if symbol.endswith("=X") else symbol,
-            "direction": direction.upper(),
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-        }
-        resp = requests.post(
-            f"{ADMIN_API_BASE}/admin/bot_signal",
-            json=payload,
-            timeout=5,
-        )
-        if not resp.ok:
-            print(f"[BOT_SIGNAL_LOG] âŒ {resp.status_code}: {resp.text}")
-        else:
-            print(f"[BOT_SIGNAL_LOG] âœ… {symbol} {direction}")
-    except Exception as e:
-        print(f"[BOT_SIGNAL_LOG] ERROR: {e}")
-
-
 # ======================================================
 #              BACKEND: SEND SIGNAL
 # ======================================================
@@ -162,6 +165,7 @@ def send_signal_to_backend(
     sl: float,
     tp: float,
     extra_text: str = "",
+    candle_time=None,
 ):
     """
     DÃ«rgon sinjal te FastAPI...
@@ -179,34 +183,76 @@ def send_signal_to_backend(
         "status": "open",
         "extra_text": extra_text,
     }
+    trace = signal_trace.new_trace(candle_time)
+    payload.update(trace)
+    payload["bot_id"] = BOT_ID
+    payload["idempotency_key"] = signal_trace.idempotency_key(BOT_ID, trace)
+    payload["cooldown_minutes"] = MIN_MINUTES_BETWEEN_SIGNALS
 
-    try:
-        resp = requests.post(BACKEND_URL, json=payload, timeout=5)
-        if not resp.ok:
-            print(f"[BACKEND] âŒ Error {resp.status_code}: {resp.text}")
-        else:
-            data = resp.json()
-            print(
-                f"[BACKEND] âœ… Signal saved (id={data.get('id')}): "
-                f"{symbol} {direction} {timeframe} "
-                f"E={entry:.4f} SL={sl:.4f} TP={tp:.4f}"
-            )
-    except Exception as e:
-        print(f"[BACKEND] Exception sending signal: {e}")
+    print(f"[BACKEND] ⏳ Signal në radhë: {symbol} {direction} {timeframe}")
+    if SIGNAL_BATCH.add(payload):
+        flush_signals()
+
+
+@TIMING.timed("post.signal")
+def flush_signals():
+    """
+    Dërgon sinjalet e kalimit me një POST /signals/batch (një transaksion në
+    API, rezultat për çdo sinjal; të pa dërguarit riprovohen kalimin tjetër).
+    """
+    SIGNAL_BATCH.flush()
+
+
+def warm_dedup_state():
+    """
+    Mbush memorien e sinjaleve të fundit nga API-ja (një query) në startim,
+    që pas një restarti të mos ridërgohen sinjalet e orëve të fundit.
+    """
+    # API-ja i ruan simbolet pa "=X"
+    by_name = {s.replace("=X", ""): s for s in SYMBOLS}
+    for symbol, side, t in signal_trace.fetch_last_signals(ADMIN_API_BASE, SOURCE_NAME):
+        symbol = by_name.get(symbol, symbol)
+        last_signal_time[symbol] = t  # rreshtat janë sipas kohës: mbetet i fundit
+        last_signal_side[symbol] = side
+
+
+def checkpoint_state() -> dict:
+    return {
+        "h4_aggregators": H4_AGGREGATORS,
+        "last_signal_side": last_signal_side,
+        "last_signal_time": last_signal_time,
+    }
+
+
+def restore_checkpoint():
+    """Rikthen gjendjen nga checkpoint-i (nëse është i freskët) para kalimit të parë."""
+    state = CHECKPOINT.load()
+    if state is None:
+        return
+    H4_AGGREGATORS.update(state.get("h4_aggregators", {}))
+    last_signal_side.update(state.get("last_signal_side", {}))
+    last_signal_time.update(state.get("last_signal_time", {}))
 
 
 # ======================================================
 #                   DATA FETCHING
 # ======================================================
 
+@TIMING.timed("fetch.ohlc")
 def fetch_ohlc(symbol: str, interval: str = "1h", lookback_days: int = 120) -> pd.DataFrame:
     """
     Merr OHLC nga yfinance pÃ«r simbolin dhe intervalin e dhÃ«nÃ«.
+    Historia lexohet nga ohlcv_store (disk) dhe shkarkohet vetëm pjesa pas
+    qirit të fundit të ruajtur; qirinjtë e mbyllur shtohen në disk.
     """
     try:
         end = datetime.now(timezone.utc)
         start = end - timedelta(days=lookback_days + 5)
 
+        stored = ohlcv_store.load_frame(symbol, interval, start=start)
+        if not stored.empty:
+            start = stored.index[-1].to_pydatetime()
+
         df = yf.download(
             symbol,
             start=start,
@@ -218,7 +264,10 @@ def fetch_ohlc(symbol: str, interval: str = "1h", lookback_days: int = 120) -> p
         )
         if df is None or df.empty:
             # print(f"[{symbol}] No data for interval={interval}")
-            return pd.DataFrame()
+            return stored
+
+        if isinstance(df.columns, pd.MultiIndex):
+            df.columns = df.columns.get_level_values(0)
 
         # Hiq rreshtat me NaN dhe rregullo kolonat
         df = df[["Open", "High", "Low", "Close", "Volume"]].dropna()
@@ -226,8 +275,7 @@ def fetch_ohlc(symbol: str, interval: str = "1h", lookback_days: int = 120) -> p
         if not isinstance(df.index, pd.DatetimeIndex):
             df.index = pd.to_datetime(df.index)
 
-        df = df.sort_index()
-        return df
+        return ohlcv_store.merge_with_store(symbol, interval, df, stored)
 
     except Exception as e:
         # Nuk printoj traceback për timeout, vetëm error message
@@ -238,31 +286,76 @@ def fetch_ohlc(symbol: str, interval: str = "1h", lookback_days: int = 120) -> p
         return pd.DataFrame()
 
 
-def resample_to_4h(h1: pd.DataFrame) -> pd.DataFrame:
+@TIMING.timed("fetch.batch")
+def fetch_ohlc_batch(symbols: List[str], interval: str, lookback_days: int) -> Dict[str, pd.DataFrame]:
+    """
+    Merr OHLC për të gjithë simbolet e një intervali me një kërkesë yfinance
+    (multi-ticker, threads). Vetëm simbolet që dështojnë riprovohen një nga
+    një me fetch_ohlc.
+    Kur market_gateway është aktiv, të dhënat merren prej tij.
+    """
+    frames = market_gateway.client_ohlc(symbols, interval, lookback_days + 5)
+    if frames is not None:
+        TIMING.count("cache.hit", len(frames))
+        TIMING.count("fetch.error", len(symbols) - len(frames))
+        return frames
+
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=lookback_days + 5)
+
+    stored = {s: ohlcv_store.load_frame(s, interval, start=start) for s in symbols}
+    # nëse të gjithë kanë histori në disk, shkarko vetëm nga qiri më i vjetër "i fundit"
+    lasts = [df.index[-1] for df in stored.values() if not df.empty]
+    TIMING.count("cache.hit", len(lasts))
+    TIMING.count("cache.miss", len(symbols) - len(lasts))
+    batch_start = min(lasts).to_pydatetime() if len(lasts) == len(symbols) else start
+
+    fresh, failed = yf_batch.download_batch(symbols, interval, batch_start, end, timeout=60)
+
+    frames: Dict[str, pd.DataFrame] = {}
+    for symbol, df in fresh.items():
+        try:
+            frames[symbol] = ohlcv_store.merge_with_store(symbol, interval, df, stored[symbol])
+        except Exception as e:
+            print(f"[{symbol}] Exception in merge_with_store(interval={interval}): {e}")
+            failed.append(symbol)
+
+    if failed:
+        print(f"[BATCH] {interval}: {len(failed)} simbole dështuan, riprovim një nga një...")
+    for symbol in failed:
+        df = fetch_ohlc(symbol, interval=interval, lookback_days=lookback_days)
+        if not df.empty:
+            frames[symbol] = df
+    TIMING.count("fetch.error", len(symbols) - len(frames))
+
+    return frames
+
+
+@TIMING.timed("indicator.resample_4h")
+def resample_to_4h(h1: pd.DataFrame, symbol: Optional[str] = None) -> pd.DataFrame:
     """
     Nga 1H -> 4H OHLC.
+    Me `symbol`, bar-et 4H mbahen në H4_AGGREGATORS dhe çdo skanim palos
+    vetëm qirinjtë e rinj 1H. Bar-i i fundit mund të jetë i pjesshëm (si më
+    parë me resample); H4_AGGREGATORS[symbol].partial() e tregon.
     """
     if h1.empty:
         return pd.DataFrame()
 
-    df = h1.copy()
-    df = df[~df.index.duplicated(keep="last")]
-
-    df_4h = pd.DataFrame()
-    df_4h["Open"] = df["Open"].resample("4h").first()
-    df_4h["High"] = df["High"].resample("4h").max()
-    df_4h["Low"] = df["Low"].resample("4h").min()
-    df_4h["Close"] = df["Close"].resample("4h").last()
-    df_4h["Volume"] = df["Volume"].resample("4h").sum()
+    if symbol is None:
+        return BarAggregator("4h").sync(h1)
 
-    df_4h = df_4h.dropna()
-    return df_4h
+    agg = H4_AGGREGATORS.get(symbol)
+    if agg is None:
+        agg = H4_AGGREGATORS[symbol] = BarAggregator("4h")
+    return agg.sync(h1)
 
 
 # ======================================================
 #                D1 TREND DETECTION
 # ======================================================
 
+@TIMING.timed("indicator.atr")
 def calculate_atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
     """
     Llogarit ATR (Average True Range).
@@ -281,6 +374,7 @@ def calculate_atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
     return atr
 
 
+@TIMING.timed("indicator.adx")
 def calculate_adx(df: pd.DataFrame, period: int = 14) -> float:
     """
     Llogarit ADX (Average Directional Index).
@@ -315,6 +409,7 @@ def calculate_adx(df: pd.DataFrame, period: int = 14) -> float:
     return float(adx.iloc[-1]) if len(adx) > 0 else 0.0
 
 
+@TIMING.timed("indicator.ema")
 def check_ema_alignment(df: pd.DataFrame) -> str:
     """
     Kontrollon alignment të EMA 8, 21, 50 për trend confirmation.
@@ -337,6 +432,7 @@ def check_ema_alignment(df: pd.DataFrame) -> str:
         return "neutral"
 
 
+@TIMING.timed("indicator.macd")
 def calculate_macd(df: pd.DataFrame, fast=12, slow=26, signal=9) -> tuple:
     """
     Llogarit MACD (Moving Average Convergence Divergence).
@@ -366,6 +462,7 @@ def calculate_macd(df: pd.DataFrame, fast=12, slow=26, signal=9) -> tuple:
     return float(macd_line.iloc[-1]), float(signal_line.iloc[-1]), float(histogram.iloc[-1]), bullish_cross, bearish_cross
 
 
+@TIMING.timed("indicator.stochastic")
 def calculate_stochastic(df: pd.DataFrame, period=14, smooth_k=3, smooth_d=3) -> tuple:
     """
     Llogarit Stochastic Oscillator (%K dhe %D).
@@ -402,6 +499,7 @@ def calculate_stochastic(df: pd.DataFrame, period=14, smooth_k=3, smooth_d=3) ->
     return float(k_smooth.iloc[-1]), float(d.iloc[-1]), oversold_cross_up, overbought_cross_down
 
 
+@TIMING.timed("factor.volume")
 def check_volume_confirmation(df: pd.DataFrame, lookback: int = 20) -> tuple:
     """
     Kontrollon nÃ«se volume aktual Ã«shtÃ« mÃ« i lartÃ« se mesatarja.
@@ -422,6 +520,7 @@ def check_volume_confirmation(df: pd.DataFrame, lookback: int = 20) -> tuple:
     return is_high, float(volume_ratio)
 
 
+@TIMING.timed("factor.sr_levels")
 def find_support_resistance_levels(df: pd.DataFrame, lookback: int = 100, num_levels: int = 5) -> tuple:
     """
     Gjen nivelet kryesore tÃ« support dhe resistance.
@@ -472,6 +571,7 @@ def is_near_sr_level(price: float, levels: list, tolerance: float = 0.01) -> boo
     return False
 
 
+@TIMING.timed("factor.divergence")
 def detect_rsi_divergence(df: pd.DataFrame, rsi_period: int = 14, lookback: int = 30) -> tuple:
     """
     Detekton bullish dhe bearish divergence nÃ« RSI.
@@ -506,6 +606,7 @@ def detect_rsi_divergence(df: pd.DataFrame, rsi_period: int = 14, lookback: int
     return bullish_div, bearish_div
 
 
+@TIMING.timed("factor.trend_d1")
 def detect_trend_d1(d1: pd.DataFrame) -> str:
     """
     Trend D1 nÃ« bazÃ« tÃ« EMA50 dhe EMA200.
@@ -557,6 +658,7 @@ def _find_swings(df: pd.DataFrame, lookback: int = 3) -> Tuple[np.ndarray, np.nd
     return np.array(swing_high_idx), np.array(swing_low_idx)
 
 
+@TIMING.timed("factor.structure")
 def classify_structure(h4: pd.DataFrame) -> str:
     """
     Klasifikon strukturÃ«n 4H si "bull", "bear", ose "choppy".
@@ -594,6 +696,7 @@ def classify_structure(h4: pd.DataFrame) -> str:
 #           ORDER BLOCK (shumÃ« i thjeshtuar)
 # ======================================================
 
+@TIMING.timed("factor.order_block")
 def find_recent_order_block(df: pd.DataFrame, direction: str, lookback: int = 40) -> Optional[Tuple[float, float, float]]:
     """
     Gjen njÃ« order block tÃ« fundit me strength scoring.
@@ -679,6 +782,7 @@ def find_recent_order_block(df: pd.DataFrame, direction: str, lookback: int = 40
 #                    FVG (3 candles)
 # ======================================================
 
+@TIMING.timed("factor.fvg")
 def has_recent_fvg(df: pd.DataFrame, direction: str, lookback: int = 20) -> bool:
     """
     FVG i thjeshtuar (3 candles).
@@ -704,22 +808,30 @@ def has_recent_fvg(df: pd.DataFrame, direction: str, lookback: int = 20) -> bool
 #                    SIGNAL LOGIC
 # ======================================================
 
-def analyze_symbol(symbol: str):
+@TIMING.timed("analyze")
+def analyze_symbol(
+    symbol: str,
+    d1: Optional[pd.DataFrame] = None,
+    h1: Optional[pd.DataFrame] = None,
+):
     global last_signal_side, last_signal_time
 
-    d1 = fetch_ohlc(symbol, interval="1d", lookback_days=LOOKBACK_DAYS_D1)
+    # d1/h1 vijnë nga fetch_ohlc_batch; nëse mungojnë, merri veç për simbolin
+    if d1 is None:
+        d1 = fetch_ohlc(symbol, interval="1d", lookback_days=LOOKBACK_DAYS_D1)
     if d1.empty:
         # print(f"[{symbol}] No D1 data.")
         return
 
     trend_d1 = detect_trend_d1(d1)
 
-    h1 = fetch_ohlc(symbol, interval="1h", lookback_days=LOOKBACK_DAYS_4H)
+    if h1 is None:
+        h1 = fetch_ohlc(symbol, interval="1h", lookback_days=LOOKBACK_DAYS_4H)
     if h1.empty:
         # print(f"[{symbol}] No H1 data.")
         return
 
-    h4 = resample_to_4h(h1)
+    h4 = resample_to_4h(h1, symbol)
     if h4.empty or len(h4) < 30:
         # print(f"[{symbol}] Not enough 4H data.")
         return
@@ -976,11 +1088,9 @@ def analyze_symbol(symbol: str):
         sl=sl,
         tp=tp,
         extra_text=extra,
+        candle_time=h4.index[-1],
     )
 
-    # Log te admin
-    notify_signal_sent(symbol, signal_side)
-
     # Telegram
     send_telegram_message(msg)
 
@@ -1005,12 +1115,17 @@ def main_loop():
     print("âœ… Forex Swing scanner started.")
     print(f"Symbols: {SYMBOLS}")
     print(f"Scan every {SLEEP_SECONDS} seconds.\n")
+    bot_timing.start_status_server(TIMING)
+    restore_checkpoint()
+    CHECKPOINT.install(checkpoint_state)
+    warm_dedup_state()
 
     # Heartbeat fillestar
     send_heartbeat()
     last_heartbeat_ts = time.time()
 
     while True:
+        CHECKPOINT.begin_pass()
         now_ts = time.time()
 
         # Heartbeat periodik
@@ -1018,12 +1133,36 @@ def main_loop():
             send_heartbeat()
             last_heartbeat_ts = now_ts
 
+        scan_start = time.time()
+        d1_frames = fetch_ohlc_batch(SYMBOLS, "1d", LOOKBACK_DAYS_D1)
+        h1_frames = fetch_ohlc_batch(SYMBOLS, "1h", LOOKBACK_DAYS_4H)
+        fetch_seconds = time.time() - scan_start
+        if CAPTURE is not None:
+            CAPTURE.record("ohlc_batch", ("1d",), d1_frames)
+            CAPTURE.record("ohlc_batch", ("1h",), h1_frames)
+
         for symbol in SYMBOLS:
             try:
-                analyze_symbol(symbol)
+                analyze_symbol(
+                    symbol,
+                    d1=d1_frames.get(symbol, pd.DataFrame()),
+                    h1=h1_frames.get(symbol, pd.DataFrame()),
+                )
             except Exception:
                 print(f"[{symbol}] Exception in analyze_symbol:")
                 traceback.print_exc()
+
+        print(
+            f"[SCAN] Pass në {time.time() - scan_start:.1f}s "
+            f"(fetch {fetch_seconds:.1f}s, D1 {len(d1_frames)}/{len(SYMBOLS)}, "
+            f"1H {len(h1_frames)}/{len(SYMBOLS)})"
+        )
+        flush_signals()
+        TIMING.end_pass(len(SYMBOLS))
+        # telemetria e kalimit sapo mbyllet
+        send_heartbeat()
+        last_heartbeat_ts = time.time()
+        CHECKPOINT.after_pass()
         print(f"Sleeping {SLEEP_SECONDS} seconds...\n")
         time.sleep(SLEEP_SECONDS)
 
@@ -0,0 +1,186 @@
+"""
+Heartbeat-et e botave në memorie të përbashkët mes worker-ave të uvicorn.
+
+POST /api/heartbeat shkruan vetëm në një tabelë me slot-e fikse në një file
+të mmap-uar (/dev/shm/signals_heartbeats), pa SELECT/UPDATE/commit në
+SQLite. Një thread në çdo worker merr çdo FLUSH_SECONDS slot-et e ndryshuara
+(vetëm një worker i merr, nën lock) dhe i shkruan në `bot_status` me një
+transaksion të vetëm. /api/admin/bots lexohet direkt nga memoria.
+
+Layout (little-endian):
+    header (64 B): magic, slots, used
+    slot   (96 B): name (64 B utf-8), last_heartbeat f8, last_signal f8 (NaN = s'ka), dirty u1
+
+Çdo lexim/shkrim bëhet nën fcntl.flock të file-it (seksione shumë të
+shkurtra); kur file-i humbet (restart i VPS) mbushet sërish nga bot_status.
+"""
+import math
+import mmap
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl  # vetëm Linux/macOS; në Windows mjafton lock-u i procesit
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+HEARTBEAT_PATH = os.getenv("HEARTBEAT_STORE_PATH", os.path.join(_SHM_DIR, "signals_heartbeats"))
+MAX_BOTS = 256
+FLUSH_SECONDS = 5
+
+MAGIC = 0x48425453  # "HBTS"
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype([("magic", "<u4"), ("slots", "<u4"), ("used", "<u4")])
+SLOT_DTYPE = np.dtype(
+    [("name", "S64"), ("last_heartbeat", "<f8"), ("last_signal", "<f8"), ("dirty", "u1")],
+    align=False,
+)
+SLOT_SIZE = 96
+
+# (emri, last_heartbeat ts, last_signal ts ose None)
+Beat = Tuple[str, float, Optional[float]]
+
+
+class HeartbeatStore:
+    """Tabela e heartbeat-eve në file-in e përbashkët; një instancë për worker."""
+
+    def __init__(self, path: str = HEARTBEAT_PATH, slots: int = MAX_BOTS):
+        self.path = path
+        self.local = threading.Lock()
+        size = HEADER_SIZE + slots * SLOT_SIZE
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            if os.fstat(self.fd).st_size < size:
+                os.ftruncate(self.fd, size)
+            self.mm = mmap.mmap(self.fd, size)
+            self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.mm)
+            if self.header["magic"] != MAGIC:
+                self.header["slots"] = slots
+                self.header["used"] = 0
+                self.header["magic"] = MAGIC
+        self.slots = int(self.header["slots"])
+        self.table = np.ndarray(
+            (self.slots,), dtype=SLOT_DTYPE, buffer=self.mm, offset=HEADER_SIZE,
+            strides=(SLOT_SIZE,),
+        )
+
+    @contextmanager
+    def _locked(self):
+        """Lock i procesit (thread-et) + flock i file-it (worker-at e tjerë)."""
+        with self.local:
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def _find(self, key: bytes) -> int:
+        used = int(self.header["used"])
+        hits = np.flatnonzero(self.table["name"][:used] == key)
+        return int(hits[0]) if hits.size else -1
+
+    # ------------------------------------------------------------------
+
+    def beat(self, name: str, ts: Optional[float] = None, last_signal: Optional[float] = None) -> Optional[Beat]:
+        """
+        Regjistron një heartbeat. Kthen gjendjen e re të botit, ose None kur
+        tabela është plot (thirrësi shkruan direkt në DB).
+        """
+        key = name.encode()[:64]
+        ts = time.time() if ts is None else ts
+        with self._locked():
+            i = self._find(key)
+            if i < 0:
+                used = int(self.header["used"])
+                if used >= self.slots:
+                    return None
+                i = used
+                self.table[i] = (key, ts, math.nan, 1)
+                self.header["used"] = used + 1
+            row = self.table[i]
+            row["last_heartbeat"] = ts
+            if last_signal is not None:
+                row["last_signal"] = last_signal
+            row["dirty"] = 1
+            return name, float(row["last_heartbeat"]), _opt(row["last_signal"])
+
+    def all(self) -> List[Beat]:
+        with self._locked():
+            rows = self.table[: int(self.header["used"])].copy()
+        beats = [(r["name"].decode(errors="replace"), float(r["last_heartbeat"]), _opt(r["last_signal"])) for r in rows]
+        return sorted(beats)
+
+    def seed(self, beats: List[Beat]):
+        """Mbush tabelën bosh (p.sh. pas restartit të VPS) nga bot_status, pa i shënuar dirty."""
+        with self._locked():
+            if int(self.header["used"]):
+                return
+            for i, (name, hb, sig) in enumerate(beats[: self.slots]):
+                self.table[i] = (name.encode()[:64], hb, math.nan if sig is None else sig, 0)
+            self.header["used"] = min(len(beats), self.slots)
+
+    def take_dirty(self) -> List[Beat]:
+        """Kthen slot-et e ndryshuara dhe ua heq shenjën (vetëm një worker i merr)."""
+        with self._locked():
+            used = int(self.header["used"])
+            idx = np.flatnonzero(self.table["dirty"][:used])
+            rows = self.table[idx].copy()
+            self.table["dirty"][idx] = 0
+        return [(r["name"].decode(errors="replace"), float(r["last_heartbeat"]), _opt(r["last_signal"])) for r in rows]
+
+    def mark_dirty(self, names: List[str]):
+        """Rikthen shenjën kur flush-i në DB dështoi."""
+        with self._locked():
+            used = int(self.header["used"])
+            for name in names:
+                hits = np.flatnonzero(self.table["name"][:used] == name.encode()[:64])
+                self.table["dirty"][hits] = 1
+
+
+def _opt(value) -> Optional[float]:
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+class Flusher:
+    """Thread daemon që çdo FLUSH_SECONDS i kalon heartbeat-et e ndryshuara te `write`."""
+
+    def __init__(self, store: HeartbeatStore, write: Callable[[List[Beat]], None], interval: float = FLUSH_SECONDS):
+        self.store = store
+        self.write = write
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def flush(self) -> int:
+        # `write` thirret edhe pa heartbeat-e: mund të ketë të dhëna të veta për flush
+        beats = self.store.take_dirty()
+        try:
+            self.write(beats)
+        except Exception as e:
+            self.store.mark_dirty([b[0] for b in beats])
+            print(f"[HEARTBEAT] Flush në DB dështoi ({len(beats)} heartbeat): {e}")
+            return 0
+        return len(beats)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.flush()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="heartbeat-flush", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.flush()
@@ -1,15 +1,19 @@
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
+import threading
 import os
 import smtplib
+import time
+import uuid
 from email.message import EmailMessage
 from zoneinfo import ZoneInfo
 
 import firebase_admin
 from firebase_admin import credentials, messaging, auth
-from fastapi import FastAPI, Depends, HTTPException, Query, UploadFile, File
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, ConfigDict
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, ConfigDict, Field
 from sqlalchemy import (
     Column,
     Integer,
@@ -17,12 +21,27 @@ from sqlalchemy import (
     Float,
     DateTime,
     Boolean,
+    Index,
+    UniqueConstraint,
+    and_,
+    bindparam,
+    case,
     create_engine,
     func,
+    insert,
+    not_,
+    or_,
+    select,
     text,
+    update,
 )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 
+import api_metrics
+import heartbeat_store
+
 # ======================================================
 #                   DATABASE SETUP
 # ======================================================
@@ -33,12 +52,15 @@ engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+api_metrics.instrument_engine(engine)
 
 Base = declarative_base()
 
 
 class Signal(Base):
     __tablename__ = "signals"
+    # cooldown-i në insert: sinjali i fundit për (source, symbol, direction) pas një kohe
+    __table_args__ = (Index("ix_signals_cooldown", "source", "symbol", "direction", "time"),)
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -59,9 +81,52 @@ class Signal(Base):
     pnl_percent = Column(Float, nullable=True)
 
     extra_text = Column(String, nullable=True)
+    sl_tp_hit_time = Column(DateTime(timezone=True), nullable=True)
+
+    # çelësi nga boti (POST /signals/ingest): riprovimet nuk krijojnë rresht të dytë
+    idempotency_key = Column(String, unique=True, index=True, nullable=True)
+
+
+class SignalTrace(Base):
+    """
+    Kohët e një sinjali nga qiri te push-i (epoch në sekonda), për
+    GET /admin/latency. trace_id krijohet nga boti (signal_trace.py).
+    """
+
+    __tablename__ = "signal_traces"
+
+    id = Column(Integer, primary_key=True, index=True)
+    signal_id = Column(Integer, index=True, nullable=False)
+    trace_id = Column(String, unique=True, index=True, nullable=False)
+    analysis_type = Column(String, index=True, nullable=False)
+
+    candle_ts = Column(Float, nullable=True)       # open time i qiriut më të ri të analizuar
+    decided_ts = Column(Float, nullable=True)      # boti vendosi sinjalin
+    received_ts = Column(Float, nullable=False)    # create_signal e mori
+    committed_ts = Column(Float, nullable=True)    # sinjali u ruajt në DB
+    push_done_ts = Column(Float, nullable=True)    # push te të gjithë device-t përfundoi
+    delivered_ts = Column(Float, nullable=True)    # device i parë konfirmoi marrjen
 
+    push_ok = Column(Integer, default=0)
+    push_failed = Column(Integer, default=0)
 
 
+class PushOutbox(Base):
+    """
+    Push-et e pritura për sinjalet nga /signals/ingest. Rreshti krijohet në
+    të njëjtin transaksion me sinjalin; dispatch_pending_pushes merr të gjithë
+    rreshtat e dritares (claimed_ts, batch_id) dhe i shënon të dërguar (sent_ts).
+    """
+
+    __tablename__ = "push_outbox"
+
+    id = Column(Integer, primary_key=True)
+    signal_id = Column(Integer, unique=True, nullable=False)
+    created_ts = Column(Float, nullable=False)
+    claimed_ts = Column(Float, nullable=True, index=True)
+    sent_ts = Column(Float, nullable=True)
+    batch_id = Column(String, nullable=True, index=True)  # digest-i ku u dërgua
+
 
 class Device(Base):
     """
@@ -79,22 +144,77 @@ class Device(Base):
     last_seen = Column(DateTime(timezone=True), server_default=func.now())
 
     enabled = Column(Boolean, default=True, index=True)
+    # abonuar nga serveri te topic-et e sinjaleve (sync_device_topics)
+    topics_synced = Column(Boolean, default=False, index=True)
+
+    # me preferenca (device_preferences): jashtë topic-eve, push-i i dërgohet
+    # direkt kur sinjali përputhet (target_devices)
+    targeted = Column(Boolean, default=False, index=True)
+    # orët e qeta në minuta UTC nga mesnata; start > end = kalon mesnatën
+    quiet_start = Column(Integer, nullable=True)
+    quiet_end = Column(Integer, nullable=True)
+
+
+ANY_SYMBOL = "*"
+
+
+class DevicePreference(Base):
+    """
+    Preferencat e njoftimeve të një device: një rresht për (analysis_type,
+    symbol), symbol "*" = të gjitha simbolet. Indeksi unik (analysis_type,
+    symbol, device_id) i mbulon target_devices për çdo sinjal.
+    """
+
+    __tablename__ = "device_preferences"
+    __table_args__ = (
+        UniqueConstraint("analysis_type", "symbol", "device_id", name="ux_device_prefs_target"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    device_id = Column(Integer, index=True, nullable=False)
+    analysis_type = Column(String, nullable=False)
+    symbol = Column(String, nullable=False, default=ANY_SYMBOL)
 
 
 class BotStatus(Base):
     """
     Status i botëve/skriptave (heartbeat).
-        status = Column(String, default="open", index=True)  # open / closed
-        hit = Column(String, nullable=True)  # "tp", "sl", "manual", "be", etj.
-        pnl_percent = Column(Float, nullable=True)
-        extra_text = Column(String, nullable=True)
-        sl_tp_hit_time = Column(DateTime(timezone=True), nullable=True)
+    """
+
+    __tablename__ = "bot_status"
+
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True, nullable=False)
     last_heartbeat = Column(DateTime(timezone=True), nullable=False)
     last_signal_time = Column(DateTime(timezone=True), nullable=True)
 
 
+# Sa kalime mbahen për bot në bot_telemetry (slot = pass_no % RING_SIZE)
+TELEMETRY_RING_SIZE = 288
+
+
+class BotTelemetry(Base):
+    """
+    Telemetria e kalimeve të skanimit për çdo bot (vjen me heartbeat-in).
+    Tabelë unazore: çdo bot ka maksimumi TELEMETRY_RING_SIZE rreshta, kalimi
+    i ri mbishkruan slot-in e vet.
+    """
+
+    __tablename__ = "bot_telemetry"
+    __table_args__ = (UniqueConstraint("name", "slot"),)
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    slot = Column(Integer, nullable=False)
+    ts = Column(Float, nullable=False)  # epoch kur erdhi heartbeat-i
+    pass_no = Column(Integer, nullable=False)
+    scan_seconds = Column(Float, nullable=True)
+    symbols = Column(Integer, nullable=True)
+    fetch_errors = Column(Integer, nullable=True)
+    cache_hit_rate = Column(Float, nullable=True)
+    rss_mb = Column(Float, nullable=True)
+
+
 class PremiumUser(Base):
     """
     Premium users – email addresses që kanë qasje premium.
@@ -113,6 +233,40 @@ class PremiumUser(Base):
 # Krijo tabelat nëse nuk ekzistojnë
 Base.metadata.create_all(bind=engine)
 
+
+def ensure_column(table: str, column: str, ddl: str):
+    """
+    create_all nuk shton kolona te tabelat ekzistuese – për një signals.db
+    të vjetër shtojmë kolonën e re me ALTER TABLE.
+    """
+    with engine.begin() as conn:
+        names = [row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))]
+        if column not in names:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def ensure_index(name: str, table: str, columns: str, unique: bool = False):
+    """Indekset e reja për një signals.db të vjetër (create_all nuk i shton te tabelat ekzistuese)."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+        ))
+
+
+ensure_column("signals", "sl_tp_hit_time", "DATETIME")
+ensure_column("signals", "idempotency_key", "VARCHAR")
+ensure_index("ix_signals_idempotency_key", "signals", "idempotency_key", unique=True)
+ensure_index("ix_signals_cooldown", "signals", "source, symbol, direction, time")
+ensure_column("push_outbox", "batch_id", "VARCHAR")
+ensure_index("ix_push_outbox_claimed_ts", "push_outbox", "claimed_ts")
+ensure_index("ix_push_outbox_batch_id", "push_outbox", "batch_id")
+ensure_column("devices", "topics_synced", "BOOLEAN DEFAULT 0")
+ensure_index("ix_devices_topics_synced", "devices", "topics_synced")
+ensure_column("devices", "targeted", "BOOLEAN DEFAULT 0")
+ensure_column("devices", "quiet_start", "INTEGER")
+ensure_column("devices", "quiet_end", "INTEGER")
+ensure_index("ix_devices_targeted", "devices", "targeted")
+
 # ======================================================
 #                FIREBASE ADMIN (SERVER SIDE)
 # ======================================================
@@ -215,6 +369,35 @@ class SignalCreate(BaseModel):
     extra_text: Optional[str] = None
     hit: Optional[str] = None
     pnl_percent: Optional[float] = None
+    # trace nga boti (signal_trace.new_trace), opsionale
+    trace_id: Optional[str] = None
+    candle_ts: Optional[float] = None
+    decided_ts: Optional[float] = None
+
+
+class SignalIngest(SignalCreate):
+    bot_id: str
+    idempotency_key: str
+    # cooldown-i i botit (MIN_MINUTES_BETWEEN_SIGNALS); mund vetëm ta zgjasë atë të serverit
+    cooldown_minutes: Optional[float] = None
+
+
+# Maksimumi i rreshtave në një kërkesë batch (kufiri i parametrave të SQLite te IN)
+MAX_BATCH = 500
+
+
+class SignalBatchIn(BaseModel):
+    signals: List[SignalIngest] = Field(..., max_length=MAX_BATCH)
+
+
+class SignalCloseItem(BaseModel):
+    signal_id: int
+    hit: Optional[str] = None
+    pnl_percent: Optional[float] = None
+
+
+class SignalCloseBatchIn(BaseModel):
+    items: List[SignalCloseItem] = Field(..., max_length=MAX_BATCH)
 
 
 class SignalResponse(SignalBase):
@@ -229,6 +412,24 @@ class DeviceRegisterIn(BaseModel):
     app_version: Optional[str] = None
 
 
+class DevicePreferencesIn(BaseModel):
+    token: str
+    analysis_types: Optional[List[str]] = None  # None = të gjitha
+    symbols: Optional[List[str]] = None  # None ose bosh = të gjitha
+    quiet_start: Optional[str] = None  # "HH:MM" në orën lokale të device-it
+    quiet_end: Optional[str] = None
+    utc_offset_minutes: int = 0  # ora lokale - UTC, p.sh. 60 për CET
+
+
+class DevicePreferencesOut(BaseModel):
+    token: str
+    targeted: bool
+    analysis_types: List[str]
+    symbols: Optional[List[str]]
+    quiet_start_utc: Optional[str]
+    quiet_end_utc: Optional[str]
+
+
 class DeviceResponse(BaseModel):
     id: int
     token: str
@@ -269,9 +470,19 @@ class BotStatusResponse(BaseModel):
     total_signals_last_24h: int
 
 
+class TelemetryIn(BaseModel):
+    pass_no: int
+    scan_seconds: Optional[float] = None
+    symbols: Optional[int] = None
+    fetch_errors: Optional[int] = None
+    cache_hit_rate: Optional[float] = None
+    rss_mb: Optional[float] = None
+
+
 class HeartbeatIn(BaseModel):
     name: str
     last_signal_time: Optional[datetime] = None
+    telemetry: Optional[TelemetryIn] = None
 
 
 class BotStatusOut(BaseModel):
@@ -312,6 +523,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(api_metrics.MetricsMiddleware)
 
 
 # Dependency për DB në çdo request
@@ -323,86 +535,568 @@ def get_db():
         db.close()
 
 
+# ======================================================
+#        HEARTBEAT-ET (MEMORIE E PËRBASHKËT + FLUSH)
+# ======================================================
+
+# Heartbeat-et mbahen në heartbeat_store (i përbashkët mes worker-ave) dhe
+# shkruhen në bot_status me një transaksion çdo FLUSH_SECONDS.
+BOT_ONLINE_SECONDS = 300  # 5 minuta
+
+
+def _to_ts(dt: Optional[datetime]) -> Optional[float]:
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)  # kohët naive në DB janë UTC
+    return dt.timestamp()
+
+
+def _from_ts(ts: Optional[float]) -> Optional[datetime]:
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+
+# telemetria e pritur për flush në këtë worker: (bot, slot) -> rresht
+_pending_telemetry: Dict[Tuple[str, int], dict] = {}
+_telemetry_lock = threading.Lock()
+
+
+def queue_telemetry(name: str, telemetry: TelemetryIn, ts: float):
+    slot = telemetry.pass_no % TELEMETRY_RING_SIZE
+    row = {"name": name, "slot": slot, "ts": ts, **telemetry.model_dump()}
+    with _telemetry_lock:
+        _pending_telemetry[(name, slot)] = row
+
+
+def write_telemetry(conn, rows: List[dict]):
+    stmt = sqlite_insert(BotTelemetry.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name", "slot"],
+        set_={c: stmt.excluded[c] for c in ("ts", "pass_no", "scan_seconds", "symbols", "fetch_errors", "cache_hit_rate", "rss_mb")},
+    )
+    conn.execute(stmt, rows)
+
+
+def write_heartbeats(beats: List[heartbeat_store.Beat]):
+    """
+    Upsert i heartbeat-eve të ndryshuara dhe i telemetrisë së pritur të këtij
+    worker-i në një transaksion.
+    """
+    with _telemetry_lock:
+        telemetry = list(_pending_telemetry.values())
+        _pending_telemetry.clear()
+    try:
+        with engine.begin() as conn:
+            if beats:
+                write_bot_status(conn, beats)
+            if telemetry:
+                write_telemetry(conn, telemetry)
+    except Exception:
+        with _telemetry_lock:
+            for row in telemetry:
+                _pending_telemetry.setdefault((row["name"], row["slot"]), row)
+        raise
+
+
+def write_bot_status(conn, beats: List[heartbeat_store.Beat]):
+    rows = [
+        {"name": name, "last_heartbeat": _from_ts(hb), "last_signal_time": _from_ts(sig)}
+        for name, hb, sig in beats
+    ]
+    stmt = sqlite_insert(BotStatus.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={
+            "last_heartbeat": stmt.excluded.last_heartbeat,
+            "last_signal_time": func.coalesce(stmt.excluded.last_signal_time, BotStatus.__table__.c.last_signal_time),
+        },
+    )
+    conn.execute(stmt, rows)
+
+
+HEARTBEATS = heartbeat_store.HeartbeatStore()
+_heartbeat_flusher = heartbeat_store.Flusher(HEARTBEATS, write_heartbeats)
+
+
+def start_heartbeat_flusher():
+    # pas restartit të VPS file-i në /dev/shm është bosh -> mbushet nga DB
+    with SessionLocal() as db:
+        HEARTBEATS.seed([
+            (b.name, _to_ts(b.last_heartbeat), _to_ts(b.last_signal_time))
+            for b in db.query(BotStatus).all()
+        ])
+    _heartbeat_flusher.start()
+
+
+app.add_event_handler("startup", start_heartbeat_flusher)
+app.add_event_handler("shutdown", _heartbeat_flusher.stop)
+
+
+def bot_status_out(name: str, hb: float, sig: Optional[float], now: float) -> BotStatusOut:
+    return BotStatusOut(
+        name=name,
+        last_heartbeat=_from_ts(hb),
+        last_signal_time=_from_ts(sig),
+        is_online=now - hb < BOT_ONLINE_SECONDS,
+    )
+
+
 # ======================================================
 #           HELPER: SEND PUSH NOTIFICATION
 # ======================================================
 
+# Push-i i një sinjali shkon si një mesazh i vetëm te topic-u i analysis_type
+# (FCM e shpërndan te device-t e abonuar), jo si një messaging.send për çdo
+# device. `PUSH_VIA_TOPICS=0` kthen dërgimin për device.
+ANALYSIS_TYPES = ("crypto_swing", "crypto_scalping", "forex_swing", "forex_intraday")
+PUSH_VIA_TOPICS = os.getenv("PUSH_VIA_TOPICS", "1") != "0"
 
-def send_push_to_all_devices(
+
+def signal_topic(analysis_type: str) -> str:
+    return f"signals_{analysis_type}"
+
+
+def build_push_message(
+    title: str,
+    body: str,
+    data: Dict[str, str],
+    collapse_key: Optional[str] = None,
+    **target,
+) -> messaging.Message:
+    """
+    Mesazhi FCM me prioritet të lartë; target = token=..., topic=... ose
+    condition=... Me collapse_key, FCM mban vetëm mesazhin e fundit të
+    padorëzuar me të njëjtin çelës (device offline merr një njoftim).
+    """
+    apns_headers = {'apns-priority': '10'}
+    if collapse_key:
+        apns_headers['apns-collapse-id'] = collapse_key
+    return messaging.Message(
+        notification=messaging.Notification(
+            title=title,
+            body=body,
+        ),
+        data=data,
+        android=messaging.AndroidConfig(priority='high', collapse_key=collapse_key),
+        apns=messaging.APNSConfig(headers=apns_headers),
+        **target,
+    )
+
+
+def topics_condition(analysis_types: List[str]) -> Dict[str, str]:
+    """
+    Target-i FCM për device-t e abonuar te topic-et e këtyre analysis_type:
+    një topic, ose një condition "'a' in topics || 'b' in topics" (FCM e
+    dorëzon një herë për device, deri 5 topic).
+    """
+    topics = [signal_topic(t) for t in analysis_types]
+    if len(topics) == 1:
+        return {"topic": topics[0]}
+    return {"condition": " || ".join(f"'{t}' in topics" for t in topics)}
+
+
+def send_push_to_topic(
+    target: Dict[str, str],
     title: str,
     body: str,
     data: Optional[Dict[str, str]],
-    db: Session,
+    collapse_key: Optional[str] = None,
 ):
     """
-    Dërgon push notification te të gjithë device-t e regjistruar në tabelën devices.
+    Dërgon një push te një topic/condition FCM (një kërkesë, pavarësisht
+    numrit të device-ve). Kthen (të dërguara, të dështuara).
     """
-    if firebase_app is None:
-        print("[PUSH] Firebase Admin nuk është inicializuar, skip.")
-        return
+    str_data = {k: str(v) for k, v in (data or {}).items()}
+    where = target.get("topic") or target.get("condition")
+    try:
+        response = messaging.send(build_push_message(title, body, str_data, collapse_key, **target))
+        print(f"[PUSH] Dërguar te {where}, resp={response}")
+        return 1, 0
+    except Exception as e:
+        print(f"[PUSH] Error te {where}: {e}")
+        return 0, 1
 
-    devices = db.query(Device).filter(Device.enabled == True).all()
-    if not devices:
-        print("[PUSH] Nuk ka device të regjistruar (enabled=True), skip.")
-        return
 
-    data = data or {}
-    str_data = {k: str(v) for k, v in data.items()}
+def send_push_to_devices(
+    title: str,
+    body: str,
+    data: Optional[Dict[str, str]],
+    devices: list,
+    collapse_key: Optional[str] = None,
+):
+    """
+    Dërgon push te secili device i listës (rreshta me .id dhe .token).
+    Kthen (të dërguara, të dështuara).
+    """
+    str_data = {k: str(v) for k, v in (data or {}).items()}
 
     print(f"[PUSH] Përgatitje push për {len(devices)} device...")
 
+    ok = failed = 0
     for d in devices:
         token = d.token
         if not token:
             continue
 
         try:
-            message = messaging.Message(
-                notification=messaging.Notification(
-                    title=title,
-                    body=body,
-                ),
-                data=str_data,
-                token=token,
-                android=messaging.AndroidConfig(priority='high'),
-                apns=messaging.APNSConfig(headers={'apns-priority': '10'}),
-            )
-            response = messaging.send(message)
+            response = messaging.send(build_push_message(title, body, str_data, collapse_key, token=token))
+            ok += 1
             print(
                 f"[PUSH] Dërguar te device id={d.id}, "
                 f"token={token[:10]}..., resp={response}"
             )
         except Exception as e:
+            failed += 1
             print(f"[PUSH] Error te device id={d.id}: {e}")
 
+    return ok, failed
 
-def send_push_for_signal(db: Session, signal: Signal):
+
+def send_push_to_all_devices(
+    title: str,
+    body: str,
+    data: Optional[Dict[str, str]],
+    db: Session,
+):
     """
-    Ndërton titull/body për push nga një Signal dhe e dërgon te të gjithë device-t.
+    Dërgon push notification te të gjithë device-t e regjistruar në tabelën devices.
+    Kthen (të dërguara, të dështuara).
     """
-    title = f"{signal.symbol} {signal.direction} ({signal.timeframe})"
+    if firebase_app is None:
+        print("[PUSH] Firebase Admin nuk është inicializuar, skip.")
+        return 0, 0
+
+    devices = db.query(Device.id, Device.token).filter(Device.enabled == True).all()
+    if not devices:
+        print("[PUSH] Nuk ka device të regjistruar (enabled=True), skip.")
+        return 0, 0
 
-    body = (
-        f"Entry: {signal.entry:.5f} | "
-        f"TP: {signal.tp:.5f} | "
-        f"SL: {signal.sl:.5f}"
+    t0 = time.perf_counter()
+    ok, failed = send_push_to_devices(title, body, data, devices)
+    api_metrics.observe_push(time.perf_counter() - t0, ok, failed)
+    return ok, failed
+
+
+def in_quiet_hours(minute: int):
+    """Kushti SQL: minuta UTC `minute` bie brenda orëve të qeta të device-it."""
+    return case(
+        (
+            Device.quiet_start <= Device.quiet_end,
+            and_(Device.quiet_start <= minute, Device.quiet_end > minute),
+        ),
+        else_=or_(Device.quiet_start <= minute, Device.quiet_end > minute),
     )
 
+
+def target_devices(db: Session, signal: Signal, include_default: bool, now: Optional[datetime] = None):
+    """
+    Device-t që marrin push-in e sinjalit, me një SELECT të vetëm: ata me
+    preferenca që përputhen me (analysis_type, symbol) sipas
+    ux_device_prefs_target, jashtë orëve të qeta. include_default shton
+    device-t pa preferenca (kur push-i nuk shkon te topic-et).
+
+    Kur sinjali shkon edhe te topic-et (include_default=False), device-t me
+    topics_synced=False kapërcehen: një device që sapo kaloi te preferencat
+    është ende i abonuar te signals_<type> derisa topic-sync ta çabonojë, dhe
+    do të merrte dy herë të njëjtin sinjal (digest-i i topic-ut + i veti).
+    Në atë dritare (disa sekonda) merr vetëm digest-in e topic-ut.
+    """
+    now = now or datetime.now(timezone.utc)
+    minute = now.hour * 60 + now.minute
+    matching = select(DevicePreference.device_id).where(
+        DevicePreference.analysis_type == signal.analysis_type,
+        DevicePreference.symbol.in_((signal.symbol.upper(), ANY_SYMBOL)),
+    )
+    wanted = Device.id.in_(matching)
+    if include_default:
+        wanted = or_(Device.targeted == False, wanted)
+    else:
+        wanted = and_(wanted, Device.topics_synced == True)
+    return (
+        db.query(Device.id, Device.token)
+        .filter(
+            Device.enabled == True,
+            wanted,
+            or_(Device.quiet_start == None, not_(in_quiet_hours(minute))),
+        )
+        .all()
+    )
+
+
+# Sinjalet e ardhura brenda PUSH_COALESCE_SECONDS (p.sh. një kalim i botit me
+# disa sinjale) bashkohen në një njoftim (digest) për device, me të njëjtin
+# collapse key: FCM mban vetëm të fundit të padorëzuar.
+PUSH_COALESCE_SECONDS = float(os.getenv("PUSH_COALESCE_SECONDS", "3"))
+PUSH_COLLAPSE_KEY = "signals"
+DIGEST_LINES = 5
+
+
+def push_content(signals: List[Signal], traces: Dict[int, str]) -> Tuple[str, str, Dict[str, str]]:
+    """
+    Titulli, body dhe data e njoftimit për një ose disa sinjale. Data mban
+    fushat e sinjalit të fundit (app-i e hap atë); për digest shtohen
+    count, signal_ids dhe trace_ids (app-i i konfirmon të gjitha).
+    """
+    last = signals[-1]
+    if len(signals) == 1:
+        title = f"{last.symbol} {last.direction} ({last.timeframe})"
+        body = (
+            f"Entry: {last.entry:.5f} | "
+            f"TP: {last.tp:.5f} | "
+            f"SL: {last.sl:.5f}"
+        )
+    else:
+        title = f"{len(signals)} sinjale të reja"
+        lines = [f"{s.symbol} {s.direction} ({s.timeframe})" for s in signals[:DIGEST_LINES]]
+        if len(signals) > DIGEST_LINES:
+            lines.append(f"+{len(signals) - DIGEST_LINES} të tjera")
+        body = ", ".join(lines)
+
     data = {
-        "signal_id": str(signal.id),
-        "symbol": signal.symbol,
-        "direction": signal.direction,
-        "timeframe": signal.timeframe,
-        "analysis_type": signal.analysis_type or "",
-        "source": signal.source or "",
+        "signal_id": str(last.id),
+        "symbol": last.symbol,
+        "direction": last.direction,
+        "timeframe": last.timeframe,
+        "analysis_type": last.analysis_type or "",
+        "source": last.source or "",
     }
+    trace_ids = [traces[s.id] for s in signals if traces.get(s.id)]
+    if trace_ids:
+        data["trace_id"] = trace_ids[-1]
+    if len(signals) > 1:
+        data["count"] = str(len(signals))
+        data["signal_ids"] = ",".join(str(s.id) for s in signals)
+        if trace_ids:
+            data["trace_ids"] = ",".join(trace_ids)
+    return title, body, data
+
+
+def send_push_for_signals(db: Session, signals: List[Signal], traces: Dict[int, str]):
+    """
+    Dërgon sinjalet e një dritareje si një njoftim për device:
+      - device-t pa preferenca: një mesazh te topic-et (condition kur ka
+        disa analysis_type) me të gjitha sinjalet
+      - device-t me preferenca: target_devices për çdo sinjal (një SELECT),
+        pastaj një mesazh për device me sinjalet që i përputhen; device-t me
+        të njëjtat sinjale marrin të njëjtin digest
+    Me topic-et e çaktivizuara të gjithë device-t shkojnë nga rruga e dytë.
+    traces: signal_id -> trace_id. Kthen (të dërguara, të dështuara).
+    """
+    if firebase_app is None:
+        print("[PUSH] Firebase Admin nuk është inicializuar, skip.")
+        return 0, 0
+
+    t0 = time.perf_counter()
+    ok = failed = 0
+
+    via_topic = [s for s in signals if PUSH_VIA_TOPICS and s.analysis_type in ANALYSIS_TYPES]
+    topic_ids = {s.id for s in via_topic}
+    if via_topic:
+        types = sorted({s.analysis_type for s in via_topic})
+        title, body, data = push_content(via_topic, traces)
+        ok, failed = send_push_to_topic(topics_condition(types), title, body, data, PUSH_COLLAPSE_KEY)
+
+    # device id -> (rreshti, sinjalet e tij sipas rendit)
+    wanted: Dict[int, Tuple[object, List[Signal]]] = {}
+    for s in signals:
+        for d in target_devices(db, s, include_default=s.id not in topic_ids):
+            wanted.setdefault(d.id, (d, []))[1].append(s)
+
+    groups: Dict[Tuple[int, ...], list] = {}
+    for d, matched in wanted.values():
+        groups.setdefault(tuple(s.id for s in matched), []).append(d)
+    by_id = {s.id: s for s in signals}
+    for ids, devices in groups.items():
+        title, body, data = push_content([by_id[i] for i in ids], traces)
+        sent, errors = send_push_to_devices(title, body, data, devices, PUSH_COLLAPSE_KEY)
+        ok, failed = ok + sent, failed + errors
+
+    api_metrics.observe_push(time.perf_counter() - t0, ok, failed)
+    return ok, failed
 
-    send_push_to_all_devices(
-        title=title,
-        body=body,
-        data=data,
-        db=db,
-    )
+
+def send_push_for_signal(db: Session, signal: Signal, trace_id: Optional[str] = None):
+    """
+    Push-i i një sinjali pa dritare (POST /signals).
+    trace_id shkon te data që app-i ta konfirmojë te /traces/{trace_id}/delivered.
+    """
+    return send_push_for_signals(db, [signal], {signal.id: trace_id} if trace_id else {})
+
+
+_push_wakeup = threading.Event()
+
+
+def schedule_push():
+    """Thirret pas commit-it të sinjaleve të reja: hap dritaren e push-it (nëse s'është hapur)."""
+    _push_wakeup.set()
+
+
+def dispatch_pending_pushes() -> int:
+    """
+    Merr të gjithë rreshtat e pa marrë të push_outbox me një UPDATE (batch_id)
+    – edhe ata të worker-ave të tjerë – dhe i dërgon si një digest. Kthen
+    numrin e sinjaleve. Rreshtat e marrë por pa sent_ts nuk riprovohen – më
+    mirë një push i humbur se një i dyfishtë.
+    """
+    batch_id = uuid.uuid4().hex
+    with SessionLocal() as db:
+        claimed = (
+            db.query(PushOutbox)
+            .filter(PushOutbox.claimed_ts == None)
+            .update({PushOutbox.claimed_ts: time.time(), PushOutbox.batch_id: batch_id}, synchronize_session=False)
+        )
+        db.commit()
+        if not claimed:
+            return 0
+
+        ids = select(PushOutbox.signal_id).where(PushOutbox.batch_id == batch_id)
+        signals = db.query(Signal).filter(Signal.id.in_(ids)).order_by(Signal.id).all()
+        traces = db.query(SignalTrace).filter(SignalTrace.signal_id.in_(ids)).all()
+        ok = failed = 0
+        try:
+            ok, failed = send_push_for_signals(db, signals, {t.signal_id: t.trace_id for t in traces})
+        except Exception as e:
+            print(f"[PUSH] Exception gjatë send_push_for_signals: {e}")
+
+        now = time.time()
+        db.query(PushOutbox).filter(PushOutbox.batch_id == batch_id).update(
+            {PushOutbox.sent_ts: now}, synchronize_session=False
+        )
+        for trace in traces:
+            trace.push_ok, trace.push_failed, trace.push_done_ts = ok, failed, now
+        db.commit()
+    if claimed > 1:
+        print(f"[PUSH] {claimed} sinjale u bashkuan në një digest ({ok} mesazhe FCM)")
+    return claimed
+
+
+def run_push_dispatcher():
+    """
+    Thread-i i push-eve të çdo worker-i. Në startim dërgon push-et e mbetura
+    (API u ndal para dërgimit); pastaj çdo schedule_push hap një dritare
+    PUSH_COALESCE_SECONDS dhe sinjalet e ardhura ndërkohë shkojnë bashkë.
+    """
+    while True:
+        try:
+            dispatch_pending_pushes()
+        except Exception as e:
+            print(f"[PUSH] Dërgimi nga push_outbox dështoi: {e}")
+        _push_wakeup.wait()
+        time.sleep(PUSH_COALESCE_SECONDS)
+        _push_wakeup.clear()
+
+
+app.add_event_handler(
+    "startup",
+    lambda: threading.Thread(target=run_push_dispatcher, name="push-outbox", daemon=True).start(),
+)
+
+
+# ======================================================
+#        TOPIC-ET: ABONIMI I DEVICE-VE NGA SERVERI
+# ======================================================
+
+# Device-t e reja (topics_synced=False) abonohen te topic-u i çdo
+# analysis_type me subscribe_to_topic, deri TOPIC_BATCH token për thirrje;
+# device-t me preferenca (targeted) çabonohen, se push-i u shkon direkt.
+# /register_device dhe /devices/preferences zgjojnë thread-in, i cili pret
+# TOPIC_SYNC_DELAY që ndryshimet e afërta të shkojnë në të njëjtin grup;
+# përndryshe kontrollon çdo TOPIC_SYNC_SECONDS (në startim abonon edhe
+# device-t ekzistuese). Dy worker-a mund të abonojnë të njëjtin token – FCM
+# e pranon pa efekt. Kur shtohet një analysis_type i ri:
+# UPDATE devices SET topics_synced = 0.
+TOPIC_BATCH = 1000  # kufiri i FCM për një thirrje subscribe_to_topic
+TOPIC_SYNC_SECONDS = 60
+TOPIC_SYNC_DELAY = 2
+# gabimet e abonimit që tregojnë token të pavlefshëm (device çaktivizohet)
+DEAD_TOKEN_REASONS = {"NOT_FOUND", "INVALID_ARGUMENT", "registration-token-not-registered", "invalid-argument"}
+
+_topic_sync_wakeup = threading.Event()
+
+
+def manage_topics(rows: list, manage) -> Tuple[set, set]:
+    """
+    Thërret `manage` (subscribe_to_topic / unsubscribe_from_topic) për çdo
+    topic me token-at e rreshtave. Kthen (id të pavlefshme, id për riprovim).
+    """
+    tokens = [r.token for r in rows]
+    dead, retry = set(), set()
+    for analysis_type in ANALYSIS_TYPES:
+        resp = manage(tokens, signal_topic(analysis_type))
+        for err in resp.errors:
+            if err.reason in DEAD_TOKEN_REASONS:
+                dead.add(rows[err.index].id)
+            else:
+                retry.add(rows[err.index].id)
+    return dead, retry
+
+
+def sync_device_topics() -> int:
+    """Abonon/çabonon device-t e pa sinkronizuara në grupe; kthen numrin e device-ve të sinkronizuara."""
+    if firebase_app is None:
+        return 0
+    synced = 0
+    while True:
+        with SessionLocal() as db:
+            rows = (
+                db.query(Device.id, Device.token, Device.targeted)
+                .filter(Device.enabled == True, Device.topics_synced == False)
+                .order_by(Device.id)
+                .limit(TOPIC_BATCH)
+                .all()
+            )
+            if not rows:
+                return synced
+
+            dead, retry, done = set(), set(), 0
+            for targeted, manage in ((False, messaging.subscribe_to_topic), (True, messaging.unsubscribe_from_topic)):
+                group = [r for r in rows if bool(r.targeted) == targeted]
+                if not group:
+                    continue
+                try:
+                    group_dead, group_retry = manage_topics(group, manage)
+                except Exception as e:
+                    print(f"[TOPIC] {manage.__name__} dështoi: {e}")
+                    return synced
+                dead |= group_dead
+                retry |= group_retry
+
+                # compare-and-set: nëse /devices/preferences ndryshoi `targeted`
+                # gjatë thirrjes FCM, rreshti mbetet i pasinkronizuar për ciklin tjetër
+                ok = [r.id for r in group if r.id not in group_dead and r.id not in group_retry]
+                if ok:
+                    done += db.query(Device).filter(
+                        Device.id.in_(ok), Device.targeted == targeted
+                    ).update({Device.topics_synced: True}, synchronize_session=False)
+            if dead:
+                db.query(Device).filter(Device.id.in_(dead)).update(
+                    {Device.enabled: False}, synchronize_session=False
+                )
+            db.commit()
+
+        synced += done
+        print(f"[TOPIC] {done} device u sinkronizuan, {len(dead)} token të pavlefshëm, {len(retry)} për riprovim")
+        if retry:
+            return synced  # riprovohen në ciklin tjetër
+
+
+def run_topic_sync():
+    while True:
+        try:
+            sync_device_topics()
+        except Exception as e:
+            print(f"[TOPIC] Abonimi i device-ve dështoi: {e}")
+        if _topic_sync_wakeup.wait(TOPIC_SYNC_SECONDS):
+            time.sleep(TOPIC_SYNC_DELAY)
+            _topic_sync_wakeup.clear()
+
+
+app.add_event_handler(
+    "startup",
+    lambda: threading.Thread(target=run_topic_sync, name="topic-sync", daemon=True).start(),
+)
 
 
 # ======================================================
@@ -443,6 +1137,27 @@ def health_check(db: Session = Depends(get_db)):
     )
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics(
+    request: Request,
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Metrika Prometheus (latenca për route, koha e DB, pritjet e SQLite,
+    push-et), të bashkuara nga të gjithë worker-at e uvicorn. Vetëm nga
+    localhost ose me API_METRICS_TOKEN (shih api_metrics.allowed).
+    """
+    if not api_metrics.allowed(request.client.host if request.client else None, authorization):
+        raise HTTPException(status_code=403, detail="Metrikat janë vetëm për localhost")
+    rows = db.query(Device.enabled, func.count(Device.id)).group_by(Device.enabled).all()
+    devices = [((("enabled", "true" if enabled else "false"),), count) for enabled, count in rows]
+    return PlainTextResponse(
+        api_metrics.render({"devices": devices}),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
 # ------------- EMAIL VERIFICATION VIA SMTP + FIREBASE -------------
 
 
@@ -548,7 +1263,7 @@ def list_signals(
     # Rendit sipas sl_tp_hit_time nëse ekziston, përndryshe sipas time
     from sqlalchemy import case
     q = db.query(Signal).order_by(
-        case([(Signal.sl_tp_hit_time != None, Signal.sl_tp_hit_time)], else_=Signal.time).desc()
+        case((Signal.sl_tp_hit_time != None, Signal.sl_tp_hit_time), else_=Signal.time).desc()
     )
 
     if source:
@@ -567,6 +1282,7 @@ def list_signals(
 
 @app.post("/signals", response_model=SignalResponse)
 def create_signal(signal_in: SignalCreate, db: Session = Depends(get_db)):
+    received_ts = time.time()
     signal = Signal(
         symbol=signal_in.symbol,
         direction=signal_in.direction,
@@ -586,18 +1302,309 @@ def create_signal(signal_in: SignalCreate, db: Session = Depends(get_db)):
     db.commit()
     db.refresh(signal)
 
+    trace = SignalTrace(
+        signal_id=signal.id,
+        trace_id=signal_in.trace_id or uuid.uuid4().hex,
+        analysis_type=signal.analysis_type,
+        candle_ts=signal_in.candle_ts,
+        decided_ts=signal_in.decided_ts,
+        received_ts=received_ts,
+        committed_ts=time.time(),
+    )
+
     # thirr push që sapo u krijua sinjali
     try:
-        send_push_for_signal(db, signal)
+        trace.push_ok, trace.push_failed = send_push_for_signal(db, signal, trace.trace_id)
     except Exception as e:
         print(f"[PUSH] Exception gjatë send_push_for_signal: {e}")
+    trace.push_done_ts = time.time()
+
+    try:
+        db.add(trace)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[TRACE] Trace nuk u ruajt për sinjalin {signal.id}: {e}")
 
     return signal
 
 
+# Cooldown-i minimal (minuta) mes dy sinjaleve me të njëjtin (source, symbol,
+# direction); vlerat = MIN_MINUTES_BETWEEN_SIGNALS e secilit bot
+SIGNAL_COOLDOWN_MINUTES = {
+    "crypto_swing_bot": 120,
+    "crypto_scalp_bot": 60,
+    "forex_swing_bot": 240,
+    "forex_scalper_bot": 30,
+}
+DEFAULT_SIGNAL_COOLDOWN_MINUTES = 60
+
+
+def _utc_naive(dt: datetime) -> datetime:
+    # signals.time ruhet pa offset (UTC) në SQLite
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def cooldown_for(item: SignalIngest) -> timedelta:
+    minutes = SIGNAL_COOLDOWN_MINUTES.get(item.source, DEFAULT_SIGNAL_COOLDOWN_MINUTES)
+    return timedelta(minutes=max(minutes, item.cooldown_minutes or 0))
+
+
+def recent_signal_id(db: Session, item: SignalIngest) -> Optional[int]:
+    """Sinjali brenda cooldown-it për (source, symbol, direction) – një kërkim në ix_signals_cooldown."""
+    row = (
+        db.query(Signal.id)
+        .filter(
+            Signal.source == item.source,
+            Signal.symbol == item.symbol,
+            Signal.direction == item.direction,
+            Signal.time > _utc_naive(item.time) - cooldown_for(item),
+        )
+        .order_by(Signal.time.desc())
+        .first()
+    )
+    return row[0] if row else None
+
+
+def ingest_signals(db: Session, items: List[SignalIngest]) -> Tuple[List[dict], List[int]]:
+    """
+    Ruan sinjalet e botave në një transaksion me executemany: sinjalet,
+    trace-t, push_outbox dhe aktivitetin e botave (bot_status). Çelësat që
+    ekzistojnë (riprovim) ose përsëriten në të njëjtën kërkesë kthehen si
+    "duplicate" pa rresht të ri; sinjalet brenda cooldown-it të një sinjali
+    të mëparshëm (edhe nga e njëjta kërkesë) si "cooldown" me id-në e tij.
+    Kthen (rezultatet sipas rendit, id-të e reja).
+    """
+    received_ts = time.time()
+    keys = [item.idempotency_key for item in items]
+    created: Dict[str, int] = {}
+    for attempt in range(2):
+        existing = dict(
+            db.query(Signal.idempotency_key, Signal.id).filter(Signal.idempotency_key.in_(keys)).all()
+        )
+        fresh: Dict[str, SignalIngest] = {}
+        # çelësi -> id e sinjalit bllokues, ose çelësi i sinjalit të pranuar në këtë kërkesë
+        blocked: Dict[str, object] = {}
+        accepted: Dict[Tuple[str, str, str], str] = {}
+        for item in items:
+            key = item.idempotency_key
+            if key in existing or key in fresh or key in blocked:
+                continue
+            triple = (item.source, item.symbol, item.direction)
+            first = accepted.get(triple)
+            if first is not None and abs(_utc_naive(item.time) - _utc_naive(fresh[first].time)) < cooldown_for(item):
+                blocked[key] = first
+                continue
+            blocking_id = recent_signal_id(db, item)
+            if blocking_id is not None:
+                blocked[key] = blocking_id
+                continue
+            fresh[key] = item
+            accepted[triple] = key
+        if not fresh:
+            break
+        try:
+            db.execute(insert(Signal), [
+                {
+                    "symbol": item.symbol,
+                    "direction": item.direction,
+                    "entry": item.entry,
+                    "tp": item.tp,
+                    "sl": item.sl,
+                    "time": item.time,
+                    "timeframe": item.timeframe,
+                    "source": item.source,
+                    "analysis_type": item.analysis_type,
+                    "status": item.status,
+                    "hit": item.hit,
+                    "pnl_percent": item.pnl_percent,
+                    "extra_text": item.extra_text,
+                    "idempotency_key": key,
+                }
+                for key, item in fresh.items()
+            ])
+            # id-të pa RETURNING (SQLite i vjetër në VPS): çelësi është unik
+            created = dict(
+                db.query(Signal.idempotency_key, Signal.id).filter(Signal.idempotency_key.in_(list(fresh))).all()
+            )
+            db.execute(insert(SignalTrace), [
+                {
+                    "signal_id": created[key],
+                    "trace_id": item.trace_id or uuid.uuid4().hex,
+                    "analysis_type": item.analysis_type,
+                    "candle_ts": item.candle_ts,
+                    "decided_ts": item.decided_ts,
+                    "received_ts": received_ts,
+                    "committed_ts": None,  # vuloset pas commit-it më poshtë
+                }
+                for key, item in fresh.items()
+            ])
+            db.execute(insert(PushOutbox), [
+                {"signal_id": created[key], "created_ts": received_ts} for key in fresh
+            ])
+            bots = sorted({item.bot_id for item in fresh.values()})
+            write_bot_status(db.connection(), [(bot_id, received_ts, received_ts) for bot_id in bots])
+            db.commit()
+            break
+        except IntegrityError:
+            # një riprovim paralel i ruajti të parët -> lexo sërish çelësat
+            db.rollback()
+            created = {}
+            if attempt:
+                raise
+
+    if created:
+        # committed_ts pas db.commit(): receive_to_commit mat edhe vetë transaksionin
+        db.query(SignalTrace).filter(SignalTrace.signal_id.in_(list(created.values()))).update(
+            {SignalTrace.committed_ts: time.time()}, synchronize_session=False
+        )
+        db.commit()
+        for bot_id in bots:
+            HEARTBEATS.beat(bot_id, received_ts, received_ts)
+
+    results = []
+    seen = set()
+    for item in items:
+        key = item.idempotency_key
+        if key in blocked:
+            by = blocked[key]
+            results.append({
+                "idempotency_key": key,
+                "id": created.get(by) if isinstance(by, str) else by,
+                "status": "cooldown",
+            })
+            continue
+        is_new = key in created and key not in seen
+        seen.add(key)
+        results.append({
+            "idempotency_key": key,
+            "id": created.get(key) or existing.get(key),
+            "status": "created" if is_new else "duplicate",
+        })
+    return results, list(created.values())
+
+
+@app.post("/signals/ingest", response_model=SignalResponse)
+def ingest_signal(
+    signal_in: SignalIngest,
+    db: Session = Depends(get_db),
+):
+    """
+    Një thirrje për sinjalin e një boti: në një transaksion ruhet sinjali,
+    trace-i, aktiviteti i botit (bot_status) dhe push-i në push_outbox.
+    Push-i dërgohet pas dritares së bashkimit (run_push_dispatcher). Me të
+    njëjtin idempotency_key (riprovim) kthehet sinjali ekzistues pa rresht
+    të ri e pa push të dytë. Brenda
+    cooldown-it të (source, symbol, direction) kthehet 409 me id-në e sinjalit
+    të mëparshëm.
+    """
+    results, new_ids = ingest_signals(db, [signal_in])
+    if results[0]["status"] == "cooldown":
+        raise HTTPException(status_code=409, detail={"status": "cooldown", "id": results[0]["id"]})
+    if new_ids:
+        schedule_push()
+    return db.get(Signal, results[0]["id"])
+
+
+@app.post("/signals/batch")
+def ingest_signals_batch(
+    batch: SignalBatchIn,
+    db: Session = Depends(get_db),
+):
+    """
+    Sinjalet e një kalimi të botit në një kërkesë dhe një transaksion
+    (si /signals/ingest për secilin). Kthen rezultatin për çdo sinjal sipas
+    rendit: {idempotency_key, id, status: created|duplicate|cooldown}.
+    """
+    if not batch.signals:
+        return {"results": []}
+    results, new_ids = ingest_signals(db, batch.signals)
+    if new_ids:
+        schedule_push()
+    return {"results": results}
+
+
+@app.post("/traces/{trace_id}/delivered")
+def trace_delivered(trace_id: str, db: Session = Depends(get_db)):
+    """
+    Thirret nga app-i kur merr push-in (trace_id vjen te data e njoftimit).
+    Ruhet vetëm konfirmimi i parë.
+    """
+    updated = (
+        db.query(SignalTrace)
+        .filter(SignalTrace.trace_id == trace_id, SignalTrace.delivered_ts == None)
+        .update({SignalTrace.delivered_ts: time.time()}, synchronize_session=False)
+    )
+    db.commit()
+    return {"ok": True, "first": bool(updated)}
+
+
 # ------------- CLOSE SIGNAL (TP/SL/BE) -------------
 
 
+@app.get("/signals/last_sent")
+def last_sent_signals(
+    source: str,
+    hours: float = Query(72, gt=0, le=24 * 30),
+    db: Session = Depends(get_db),
+):
+    """
+    Koha e sinjalit të fundit për çdo (symbol, direction) të një burimi, për
+    të mbushur memorien e deduplikimit të botit në startim (një query mbi
+    ix_signals_cooldown). Renditur sipas kohës, i fundit në fund.
+    """
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=hours)
+    last_time = func.max(Signal.time)
+    rows = (
+        db.query(Signal.symbol, Signal.direction, last_time)
+        .filter(Signal.source == source, Signal.time >= since)
+        .group_by(Signal.symbol, Signal.direction)
+        .order_by(last_time)
+        .all()
+    )
+    return {
+        "source": source,
+        "signals": [{"symbol": sym, "direction": d, "time": t} for sym, d, t in rows],
+    }
+
+
+@app.post("/signals/close_batch")
+def close_signals_batch(batch: SignalCloseBatchIn, db: Session = Depends(get_db)):
+    """
+    Mbyll shumë sinjale me një UPDATE (executemany) në një transaksion.
+    hit/pnl_percent që mungojnë e ruajnë vlerën ekzistuese, si te close_signal.
+    Kthen {signal_id, status: closed|not_found} për çdo rresht.
+    """
+    ids = [item.signal_id for item in batch.items]
+    found = {row[0] for row in db.query(Signal.id).filter(Signal.id.in_(ids)).all()} if ids else set()
+
+    table = Signal.__table__
+    rows = [
+        {"b_id": item.signal_id, "b_hit": item.hit, "b_pnl": item.pnl_percent}
+        for item in batch.items
+        if item.signal_id in found
+    ]
+    if rows:
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(
+                status="closed",
+                hit=func.coalesce(bindparam("b_hit"), table.c.hit),
+                pnl_percent=func.coalesce(bindparam("b_pnl"), table.c.pnl_percent),
+            )
+        )
+        db.execute(stmt, rows)
+        db.commit()
+
+    return {
+        "results": [
+            {"signal_id": item.signal_id, "status": "closed" if item.signal_id in found else "not_found"}
+            for item in batch.items
+        ]
+    }
+
+
 @app.post("/signals/{signal_id}/close", response_model=SignalResponse)
 def close_signal(
     signal_id: int,
@@ -640,6 +1647,8 @@ def register_device(device_in: DeviceRegisterIn, db: Session = Depends(get_db)):
     now = datetime.utcnow()
 
     if device:
+        if not device.enabled:
+            device.topics_synced = False  # token i çaktivizuar mund të jetë hequr nga topic-et
         device.platform = device_in.platform
         device.app_version = device_in.app_version
         device.last_seen = now
@@ -652,15 +1661,110 @@ def register_device(device_in: DeviceRegisterIn, db: Session = Depends(get_db)):
             created_at=now,
             last_seen=now,
             enabled=True,
+            topics_synced=False,
         )
         db.add(device)
 
     db.commit()
     db.refresh(device)
+    if not device.topics_synced:
+        _topic_sync_wakeup.set()
     print(f"[DEVICE] Registered token: {device.token[:16]}... (id={device.id})")
     return device
 
 
+# ------------- DEVICE PREFERENCES -------------
+
+
+def _parse_hhmm(value: str) -> int:
+    try:
+        hours, minutes = (int(part) for part in value.split(":"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Ora duhet HH:MM, jo '{value}'")
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise HTTPException(status_code=400, detail=f"Ora duhet HH:MM, jo '{value}'")
+    return hours * 60 + minutes
+
+
+def _fmt_minute(minute: Optional[int]) -> Optional[str]:
+    return None if minute is None else f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def _device_by_token(db: Session, token: str) -> Device:
+    device = db.query(Device).filter(Device.token == token.strip()).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return device
+
+
+def device_preferences_out(db: Session, device: Device) -> DevicePreferencesOut:
+    rows = db.query(DevicePreference).filter(DevicePreference.device_id == device.id).all()
+    symbols = sorted({r.symbol for r in rows})
+    return DevicePreferencesOut(
+        token=device.token,
+        targeted=bool(device.targeted),
+        analysis_types=sorted({r.analysis_type for r in rows}) if device.targeted else list(ANALYSIS_TYPES),
+        symbols=None if not device.targeted or ANY_SYMBOL in symbols else symbols,
+        quiet_start_utc=_fmt_minute(device.quiet_start),
+        quiet_end_utc=_fmt_minute(device.quiet_end),
+    )
+
+
+@app.get("/devices/preferences", response_model=DevicePreferencesOut)
+def get_device_preferences(token: str = Query(...), db: Session = Depends(get_db)):
+    return device_preferences_out(db, _device_by_token(db, token))
+
+
+@app.post("/devices/preferences", response_model=DevicePreferencesOut)
+def set_device_preferences(prefs: DevicePreferencesIn, db: Session = Depends(get_db)):
+    """
+    Ruan preferencat e njoftimeve të një device (zëvendëson të mëparshmet).
+    Pa asnjë preferencë device-i kthehet te topic-et (merr të gjitha push-et).
+    Orët e qeta ruhen në UTC; app-i i ridërgon kur ndryshon offset-i (DST).
+
+    Preferencat vlejnë plotësisht pasi topic-sync (çabonimi/abonimi, zakonisht
+    brenda TOPIC_SYNC_DELAY) të përfundojë; deri atëherë device-i merr
+    push-et e topic-ut si më parë, pa dublikata (shih target_devices).
+    """
+    device = _device_by_token(db, prefs.token)
+
+    types = list(ANALYSIS_TYPES) if prefs.analysis_types is None else sorted(set(prefs.analysis_types))
+    unknown = [t for t in types if t not in ANALYSIS_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"analysis_type i panjohur: {', '.join(unknown)}")
+    symbols = sorted({s.strip().upper() for s in prefs.symbols or [] if s.strip()}) or [ANY_SYMBOL]
+
+    if (prefs.quiet_start is None) != (prefs.quiet_end is None):
+        raise HTTPException(status_code=400, detail="quiet_start dhe quiet_end jepen bashkë")
+    quiet_start = quiet_end = None
+    if prefs.quiet_start is not None:
+        quiet_start = (_parse_hhmm(prefs.quiet_start) - prefs.utc_offset_minutes) % 1440
+        quiet_end = (_parse_hhmm(prefs.quiet_end) - prefs.utc_offset_minutes) % 1440
+
+    targeted = prefs.analysis_types is not None or symbols != [ANY_SYMBOL] or quiet_start is not None
+
+    db.query(DevicePreference).filter(DevicePreference.device_id == device.id).delete(synchronize_session=False)
+    if targeted:
+        db.execute(
+            insert(DevicePreference),
+            [{"device_id": device.id, "analysis_type": t, "symbol": s} for t in types for s in symbols],
+        )
+    if bool(device.targeted) != targeted:
+        device.targeted = targeted
+        device.topics_synced = False  # abonohet/çabonohet nga topic-et
+    device.quiet_start, device.quiet_end = quiet_start, quiet_end
+    db.commit()
+
+    if not device.topics_synced:
+        _topic_sync_wakeup.set()
+    quiet = f", orë të qeta {_fmt_minute(quiet_start)}-{_fmt_minute(quiet_end)} UTC" if quiet_start is not None else ""
+    print(
+        f"[DEVICE] Preferencat e id={device.id}: {len(types)} analysis_type, "
+        f"{'të gjitha simbolet' if symbols == [ANY_SYMBOL] else f'{len(symbols)} simbole'}{quiet}"
+    )
+    return device_preferences_out(db, device)
+
+
 # ------------- STATS -------------
 
 
@@ -834,6 +1938,69 @@ def admin_status(db: Session = Depends(get_db)):
     return result
 
 
+# ------------- LATENCA E SINJALEVE (TRACE) -------------
+
+# (emri, fillimi, fundi) – fazat e raportit nga kolonat e signal_traces
+LATENCY_STAGES = [
+    ("candle_to_decide", "candle_ts", "decided_ts"),
+    ("decide_to_receive", "decided_ts", "received_ts"),
+    ("receive_to_commit", "received_ts", "committed_ts"),
+    ("commit_to_push", "committed_ts", "push_done_ts"),
+    ("push_to_delivered", "push_done_ts", "delivered_ts"),
+    ("candle_to_push", "candle_ts", "push_done_ts"),
+]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """Percentili me interpolim linear (values të renditura)."""
+    pos = (len(values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+@app.get("/admin/latency")
+def latency_report(
+    hours: int = Query(24, ge=1, le=24 * 30),
+    db: Session = Depends(get_db),
+):
+    """
+    Shpërndarja e latencës (ms) për çdo fazë të sinjalit, sipas analysis_type,
+    për sinjalet e `hours` orëve të fundit.
+    """
+    since = time.time() - hours * 3600
+    rows = db.query(SignalTrace).filter(SignalTrace.received_ts >= since).all()
+
+    by_type: Dict[str, List[SignalTrace]] = {}
+    for r in rows:
+        by_type.setdefault(r.analysis_type or "unknown", []).append(r)
+
+    report = {}
+    for atype, traces in sorted(by_type.items()):
+        stages = {}
+        for name, start, end in LATENCY_STAGES:
+            values = sorted(
+                (getattr(t, end) - getattr(t, start)) * 1000
+                for t in traces
+                if getattr(t, start) is not None and getattr(t, end) is not None
+            )
+            if not values:
+                continue
+            stages[name] = {
+                "count": len(values),
+                "p50_ms": round(_percentile(values, 0.50), 1),
+                "p90_ms": round(_percentile(values, 0.90), 1),
+                "p99_ms": round(_percentile(values, 0.99), 1),
+                "max_ms": round(values[-1], 1),
+            }
+        report[atype] = {
+            "signals": len(traces),
+            "push_failed": sum(t.push_failed or 0 for t in traces),
+            "stages": stages,
+        }
+    return {"hours": hours, "analysis_types": report}
+
+
 # ------------- HEARTBEAT NGA SKRIPTAT (LIVE STATUS) -------------
 
 
@@ -843,59 +2010,89 @@ def heartbeat(payload: HeartbeatIn, db: Session = Depends(get_db)):
     Thirret nga skriptat (botet) për të dërguar heartbeat.
     name = emri i botit (p.sh. 'crypto_scalp_bot')
     last_signal_time = koha e sinjalit të fundit (opsionale).
-    """
-    now = datetime.utcnow()
 
-    bot = db.query(BotStatus).filter(BotStatus.name == payload.name).first()
-    if bot is None:
-        bot = BotStatus(
-            name=payload.name,
-            last_heartbeat=now,
-            last_signal_time=payload.last_signal_time,
-        )
-        db.add(bot)
-    else:
-        bot.last_heartbeat = now
-        if payload.last_signal_time is not None:
-            bot.last_signal_time = payload.last_signal_time
-
-    db.commit()
-    db.refresh(bot)
+    telemetry = statistikat e kalimit të fundit (opsionale, bot_timing.telemetry()).
 
-    is_online = (now - bot.last_heartbeat).total_seconds() < 300  # 5 minuta
-
-    return BotStatusOut(
-        name=bot.name,
-        last_heartbeat=bot.last_heartbeat,
-        last_signal_time=bot.last_signal_time,
-        is_online=is_online,
-    )
+    Shkruhet vetëm në memorie; bot_status dhe bot_telemetry përditësohen nga flusher-i.
+    """
+    now = time.time()
+    if payload.telemetry is not None:
+        queue_telemetry(payload.name, payload.telemetry, now)
+    state = HEARTBEATS.beat(payload.name, now, _to_ts(payload.last_signal_time))
+    if state is not None:
+        return bot_status_out(*state, now)
+
+    # tabela në memorie është plot -> shkruajmë direkt në DB si më parë
+    write_heartbeats([(payload.name, now, _to_ts(payload.last_signal_time))])
+    bot = db.query(BotStatus).filter(BotStatus.name == payload.name).first()
+    return bot_status_out(bot.name, now, _to_ts(bot.last_signal_time), now)
 
 
 @app.get("/api/admin/bots", response_model=List[BotStatusOut])
-def list_bots(db: Session = Depends(get_db)):
+def list_bots():
     """
-    Lista e botëve me status live:
+    Lista e botëve me status live (nga memoria, pa query në DB):
     - is_online (nëse ka heartbeat në 5 minutat e fundit)
     - last_heartbeat
     - last_signal_time (nëse dërgohet nga skripta).
     """
-    now = datetime.utcnow()
-    bots = db.query(BotStatus).order_by(BotStatus.name).all()
+    now = time.time()
+    return [bot_status_out(name, hb, sig, now) for name, hb, sig in HEARTBEATS.all()]
 
-    result: List[BotStatusOut] = []
-    for b in bots:
-        is_online = (now - b.last_heartbeat).total_seconds() < 300
-        result.append(
-            BotStatusOut(
-                name=b.name,
-                last_heartbeat=b.last_heartbeat,
-                last_signal_time=b.last_signal_time,
-                is_online=is_online,
-            )
-        )
 
-    return result
+# Sa kalime të fundit krahasohen me mesataren e historisë
+TELEMETRY_RECENT_PASSES = 12
+
+
+@app.get("/api/admin/bots/throughput")
+def bots_throughput(
+    hours: int = Query(24, ge=1, le=24 * 7),
+    db: Session = Depends(get_db),
+):
+    """
+    Historia e throughput-it (simbole/sekondë) për çdo bot nga bot_telemetry.
+    `slowdown` = throughput-i mesatar i TELEMETRY_RECENT_PASSES kalimeve të
+    fundit / ai i gjithë periudhës (< 1 => boti po ngadalësohet).
+    """
+    since = time.time() - hours * 3600
+    rows = (
+        db.query(BotTelemetry)
+        .filter(BotTelemetry.ts >= since)
+        .order_by(BotTelemetry.name, BotTelemetry.ts)
+        .all()
+    )
+
+    by_bot: Dict[str, List[BotTelemetry]] = {}
+    for r in rows:
+        by_bot.setdefault(r.name, []).append(r)
+
+    report = {}
+    for name, passes in by_bot.items():
+        history = []
+        for r in passes:
+            throughput = r.symbols / r.scan_seconds if r.symbols and r.scan_seconds else None
+            history.append({
+                "ts": r.ts,
+                "pass_no": r.pass_no,
+                "scan_seconds": r.scan_seconds,
+                "symbols": r.symbols,
+                "throughput": round(throughput, 3) if throughput is not None else None,
+                "fetch_errors": r.fetch_errors,
+                "cache_hit_rate": r.cache_hit_rate,
+                "rss_mb": r.rss_mb,
+            })
+        values = [h["throughput"] for h in history if h["throughput"] is not None]
+        recent = values[-TELEMETRY_RECENT_PASSES:]
+        overall = sum(values) / len(values) if values else None
+        recent_avg = sum(recent) / len(recent) if recent else None
+        report[name] = {
+            "passes": len(history),
+            "throughput_avg": round(overall, 3) if overall else None,
+            "throughput_recent": round(recent_avg, 3) if recent_avg else None,
+            "slowdown": round(recent_avg / overall, 3) if overall and recent_avg else None,
+            "history": history,
+        }
+    return {"hours": hours, "bots": report}
 
 
 @app.post("/upload_bot")
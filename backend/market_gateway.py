@@ -0,0 +1,508 @@
+"""
+Gateway lokal i të dhënave të tregut për të gjithë botat.
+
+Një proces i vetëm (systemd: market-gateway.service) zotëron shkarkimin,
+cache-in dhe rate limiting-un ndaj Binance dhe yfinance. Botat i kërkojnë
+qirinjtë me HTTP në 127.0.0.1, kështu çdo (simbol, interval) shkarkohet një
+herë edhe kur e përdorin disa strategji njëkohësisht (p.sh. crypto swing +
+crypto scalp për të njëjtin simbol 1h).
+
+  - /klines?symbol=BTCUSDT&interval=4h&limit=300   -> .npy me RECORD_DTYPE
+  - /ohlc?symbols=EURUSD=X,GBPUSD=X&interval=1h&lookback_days=60
+                                                   -> .npz, një varg për simbol
+  - /health                                        -> statistika JSON
+
+Me `reply=arena` te /klines, gateway vetëm rifreskon dhe përgjigjet 204:
+qirinjtë i lexon boti nga arena në memorie të përbashkët (candle_arena),
+pa mbajtur kopje të vetat.
+
+Kërkesat e njëkohshme për të njëjtin çelës presin një shkarkim të vetëm
+(single-flight). Nëse gateway nuk përgjigjet, funksionet `client_*`
+kthejnë None dhe boti shkarkon vetë si më parë.
+
+Përdorim:
+    python market_gateway.py
+"""
+import io
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+
+import candle_arena
+import ohlcv_store
+from candle_store import INTERVAL_MS, OHLCV_COLUMNS, CandleSeries, decode_klines
+from ohlcv_store import RECORD_DTYPE
+
+# ======================================================
+#                     CONFIG
+# ======================================================
+
+GATEWAY_HOST = "127.0.0.1"
+GATEWAY_PORT = int(os.getenv("MARKET_GATEWAY_PORT", "8765"))
+# bosh -> botat shkarkojnë vetë pa kaluar nga gateway
+GATEWAY_URL = os.getenv("MARKET_GATEWAY_URL", f"http://{GATEWAY_HOST}:{GATEWAY_PORT}")
+
+BINANCE_FAPI_BASE = "https://fapi.binance.com"
+
+# Brenda kësaj kohe kërkesat shërbehen nga cache pa shkuar në burim
+KLINES_TTL_SECONDS = 20
+OHLC_TTL_SECONDS = 60
+
+# Binance Futures lejon 2400 weight/min për IP; mbajmë rezervë
+BINANCE_WEIGHT_PER_MINUTE = 1800
+# Maksimumi i qirinjve për një kërkesë /fapi/v1/klines
+BINANCE_MAX_LIMIT = 1500
+
+# Pas një dështimi lidhjeje, klienti nuk provon gateway për kaq sekonda
+CLIENT_RETRY_SECONDS = 60
+
+
+# ======================================================
+#                  RATE LIMIT (token bucket)
+# ======================================================
+
+class RateLimiter:
+    """Token bucket: `acquire(weight)` pret derisa të ketë weight të lirë."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, weight: float = 1.0) -> float:
+        """Kthen sa sekonda u pri."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return waited
+                delay = (weight - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class Stats:
+    """Numëruesit e një cache-i; përditësohen nga thread-et e handler-it, ndaj nën lock."""
+
+    def __init__(self, **counters):
+        self.lock = threading.Lock()
+        self.values = dict(counters)
+
+    def add(self, name: str, value: float = 1):
+        with self.lock:
+            self.values[name] += value
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.values)
+
+
+def klines_weight(limit: int) -> int:
+    """Weight i /fapi/v1/klines sipas limit (dokumentacioni i Binance)."""
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def download_klines(
+    symbol: str,
+    interval: str,
+    limit: int,
+    timeout: int = 10,
+    before_request: Optional[Callable[[int], None]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Shkarkon `limit` qirinjtë e fundit nga /fapi/v1/klines si
+    (open_time, ohlcv (5, n)). Kur limit > 1500 (maksimumi i Binance) merr
+    faqe të njëpasnjëshme prapa me endTime. Gabimet HTTP -> RuntimeError.
+    """
+    chunks = []
+    end_time = None
+    remaining = int(limit)
+    while remaining > 0:
+        n = min(remaining, BINANCE_MAX_LIMIT)
+        params = {"symbol": symbol, "interval": interval, "limit": n}
+        if end_time is not None:
+            params["endTime"] = end_time
+        if before_request is not None:
+            before_request(n)
+        resp = requests.get(f"{BINANCE_FAPI_BASE}/fapi/v1/klines", params=params, timeout=timeout)
+        if not resp.ok:
+            raise RuntimeError(f"Klines error {resp.status_code}: {resp.text[:200]}")
+
+        open_time, ohlcv = decode_klines(resp.content)
+        if open_time.size == 0:
+            break
+        chunks.append((open_time, ohlcv))
+        remaining -= open_time.size
+        if open_time.size < n:
+            break  # s'ka histori më të vjetër
+        end_time = int(open_time[0]) - 1
+
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty((len(OHLCV_COLUMNS), 0))
+    chunks.reverse()
+    return (
+        np.concatenate([c[0] for c in chunks]),
+        np.concatenate([c[1] for c in chunks], axis=1),
+    )
+
+
+def series_to_records(series: CandleSeries, limit: int) -> np.ndarray:
+    """Kopje e `limit` qirinjve të fundit si varg RECORD_DTYPE."""
+    n = min(limit, len(series))
+    recs = np.empty(n, dtype=RECORD_DTYPE)
+    recs["open_time"] = series.open_time[-n:] if n else []
+    for name in OHLCV_COLUMNS:
+        recs[name] = series.column(name)[-n:] if n else []
+    return recs
+
+
+def frame_to_records(df: pd.DataFrame) -> np.ndarray:
+    open_time, ohlcv = ohlcv_store.frame_to_columns(df)
+    recs = np.empty(open_time.size, dtype=RECORD_DTYPE)
+    recs["open_time"] = open_time
+    for i, name in enumerate(OHLCV_COLUMNS):
+        recs[name] = ohlcv[i]
+    return recs
+
+
+def records_to_columns(recs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """RECORD_DTYPE -> (open_time, ohlcv (5, n)) për CandleSeries.extend()."""
+    ohlcv = np.empty((len(OHLCV_COLUMNS), len(recs)), dtype=np.float64)
+    for i, name in enumerate(OHLCV_COLUMNS):
+        ohlcv[i] = recs[name]
+    return np.asarray(recs["open_time"], dtype=np.int64), ohlcv
+
+
+def records_to_frame(recs: np.ndarray, tz: Optional[str]) -> pd.DataFrame:
+    """RECORD_DTYPE -> DataFrame OHLCV me indeksin në tz origjinale të yfinance."""
+    open_time, ohlcv = records_to_columns(recs)
+    index = pd.DatetimeIndex(open_time.view("datetime64[ms]")).tz_localize("UTC")
+    index = index.tz_convert(tz) if tz else index.tz_localize(None)
+    return pd.DataFrame(dict(zip(OHLCV_COLUMNS, ohlcv)), index=index)
+
+
+# ======================================================
+#                  CACHE: BINANCE KLINES
+# ======================================================
+
+class KlineCache:
+    """
+    CandleSeries për çdo (simbol, interval), i mbushur nga ohlcv_store dhe i
+    rifreskuar në mënyrë inkrementale nga Binance (si fetch_klines i botave).
+    Pas çdo rifreskimi dritarja publikohet në arenën e përbashkët (nëse ka).
+    """
+
+    def __init__(self, limiter: RateLimiter, arena: Optional[candle_arena.ArenaWriter] = None):
+        self.limiter = limiter
+        self.arena = arena
+        self.series: Dict[Tuple[str, str], CandleSeries] = {}
+        self.fetched_at: Dict[Tuple[str, str], float] = {}
+        self.locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self.guard = threading.Lock()
+        self.stats = Stats(hits=0, fetches=0, errors=0, rate_wait_s=0.0)
+
+    def _lock(self, key: Tuple[str, str]) -> threading.Lock:
+        with self.guard:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def get(self, symbol: str, interval: str, limit: int) -> np.ndarray:
+        key = (symbol, interval)
+        with self._lock(key):
+            series = self.series.get(key)
+            fresh = time.time() - self.fetched_at.get(key, 0.0) < KLINES_TTL_SECONDS
+            if series is not None and fresh and series.capacity >= limit:
+                self.stats.add("hits")
+                return series_to_records(series, limit)
+
+            if series is None or series.capacity < limit:
+                series = CandleSeries(capacity=limit)
+                series.extend(*ohlcv_store.load(symbol, interval, limit=limit))
+                self.series[key] = series
+
+            self._refresh(symbol, interval, series)
+            return series_to_records(series, limit)
+
+    def _refresh(self, symbol: str, interval: str, series: CandleSeries):
+        req_limit = series.capacity
+        if len(series) >= series.capacity:
+            step = INTERVAL_MS[interval]
+            missing = (int(time.time() * 1000) - series.last_open_time) // step + 1
+            req_limit = int(min(series.capacity, max(2, missing + 1)))
+
+        def before_request(n: int):
+            self.stats.add("rate_wait_s", self.limiter.acquire(klines_weight(n)))
+            self.stats.add("fetches")
+
+        try:
+            open_time, ohlcv = download_klines(symbol, interval, req_limit, before_request=before_request)
+        except RuntimeError:
+            self.stats.add("errors")
+            raise
+        series.extend(open_time, ohlcv)
+        ohlcv_store.append(symbol, interval, open_time, ohlcv)
+        self.fetched_at[(symbol, interval)] = time.time()
+
+        if self.arena is not None:
+            try:
+                self.arena.publish(symbol, interval, series.open_time, series.ohlcv, series.capacity)
+            except Exception as e:
+                print(f"[GATEWAY] Arena publish dështoi për {symbol} {interval}: {e}")
+
+
+# ======================================================
+#                  CACHE: YFINANCE OHLC
+# ======================================================
+
+class OhlcCache:
+    """
+    DataFrame për çdo (simbol, interval) nga yfinance. Simbolet e vjetruara të
+    një kërkese shkarkohen bashkë me yf_batch dhe bashkohen me ohlcv_store.
+    """
+
+    def __init__(self):
+        self.frames: Dict[Tuple[str, str], pd.DataFrame] = {}
+        self.fetched_at: Dict[Tuple[str, str], float] = {}
+        self.lookback: Dict[Tuple[str, str], int] = {}
+        self.locks: Dict[str, threading.Lock] = {}
+        self.guard = threading.Lock()
+        self.stats = Stats(hits=0, fetches=0, errors=0)
+
+    def _lock(self, interval: str) -> threading.Lock:
+        with self.guard:
+            return self.locks.setdefault(interval, threading.Lock())
+
+    def get_many(self, symbols: List[str], interval: str, lookback_days: int) -> Dict[str, pd.DataFrame]:
+        # lookback_days vjen nga boti bashkë me rezervën e tij (p.sh. +5 ditë)
+        end = datetime.now(timezone.utc)
+        start = end - timedelta(days=lookback_days)
+
+        with self._lock(interval):
+            now = time.time()
+            stale = [
+                s for s in symbols
+                if now - self.fetched_at.get((s, interval), 0.0) >= OHLC_TTL_SECONDS
+                or self.lookback.get((s, interval), 0) < lookback_days
+            ]
+            self.stats.add("hits", len(symbols) - len(stale))
+            if stale:
+                self._refresh(stale, interval, lookback_days, start, end)
+
+            out = {}
+            for s in symbols:
+                df = self.frames.get((s, interval))
+                if df is None or df.empty:
+                    continue
+                lo = pd.Timestamp(start)
+                lo = lo.tz_convert(df.index.tz) if df.index.tz is not None else lo.tz_localize(None)
+                out[s] = df[df.index >= lo]
+            return out
+
+    def _refresh(self, symbols: List[str], interval: str, lookback_days: int, start: datetime, end: datetime):
+        import yf_batch  # yfinance vetëm kur gateway shërben edhe Forex
+
+        stored = {}
+        for s in symbols:
+            cached = self.frames.get((s, interval))
+            if cached is None or self.lookback.get((s, interval), 0) < lookback_days:
+                cached = ohlcv_store.load_frame(s, interval, start=start)
+            stored[s] = cached
+
+        # nëse të gjithë kanë histori, shkarko vetëm nga qiri më i vjetër "i fundit"
+        lasts = [ohlcv_store._to_utc(df.index[-1]) for df in stored.values() if not df.empty]
+        batch_start = min(lasts).to_pydatetime() if len(lasts) == len(symbols) else start
+
+        self.stats.add("fetches")
+        fresh, failed = yf_batch.download_batch(symbols, interval, batch_start, end, timeout=60)
+        for s in failed:
+            # riprovim një nga një, si te botat
+            one, _ = yf_batch.download_batch([s], interval, batch_start if not stored[s].empty else start, end, timeout=60)
+            fresh.update(one)
+
+        now = time.time()
+        for s in symbols:
+            df = fresh.get(s)
+            try:
+                merged = stored[s] if df is None else ohlcv_store.merge_with_store(s, interval, df, stored[s])
+            except Exception as e:
+                print(f"[GATEWAY] {s} {interval}: merge dështoi: {e}")
+                self.stats.add("errors")
+                continue
+            if merged is None or merged.empty:
+                self.stats.add("errors")
+                continue
+            self.frames[(s, interval)] = merged
+            self.fetched_at[(s, interval)] = now
+            self.lookback[(s, interval)] = max(lookback_days, self.lookback.get((s, interval), 0))
+
+
+# ======================================================
+#                     HTTP SERVER
+# ======================================================
+
+KLINES = KlineCache(
+    RateLimiter(BINANCE_WEIGHT_PER_MINUTE),
+    candle_arena.ArenaWriter() if candle_arena.ARENA_ENABLED else None,
+)
+OHLC = OhlcCache()
+STARTED_AT = time.time()
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # noqa: A002 – pa log për çdo kërkesë
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, msg: str):
+        self._send(status, json.dumps({"error": msg}).encode(), "application/json")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            if url.path == "/klines":
+                symbol, interval = q["symbol"], q["interval"]
+                if interval not in INTERVAL_MS:
+                    return self._error(400, f"interval i panjohur: {interval}")
+                recs = KLINES.get(symbol, interval, int(q.get("limit", 500)))
+                if q.get("reply") == "arena" and KLINES.arena is not None:
+                    return self._send(204, b"", "application/octet-stream")
+                buf = io.BytesIO()
+                np.save(buf, recs)
+                return self._send(200, buf.getvalue(), "application/octet-stream")
+
+            if url.path == "/ohlc":
+                symbols = [s for s in q["symbols"].split(",") if s]
+                frames = OHLC.get_many(symbols, q["interval"], int(q.get("lookback_days", 60)))
+                buf = io.BytesIO()
+                np.savez(buf, **{s: frame_to_records(df) for s, df in frames.items()})
+                tz = {s: (str(df.index.tz) if df.index.tz is not None else "") for s, df in frames.items()}
+                return self._send(200, buf.getvalue(), "application/octet-stream", {"X-Index-TZ": json.dumps(tz)})
+
+            if url.path == "/health":
+                body = {
+                    "uptime_s": round(time.time() - STARTED_AT, 1),
+                    "klines": dict(KLINES.stats.snapshot(), series=len(KLINES.series)),
+                    "ohlc": dict(OHLC.stats.snapshot(), frames=len(OHLC.frames)),
+                }
+                return self._send(200, json.dumps(body).encode(), "application/json")
+
+            return self._error(404, "not found")
+
+        except KeyError as e:
+            return self._error(400, f"mungon parametri {e}")
+        except Exception as e:
+            print(f"[GATEWAY] Exception në {url.path}: {e}")
+            traceback.print_exc()
+            return self._error(502, str(e))
+
+
+def serve(host: str = GATEWAY_HOST, port: int = GATEWAY_PORT):
+    server = ThreadingHTTPServer((host, port), GatewayHandler)
+    server.daemon_threads = True
+    print(f"[GATEWAY] Market data gateway në http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("[GATEWAY] Ndalur.")
+    finally:
+        server.server_close()
+        if KLINES.arena is not None:
+            KLINES.arena.close()
+
+
+# ======================================================
+#                     CLIENT (për botat)
+# ======================================================
+
+_gateway_down_until = 0.0
+_arena_reader = candle_arena.ArenaReader() if candle_arena.ARENA_ENABLED else None
+
+
+def _get(path: str, params: dict, timeout: float) -> Optional[requests.Response]:
+    global _gateway_down_until
+    if not GATEWAY_URL or time.time() < _gateway_down_until:
+        return None
+    try:
+        resp = requests.get(f"{GATEWAY_URL}{path}", params=params, timeout=timeout)
+    except requests.RequestException:
+        print(f"[GATEWAY] Gateway nuk përgjigjet, shkarkim direkt për {CLIENT_RETRY_SECONDS}s.")
+        _gateway_down_until = time.time() + CLIENT_RETRY_SECONDS
+        return None
+    if not resp.ok:
+        print(f"[GATEWAY] {path} error {resp.status_code}: {resp.text[:200]}")
+        return None
+    return resp
+
+
+def client_klines(symbol: str, interval: str, limit: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Qirinjtë nga gateway si (open_time, ohlcv (5, n)), ose None.
+    Kur arena është aktive, të dhënat lexohen nga memoria e përbashkët.
+    """
+    params = {"symbol": symbol, "interval": interval, "limit": limit}
+    if _arena_reader is not None:
+        resp = _get("/klines", dict(params, reply="arena"), timeout=30)
+        if resp is None:
+            return None
+        if resp.status_code == 204:
+            got = _arena_reader.read(symbol, interval, limit)
+            if got is not None:
+                return got[0], got[1]
+        else:
+            return records_to_columns(np.load(io.BytesIO(resp.content)))
+
+    resp = _get("/klines", params, timeout=30)
+    if resp is None:
+        return None
+    return records_to_columns(np.load(io.BytesIO(resp.content)))
+
+
+def client_ohlc(symbols: List[str], interval: str, lookback_days: int) -> Optional[Dict[str, pd.DataFrame]]:
+    """DataFrame OHLC për simbol nga gateway (si yf_batch), ose None."""
+    params = {"symbols": ",".join(symbols), "interval": interval, "lookback_days": lookback_days}
+    resp = _get("/ohlc", params, timeout=180)
+    if resp is None:
+        return None
+    tz = json.loads(resp.headers.get("X-Index-TZ", "{}"))
+    with np.load(io.BytesIO(resp.content)) as npz:
+        return {s: records_to_frame(npz[s], tz.get(s)) for s in npz.files}
+
+
+if __name__ == "__main__":
+    # systemctl stop -> SIGTERM: dil normalisht që të pastrohen segmentet e arenës
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    serve()
@@ -0,0 +1,275 @@
+"""
+Ruajtje lokale e historisë OHLCV në disk (një file për simbol/interval).
+
+Çdo file është një varg rekordesh binare me madhësi fikse
+(open_time int64 ms + Open/High/Low/Close/Volume float64), i lexuar me
+np.memmap pa e ngarkuar gjithë file-in. Botat:
+  - në startim lexojnë historinë nga disku dhe shkarkojnë vetëm pjesën që mungon
+  - pas çdo fetch-i shtojnë në fund vetëm qirinjtë e MBYLLUR
+Backtest-et mund të lexojnë të njëjtat file pa rrjet (`load_frame`).
+
+File-i është gjithmonë i njëpasnjëshëm: kur `append` sheh një vrimë mes
+qirit të fundit në disk dhe qirinjve të rinj (boti ishte i ndalur më gjatë
+se `limit` i fetch-it), historia e vjetër kalon në një segment arkivë dhe
+file-i nis nga e para me qirinjtë e rinj.
+
+Struktura: {OHLCV_DATA_DIR}/{interval}/{symbol}.bin
+           {OHLCV_DATA_DIR}/{interval}/{symbol}.{first_ms}-{last_ms}.seg  (segmente të vjetra)
+"""
+import os
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from candle_store import INTERVAL_MS, OHLCV_COLUMNS
+
+try:
+    import fcntl  # vetëm Linux/macOS; në Windows shkruajmë pa lock
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+DATA_DIR = os.getenv(
+    "OHLCV_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ohlcv"),
+)
+
+RECORD_DTYPE = np.dtype(
+    [("open_time", "<i8")] + [(name, "<f8") for name in OHLCV_COLUMNS]
+)
+
+# yfinance (forex): tregu mbyllet në fundjavë/festa, kështu që një boshllëk
+# deri kaq nuk është vrimë në histori
+MARKET_CLOSED_GAP_MS = 4 * 86_400_000
+
+
+def _path(symbol: str, interval: str) -> str:
+    safe = symbol.replace("/", "_")
+    return os.path.join(DATA_DIR, interval, f"{safe}.bin")
+
+
+def _records(path: str) -> np.ndarray:
+    """Memmap read-only i rekordeve (injoron një rekord të fundit të prerë)."""
+    if not os.path.exists(path):
+        return np.empty(0, dtype=RECORD_DTYPE)
+    n = os.path.getsize(path) // RECORD_DTYPE.itemsize
+    if n == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(n,))
+
+
+def last_open_time(symbol: str, interval: str) -> Optional[int]:
+    """Koha (ms) e qirit të fundit të ruajtur, ose None."""
+    recs = _records(_path(symbol, interval))
+    if len(recs) == 0:
+        return None
+    return int(recs["open_time"][-1])
+
+
+def load(
+    symbol: str,
+    interval: str,
+    limit: Optional[int] = None,
+    since_ms: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lexon historinë e ruajtur si (open_time int64 (n,), ohlcv float64 (5, n)),
+    në formatin që pret CandleSeries.extend().
+    """
+    recs = _records(_path(symbol, interval))
+    if since_ms is not None and len(recs):
+        recs = recs[np.searchsorted(recs["open_time"], since_ms):]
+    if limit is not None:
+        recs = recs[-limit:]
+    open_time = np.array(recs["open_time"], dtype=np.int64)
+    ohlcv = np.empty((len(OHLCV_COLUMNS), len(recs)), dtype=np.float64)
+    for i, name in enumerate(OHLCV_COLUMNS):
+        ohlcv[i] = recs[name]
+    return open_time, ohlcv
+
+
+def _to_utc(ts) -> pd.Timestamp:
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def load_frame(
+    symbol: str,
+    interval: str,
+    start: Optional[pd.Timestamp] = None,
+    end: Optional[pd.Timestamp] = None,
+) -> pd.DataFrame:
+    """Historia e ruajtur si DataFrame me DatetimeIndex UTC (p.sh. për backtest)."""
+    since_ms = None if start is None else int(_to_utc(start).value // 1_000_000)
+    open_time, ohlcv = load(symbol, interval, since_ms=since_ms)
+    if open_time.size == 0:
+        return pd.DataFrame()
+    index = pd.DatetimeIndex(open_time.view("datetime64[ms]"), name="open_time").tz_localize("UTC")
+    df = pd.DataFrame(dict(zip(OHLCV_COLUMNS, ohlcv)), index=index)
+    if end is not None:
+        df = df[df.index <= _to_utc(end)]
+    return df
+
+
+def _start_segment(f, path: str):
+    """
+    Kopjon historinë aktuale te një segment .seg dhe e zbraz file-in (nën
+    flock-un e thirrësit; inode-i mbetet i njëjti për shkrimtarët e tjerë).
+    """
+    recs = np.fromfile(path, dtype=RECORD_DTYPE)
+    if recs.size:
+        base = path[:-len(".bin")]
+        recs.tofile(f"{base}.{int(recs['open_time'][0])}-{int(recs['open_time'][-1])}.seg")
+    f.truncate(0)
+
+
+def append(
+    symbol: str,
+    interval: str,
+    open_time: np.ndarray,
+    ohlcv: np.ndarray,
+    now_ms: Optional[int] = None,
+    max_gap_ms: Optional[int] = None,
+) -> int:
+    """
+    Shton në fund qirinjtë e mbyllur që janë më të rinj se i fundit në disk.
+    Qiri që ende po formohet (open_time + interval > tani) nuk ruhet.
+    Kur qiri i parë i ri është më larg se max_gap_ms (parazgjedhur: një
+    interval) nga i fundit në disk, nis një segment të ri (_start_segment).
+    Kthen numrin e rekordeve të shkruara.
+    """
+    open_time = np.asarray(open_time, dtype=np.int64)
+    if open_time.size == 0:
+        return 0
+
+    step = INTERVAL_MS.get(interval)
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+    closed = open_time + step <= now_ms if step else np.ones(open_time.size, dtype=bool)
+
+    path = _path(symbol, interval)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "ab") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            # rekord i prerë nga një shkrim i ndërprerë -> hiqe
+            size = os.fstat(f.fileno()).st_size
+            if size % RECORD_DTYPE.itemsize:
+                f.truncate(size - size % RECORD_DTYPE.itemsize)
+
+            last = last_open_time(symbol, interval)
+            mask = closed if last is None else closed & (open_time > last)
+            n = int(mask.sum())
+            if n == 0:
+                return 0
+
+            first_new = int(open_time[mask][0])
+            if last is not None and step and first_new - last > max(step, max_gap_ms or 0):
+                print(
+                    f"[OHLCV] {symbol} {interval}: vrimë {(first_new - last) // step - 1} qirinj "
+                    f"pas {pd.Timestamp(last, unit='ms', tz='UTC')}, nis segment i ri"
+                )
+                _start_segment(f, path)
+
+            recs = np.empty(n, dtype=RECORD_DTYPE)
+            recs["open_time"] = open_time[mask]
+            for i, name in enumerate(OHLCV_COLUMNS):
+                recs[name] = np.asarray(ohlcv[i])[mask]
+            f.write(recs.tobytes())
+            return n
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def backfill(
+    symbol: str,
+    interval: str,
+    open_time: np.ndarray,
+    ohlcv: np.ndarray,
+    now_ms: Optional[int] = None,
+) -> int:
+    """
+    Bashkon qirinjtë e mbyllur (edhe më të vjetër se historia në disk, p.sh.
+    për backtest) me file-in ekzistues dhe e rishkruan atë. Për open_time të
+    njëjtë mbahet rekordi në disk. Kthen numrin e rekordeve të reja.
+
+    File-i zëvendësohet atomikisht (os.replace); mos e përdor ndërkohë që një
+    bot shton në të njëjtin file.
+    """
+    open_time = np.asarray(open_time, dtype=np.int64)
+    step = INTERVAL_MS.get(interval)
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+    closed = open_time + step <= now_ms if step else np.ones(open_time.size, dtype=bool)
+
+    path = _path(symbol, interval)
+    old = np.array(_records(path))
+    new = np.empty(int(closed.sum()), dtype=RECORD_DTYPE)
+    new["open_time"] = open_time[closed]
+    for i, name in enumerate(OHLCV_COLUMNS):
+        new[name] = np.asarray(ohlcv[i])[closed]
+    new = new[~np.isin(new["open_time"], old["open_time"])]
+    if new.size == 0:
+        return 0
+
+    merged = np.concatenate([old, new])
+    merged = merged[np.argsort(merged["open_time"], kind="stable")]
+    merged = merged[np.r_[True, np.diff(merged["open_time"]) != 0]]
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(merged.tobytes())
+    os.replace(tmp, path)
+    return int(new.size)
+
+
+def frame_to_columns(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """DataFrame OHLCV (p.sh. nga yfinance) -> (open_time ms, ohlcv (5, n))."""
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = df.columns.get_level_values(0)
+    index = pd.DatetimeIndex(df.index)
+    index = index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+    open_time = index.as_unit("ms").asi8
+    ohlcv = np.vstack([df[name].to_numpy(dtype=np.float64) for name in OHLCV_COLUMNS])
+    return open_time, ohlcv
+
+
+def append_frame(
+    symbol: str,
+    interval: str,
+    df: pd.DataFrame,
+    now_ms: Optional[int] = None,
+    max_gap_ms: Optional[int] = None,
+) -> int:
+    """Si `append`, por merr DataFrame me kolonat Open/High/Low/Close/Volume."""
+    if df is None or df.empty:
+        return 0
+    open_time, ohlcv = frame_to_columns(df)
+    return append(symbol, interval, open_time, ohlcv, now_ms=now_ms, max_gap_ms=max_gap_ms)
+
+
+def merge_with_store(symbol: str, interval: str, df: pd.DataFrame, stored: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ruan në disk qirinjtë e mbyllur të `df` (p.sh. të sapo shkarkuar nga
+    yfinance) dhe i bashkon me historinë `stored`. Indeksi i rezultatit
+    ndjek tz e `df`, që resample-t e botave të mos ndryshojnë.
+    Mbyllja e tregut (fundjavë) deri MARKET_CLOSED_GAP_MS nuk nis segment të ri.
+    """
+    append_frame(symbol, interval, df, max_gap_ms=MARKET_CLOSED_GAP_MS)
+    if stored is None or stored.empty:
+        return df.sort_index()
+
+    tz = df.index.tz
+    index = stored.index
+    if index.tz is None:
+        index = index.tz_localize("UTC")
+    index = index.tz_convert(tz) if tz is not None else index.tz_convert("UTC").tz_localize(None)
+    stored = stored.set_axis(index.rename(df.index.name))
+
+    return pd.concat([stored[~stored.index.isin(df.index)], df]).sort_index()
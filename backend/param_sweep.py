@@ -0,0 +1,143 @@
+"""
+Sweep i parametrave të vendimit për backtest.py (grid ose kërkim i rastësishëm).
+
+Pragjet si MIN_SCORE_FOR_SIGNAL, MIN_ADX_STRENGTH, MIN_VOLUME_RATIO dhe
+MIN_MINUTES_BETWEEN_SIGNALS ndikojnë vetëm shtresën e vendimit. Prandaj çdo
+proces ndërton tabelën e faktorëve të një simboli një herë (`build_table`)
+dhe rilexon vetëm `evaluate` + `simulate_trades` për çdo set parametrash;
+edhe nivelet S/R të kandidatëve ruhen te tabela mes seteve.
+
+Rezultati është një tabelë e renditur (një rresht për set) në
+data/backtests/sweep_{strategy}.csv.
+
+Përdorim:
+    python param_sweep.py crypto_swing --days 730 \\
+        --grid min_score=5,6,7 min_adx=15,20,25 min_volume_ratio=1.0,1.2,1.5 min_minutes=60,120,240
+    python param_sweep.py crypto_scalp --days 180 --random 40 --grid min_score=4.5,5,5.5,6 min_adx=15,20,25,30
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import backtest
+
+# Rendi i kolonave të metrikave në tabelën e rezultateve
+METRICS = ["trades", "win_rate", "avg_r", "total_r", "profit_factor", "final_equity", "max_drawdown"]
+
+# Sete me më pak trade nuk renditen (rezultat pa peshë statistikore)
+MIN_TRADES = 20
+
+
+def parse_grid(specs: List[str]) -> Dict[str, list]:
+    """["min_score=5,6,7", ...] -> {"min_score": [5, 6, 7], ...}"""
+    grid: Dict[str, list] = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if not values:
+            raise ValueError(f"grid i pavlefshëm: {spec} (pritet emri=v1,v2,...)")
+        grid[name.strip()] = [float(v) if "." in v else int(v) for v in values.split(",")]
+    return grid
+
+
+def param_sets(grid: Dict[str, list], random_n: int = 0, seed: int = 0) -> List[dict]:
+    """Të gjitha kombinimet e grid-it, ose `random_n` prej tyre pa përsëritje."""
+    names = list(grid)
+    combos = list(itertools.product(*(grid[n] for n in names)))
+    if random_n and random_n < len(combos):
+        rng = np.random.default_rng(seed)
+        combos = [combos[i] for i in sorted(rng.choice(len(combos), size=random_n, replace=False))]
+    return [dict(zip(names, combo)) for combo in combos]
+
+
+def _sweep_symbol(args) -> pd.DataFrame:
+    """Një simbol, të gjitha setet: tabela e faktorëve llogaritet vetëm një herë."""
+    strategy, symbol, sets, start, end = args
+    table = backtest.build_table(strategy, symbol, start, end)
+    if table is None:
+        return pd.DataFrame()
+    parts = []
+    for set_id, params in enumerate(sets):
+        p = dict(table.cfg["params"])
+        p.update(params)
+        idx, sides = backtest.evaluate(table, p)
+        trades = backtest.simulate_trades(table, idx, sides, p["sl_pct"], p["tp_pct"])
+        if not trades.empty:
+            parts.append(trades[["exit_time", "outcome", "r"]].assign(set_id=set_id))
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+
+def sweep(strategy: str, symbols: List[str], sets: List[dict],
+          start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None,
+          workers: Optional[int] = None, rank_by: str = "total_r") -> pd.DataFrame:
+    """Ekzekuton setet mbi simbolet në process pool; kthen tabelën e renditur."""
+    jobs = [(strategy, s, sets, start, end) for s in symbols]
+    if workers == 1 or len(jobs) <= 1:
+        results = [_sweep_symbol(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_sweep_symbol, jobs))
+    results = [r for r in results if not r.empty]
+    trades = pd.concat(results, ignore_index=True) if results else pd.DataFrame(columns=["set_id"])
+
+    rows = []
+    for set_id, params in enumerate(sets):
+        stats = backtest.summarize(trades[trades["set_id"] == set_id])
+        rows.append({**params, **stats})
+    table = pd.DataFrame(rows, columns=list(sets[0]) + METRICS if sets else METRICS)
+
+    ranked = table["trades"] >= MIN_TRADES
+    table = pd.concat([
+        table[ranked].sort_values(rank_by, ascending=rank_by == "max_drawdown", kind="stable"),
+        table[~ranked],
+    ])
+    table.insert(0, "rank", np.r_[np.arange(1, int(ranked.sum()) + 1), np.zeros(int((~ranked).sum()), dtype=int)])
+    return table.reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep i pragjeve të vendimit mbi backtest.py")
+    parser.add_argument("strategy", choices=sorted(backtest.STRATEGIES))
+    parser.add_argument("--grid", nargs="+", required=True, metavar="EMRI=V1,V2", help="p.sh. min_score=5,6,7")
+    parser.add_argument("--random", type=int, default=0, metavar="N", help="N sete të rastësishme nga grid-i")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--symbols", nargs="*", help="default: të gjithë simbolet në ohlcv_store")
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rank-by", default="total_r", choices=METRICS[1:])
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    defaults = backtest.STRATEGIES[args.strategy]["params"]
+    grid = parse_grid(args.grid)
+    unknown = set(grid) - set(defaults)
+    if unknown:
+        parser.error(f"parametra të panjohur: {', '.join(sorted(unknown))} (të lejuar: {', '.join(defaults)})")
+
+    symbols = args.symbols or backtest.stored_symbols(args.strategy)
+    if not symbols:
+        print(f"[SWEEP] S'ka histori për {args.strategy}.")
+        return
+    sets = param_sets(grid, args.random, args.seed)
+
+    start = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=args.days)
+    t0 = time.perf_counter()
+    table = sweep(args.strategy, symbols, sets, start=start, workers=args.workers, rank_by=args.rank_by)
+    elapsed = time.perf_counter() - t0
+
+    print(f"[SWEEP] {args.strategy}: {len(sets)} sete x {len(symbols)} simbole, {elapsed:.1f}s")
+    print(table.head(15).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+
+    out = args.out or os.path.join(backtest.RESULTS_DIR, f"sweep_{args.strategy}.csv")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    table.to_csv(out, index=False)
+    print(f"[SWEEP] Tabela: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Trace id i një sinjali, nga boti deri te push-i.
+
+Boti e krijon kur analiza vendos të dërgojë sinjal (`send_signal_to_backend`)
+dhe e dërgon bashkë me payload-in; API-ja ruan kohët e çdo faze në tabelën
+signal_traces (marrja, commit-i, push-i, dorëzimi) dhe i raporton te
+GET /admin/latency. Kohët janë epoch në sekonda (bota dhe API-ja janë në
+të njëjtin server, pra në të njëjtën orë).
+
+Sinjalet e një kalimi mblidhen në `SignalBatch` dhe dërgohen me një
+POST /signals/batch (`post_signal`), secili me një `idempotency_key` të
+nxjerrë nga trace_id: riprovimet (timeout, 5xx) dhe ridërgimi në kalimin
+tjetër përdorin të njëjtin çelës, kështu që API-ja nuk krijon rresht të dytë
+as push të dytë.
+
+Në startim boti mbush memorien e deduplikimit me `fetch_last_signals`
+(GET /signals/last_sent), që një restart të mos ridërgojë sinjalet e fundit.
+"""
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+import pandas as pd
+import requests
+
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 1.0
+# sinjalet e pa dërguara (API poshtë) riprovohen në kalimin tjetër deri në këtë moshë
+MAX_SIGNAL_AGE_SECONDS = 900
+MAX_BATCH = 50
+# sa orë prapa lexohen sinjalet e fundit në startim
+WARM_HOURS = 72
+
+
+def new_trace(candle_time: Optional[pd.Timestamp] = None) -> dict:
+    """
+    Fushat e trace-it për payload-in e sinjalit. `candle_time` është open
+    time i qiriut më të ri në dritaren e analizuar (= mbyllja e qiriut para tij).
+    """
+    trace = {"trace_id": uuid.uuid4().hex, "decided_ts": time.time()}
+    if candle_time is not None:
+        trace["candle_ts"] = pd.Timestamp(candle_time).timestamp()
+    return trace
+
+
+def idempotency_key(bot_id: str, trace: dict) -> str:
+    """
+    Çelësi i një vendimi të botit, nga trace_id: krijohet një herë kur
+    sinjali vendoset dhe udhëton në payload, kështu që riprovimet e
+    post_signal dhe ridërgimet e SignalBatch._requeue përdorin të njëjtin.
+    Dy vendime në të njëjtin qiri janë sinjale të ndryshme; ato i ndan
+    cooldown-i (MIN_MINUTES_BETWEEN_SIGNALS i botit, SIGNAL_COOLDOWN_MINUTES
+    i API-së), jo çelësi.
+    """
+    return f"{bot_id}:{trace['trace_id']}"
+
+
+def post_signal(url: str, payload: dict, timeout: float = 5) -> requests.Response:
+    """
+    POST i sinjalit me riprovim për gabime rrjeti dhe 5xx (backoff linear).
+    Kthen përgjigjen e fundit; gabimi i rrjetit i provës së fundit ngrihet.
+    """
+    for attempt in range(1, RETRY_ATTEMPTS + 1):
+        try:
+            resp = requests.post(url, json=payload, timeout=timeout)
+            if resp.status_code < 500 or attempt == RETRY_ATTEMPTS:
+                return resp
+        except requests.RequestException:
+            if attempt == RETRY_ATTEMPTS:
+                raise
+        time.sleep(RETRY_BACKOFF_SECONDS * attempt)
+
+
+class SignalBatch:
+    """Sinjalet e një kalimi skanimi; `flush()` i dërgon me një kërkesë."""
+
+    def __init__(self, url: str, max_size: int = MAX_BATCH):
+        self.url = url
+        self.max_size = max_size
+        self.items: List[dict] = []
+
+    def add(self, payload: dict) -> bool:
+        """Shton sinjalin; True kur batch-i është plot dhe duhet dërguar."""
+        self.items.append(payload)
+        return len(self.items) >= self.max_size
+
+    def _requeue(self, items: List[dict]):
+        cutoff = time.time() - MAX_SIGNAL_AGE_SECONDS
+        kept = [p for p in items if p.get("decided_ts", 0) >= cutoff]
+        if len(kept) < len(items):
+            print(f"[BACKEND] {len(items) - len(kept)} sinjale të vjetra u hodhën pa u dërguar")
+        self.items = kept + self.items
+
+    def flush(self) -> List[dict]:
+        """POST /signals/batch; kthen rezultatet {idempotency_key, id, status} sipas rendit."""
+        if not self.items:
+            return []
+        items, self.items = self.items, []
+        try:
+            resp = post_signal(self.url, {"signals": items})
+        except requests.RequestException as e:
+            print(f"[BACKEND] Exception sending {len(items)} signals: {e}")
+            self._requeue(items)
+            return []
+        if not resp.ok:
+            print(f"[BACKEND] ❌ Error {resp.status_code}: {resp.text}")
+            if resp.status_code >= 500:
+                self._requeue(items)
+            return []
+
+        results = resp.json()["results"]
+        for payload, result in zip(items, results):
+            mark = "✅" if result["status"] == "created" else "↩️"
+            print(
+                f"[BACKEND] {mark} Signal {result['status']} (id={result['id']}): "
+                f"{payload['symbol']} {payload['direction']} {payload['timeframe']} "
+                f"E={payload['entry']:.4f} SL={payload['sl']:.4f} TP={payload['tp']:.4f}"
+            )
+        return results
+
+
+def fetch_last_signals(base_url: str, source: str, hours: float = WARM_HOURS) -> List[Tuple[str, str, datetime]]:
+    """
+    (symbol, direction, koha UTC) e sinjalit të fundit për çdo palë të
+    `source`, renditur sipas kohës. Kur API-ja nuk përgjigjet kthehet []
+    (boti nis bosh si më parë; cooldown-i i API-së e mbron gjithsesi).
+    """
+    try:
+        resp = requests.get(
+            f"{base_url}/signals/last_sent",
+            params={"source": source, "hours": hours},
+            timeout=10,
+        )
+        resp.raise_for_status()
+    except requests.RequestException as e:
+        print(f"[BACKEND] Sinjalet e fundit nuk u lexuan: {e}")
+        return []
+
+    rows = []
+    for row in resp.json()["signals"]:
+        t = datetime.fromisoformat(row["time"])
+        if t.tzinfo is None:
+            t = t.replace(tzinfo=timezone.utc)
+        rows.append((row["symbol"], row["direction"], t))
+    return rows
@@ -0,0 +1,79 @@
+"""
+Shkarkim i grupuar nga yfinance për botat Forex.
+
+Në vend të një `yf.download` për çdo simbol, shkarkojmë të gjithë simbolet
+e një intervali me një kërkesë multi-ticker (threads=True) dhe e ndajmë
+rezultatin (kolona MultiIndex: ticker -> OHLCV) në DataFrame për simbol.
+Simbolet që dështojnë kthehen veçmas që boti t'i riprovojë një nga një.
+"""
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import pandas as pd
+import yfinance as yf
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def _split_symbol(raw: pd.DataFrame, symbol: str, n_symbols: int) -> pd.DataFrame:
+    if isinstance(raw.columns, pd.MultiIndex):
+        if symbol not in raw.columns.get_level_values(0):
+            return pd.DataFrame()
+        df = raw[symbol]
+    elif n_symbols == 1:
+        df = raw
+    else:
+        return pd.DataFrame()
+
+    if not set(OHLCV_COLUMNS).issubset(df.columns):
+        return pd.DataFrame()
+
+    # rreshtat NaN vijnë nga orët kur simbole të tjera kanë qirinj e ky jo
+    df = df[OHLCV_COLUMNS].dropna()
+    if not isinstance(df.index, pd.DatetimeIndex):
+        df.index = pd.to_datetime(df.index)
+    return df.sort_index()
+
+
+def download_batch(
+    symbols: List[str],
+    interval: str,
+    start: datetime,
+    end: datetime,
+    timeout: int = 60,
+) -> Tuple[Dict[str, pd.DataFrame], List[str]]:
+    """
+    Shkarkon OHLC për të gjithë `symbols` me një thirrje.
+    Kthen (frames, failed): frames[symbol] -> DataFrame, failed -> simbolet pa të dhëna.
+    """
+    if not symbols:
+        return {}, []
+
+    try:
+        raw = yf.download(
+            tickers=list(symbols),
+            start=start,
+            end=end,
+            interval=interval,
+            group_by="ticker",
+            threads=True,
+            auto_adjust=False,
+            progress=False,
+            timeout=timeout,
+        )
+    except Exception as e:
+        print(f"[BATCH] Exception në yf.download({interval}, {len(symbols)} simbole): {e}")
+        return {}, list(symbols)
+
+    if raw is None or raw.empty:
+        return {}, list(symbols)
+
+    frames: Dict[str, pd.DataFrame] = {}
+    failed: List[str] = []
+    for symbol in symbols:
+        df = _split_symbol(raw, symbol, len(symbols))
+        if df.empty:
+            failed.append(symbol)
+        else:
+            frames[symbol] = df
+    return frames, failed
@@ -31,6 +31,23 @@ double _asDouble(dynamic v) {
 Future<void> _firebaseMessagingBackgroundHandler(RemoteMessage message) async {
   await Firebase.initializeApp();
   debugPrint('💤 Background FCM message: ${message.messageId}');
+  await _ackSignalTrace(message);
+}
+
+/// Konfirmon te backend-i që push-i i sinjalit arriti (latenca end-to-end te /admin/latency).
+/// Një digest (disa sinjale në një njoftim) sjell të gjitha te `trace_ids`.
+Future<void> _ackSignalTrace(RemoteMessage message) async {
+  final raw = message.data['trace_ids'] ?? message.data['trace_id'];
+  if (raw == null || raw.toString().isEmpty) return;
+  for (final traceId in raw.toString().split(',')) {
+    try {
+      await http
+          .post(Uri.parse('$kApiBaseUrl/traces/$traceId/delivered'))
+          .timeout(const Duration(seconds: 5));
+    } catch (e) {
+      debugPrint('Trace ack failed: $e');
+    }
+  }
 }
 
 Future<void> main() async {
@@ -1138,6 +1155,7 @@ class _MainShellState extends State<MainShell> {
       }
 
       FirebaseMessaging.onMessage.listen((RemoteMessage message) {
+        unawaited(_ackSignalTrace(message));
         final notification = message.notification;
         if (notification != null && mounted) {
           final snackText =